@@ -9,16 +9,18 @@ import sys
 sys.path.append('src/')
 from visualizations import PlotStrip, PlotDensity, PlotBox
 from PipelineClass import Pipeline, valid_dtypes
+from planning import compile_artifacts
+from ingestion import ColumnarCache, file_formats
+from schema import display_dtypes
+from selection import RowSelection, FilterIndex
+from profiling import profile_cache, EXAMPLE_VALUES
 
 DISPLAY_MAX_N = 5000
-EXAMPLE_CATEGORIES = 3
+EXAMPLE_CATEGORIES = EXAMPLE_VALUES
+CACHE_DIR = "data/.cache"
+CACHE_MAX_BYTES = 5*1024**3
 
-file_formats = {'csv': pd.read_csv,
-                'xls': pd.read_excel,
-                'xlsx': pd.read_excel,
-                'xlsm': pd.read_excel,
-                'xlsb': pd.read_excel
-}
+upload_cache = ColumnarCache(CACHE_DIR, max_bytes = CACHE_MAX_BYTES) # parsed uploads, shared across sessions and restarts
 
 @st.cache_data(ttl = "2h") # cache data for 2 hours
 def load_data(uploaded_file):
@@ -27,40 +29,49 @@ def load_data(uploaded_file):
     except:
         ext = uploaded_file.split(".")[-1]
     if ext in list(file_formats.keys()):
-        return file_formats[ext](uploaded_file)
+        return upload_cache.load(uploaded_file, file_formats[ext])
     else:
         st.error(f"Unsupported file format: {ext}")
         return None
 
 
-def describe_data(master_df):
+def describe_data(master_df, memory = None, base = None, changed = None):
+    # column profiles are computed with vectorized reductions and cached by column contents
+    # (if base is a frame described before and changed lists the columns that may differ from it, the other profiles are reused without hashing)
     data = []
-    dtypes = dict(master_df.dtypes)
+    profiles = profile_cache.profile(master_df, base, changed)
     
-    for col in list(master_df.columns):
+    for col, profile in profiles.items():
         row = []
-        row.append(dtypes[col])
-        row.append(np.round(master_df[col].isnull().mean()*100,2))
+        row.append(profile['dtype'])
+        row.append(np.round(profile['missing'],2))
         
-        if dtypes[col] == "string":
-            values = list(set(master_df[col].dropna()))
-            show_values = ', '.join(values[:EXAMPLE_CATEGORIES])
-            show_ellipse = [', ...' if len(values) > EXAMPLE_CATEGORIES else '']
-            row.append(f"[{show_values}{show_ellipse[0]}], {len(values)} unique values")
+        if profile['group'] == "string":
+            show_values = ', '.join(profile['examples'])
+            show_ellipse = [', ...' if profile['unique'] > EXAMPLE_CATEGORIES else '']
+            show_unique = ['~' if profile['approximate'] else '']
+            row.append(f"[{show_values}{show_ellipse[0]}], {show_unique[0]}{profile['unique']} unique values")
             
-        elif dtypes[col] == "boolean":
+        elif profile['group'] == "boolean":
             row.append("True (1), False (0)")
             
-        elif dtypes[col] == "datetime64[ns]":
-            row.append(f"{pd.to_datetime(master_df[col].dropna().min().round('s'))} to {pd.to_datetime(master_df[col].dropna().max().round('s'))}")
+        elif profile['min'] is None:
+            row.append("No values")
+            
+        elif profile['group'] == "datetime64[ns]":
+            row.append(f"{pd.to_datetime(profile['min'].round('s'))} to {pd.to_datetime(profile['max'].round('s'))}")
         else:
-            row.append(f"{round(master_df[col].dropna().min(), 4)} to {round(master_df[col].dropna().max(), 4)}")
+            row.append(f"{round(profile['min'], 4)} to {round(profile['max'], 4)}")
+        
+        # memory before and after compaction (if any)
+        if memory is not None:
+            row.append(f"{memory.loc[col, 'before']/1024**2:.2f} MB → {memory.loc[col, 'after']/1024**2:.2f} MB")
             
         data.append(row)
             
-    describe_df = pd.DataFrame(index = list(dtypes.keys()),
+    describe_df = pd.DataFrame(index = list(profiles.keys()),
                                columns = ["dtype", "% Missing",
-                                          "Values"],
+                                          "Values"] + (["Memory"] if memory is not None else []),
                                data = data)
     return describe_df
     
@@ -73,13 +84,17 @@ def sample_data(df):
     return df
 
 
-def recursive_filter(add_filter, df, previous_cols, n):
+def recursive_filter(add_filter, df, previous_cols, n, rows = None, index = None):
+    # df is the master data; rows are the positions of the rows kept by the previous filters (None for all rows)
+    # filters are resolved with the sorted and category indexes of the master data, built once per column
+    if index is None or index.master is not df:
+        index = FilterIndex(df)
     
-    if not add_filter or df.empty or df.shape[0] == 0:
-        return df
+    if not add_filter or df.empty or (rows is not None and len(rows) == 0):
+        return np.arange(df.shape[0]) if rows is None else rows
     
     n += 1
-    dtypes = dict(df.dtypes)
+    dtypes = display_dtypes(df)
     col_type = st.radio(label = "Select type of column to be filtered",
                         options = list(set(dtypes.values())),
                         key = f"col_type_{n}")
@@ -96,15 +111,19 @@ def recursive_filter(add_filter, df, previous_cols, n):
             
             if col_type == "string" or col_type == "boolean":
                 # inludes <NA> in selections
-                filter_value = st.multiselect("↳ Select categories", list(set(df[filter_column])),
+                filter_value = st.multiselect("↳ Select categories", index.category_values(filter_column, rows),
                                               key = f"filter_value_{n}")
-                filtered_df = df.loc[df[filter_column].isin(filter_value)].reset_index(drop = True)
+                rows = index.filter_categories(filter_column, filter_value, rows)
                 
             else:
-                min_value, max_value = min(df[filter_column].dropna()), max(df[filter_column].dropna())
+                min_value, max_value = index.value_range(filter_column, rows)
+                if min_value is None: # no values in the selected rows
+                    st.write("*No values to filter by*")
+                    return np.arange(df.shape[0]) if rows is None else rows
+                column = df[filter_column] if rows is None else df[filter_column].iloc[rows] # only the filtered column is copied, for the chart
                 
                 if col_type == "Int64":
-                    chart = PlotBox(df, filter_column, width = 600, height = 60)
+                    chart = PlotBox(column.to_frame(), filter_column, width = 600, height = 60)
                     st.altair_chart(chart, use_container_width = True)
                     
                     filter_value = st.slider("↳ Select range of values",
@@ -115,8 +134,7 @@ def recursive_filter(add_filter, df, previous_cols, n):
                     include_na = st.toggle("Include missing?", key = f"inlcude_na_{n}")
                                              
                 elif col_type == "datetime64[ns]":
-                    df[filter_column] = pd.to_datetime(df[filter_column])
-                    min_value, max_value = min(df[filter_column].dropna()).to_pydatetime(), max(df[filter_column].dropna()).to_pydatetime()
+                    min_value, max_value = pd.Timestamp(min_value).to_pydatetime(), pd.Timestamp(max_value).to_pydatetime()
                     filter_value = st.slider("↳ Select range of values",
                                              min_value, max_value,
                                              format = "YYYY-MM-DD hh:mm",
@@ -126,8 +144,9 @@ def recursive_filter(add_filter, df, previous_cols, n):
                     include_na = st.toggle("Include missing?", key = f"inlcude_na_{n}")
                 
                 else:
-                    chart = PlotBox(df, filter_column, width = 600, height = 60)
+                    chart = PlotBox(column.to_frame(), filter_column, width = 600, height = 60)
                     st.altair_chart(chart, use_container_width = True)
+                    min_value, max_value = float(min_value), float(max_value)
                     filter_value = st.slider("↳ Select range of values",
                                              np.floor(min_value), np.ceil(max_value),
                                              value = (min_value, max_value),
@@ -135,34 +154,26 @@ def recursive_filter(add_filter, df, previous_cols, n):
                     # toggle option to include <NA>
                     include_na = st.toggle("Include missing?", key = f"inlcude_na_{n}")
                 
-                filtered_df = df[(df[filter_column].between(filter_value[0], filter_value[1], inclusive = 'both'))]
-                
-                if include_na:
-                    filtered_df = df[(df[filter_column].between(filter_value[0], filter_value[1], inclusive = 'both')) | df[filter_column].isna()]
+                low, high = filter_value
+                if col_type == "datetime64[ns]":
+                    low, high = np.datetime64(pd.Timestamp(low), 'ns'), np.datetime64(pd.Timestamp(high), 'ns')
+                rows = index.filter_range(filter_column, low, high, rows, include_na)
             
             add_filter = st.checkbox("Add Another Filter",
                                      key = f"add_filter_{n}")
                 
-            return recursive_filter(add_filter, filtered_df, previous_cols, n)
+            return recursive_filter(add_filter, df, previous_cols, n, rows, index)
     
     
 def check_artifacts(json_data):
-    # check that the artifacts have steps 1, 2, ... N
-    keys = list(json_data.keys())
-    steps = list(np.array(keys, dtype = int))
-    if steps != list(np.array(range(1,len(steps)+1))):
+    # check that the artifacts have steps 1, 2, ... N with valid functions and params (compiled up front)
+    try:
+        compile_artifacts(json_data)
+        return True
+    except Exception as e:
+        st.error(str(e))
         return False
     
-    pipeline = Pipeline(pd.DataFrame())
-    # check that the transformations are valid functions
-    for key in keys:
-        for function, params in json_data[key].items():
-            if function not in pipeline.listFunctions:
-                return False
-    
-    # check that each transformation has valid params
-    return True
-    
 
 if __name__ == "__main__":
 
@@ -174,46 +185,57 @@ if __name__ == "__main__":
     if "MASTER DATA" not in st.session_state:
         st.session_state["MASTER DATA"] = pd.DataFrame()
     if "FILTERED DATA" not in st.session_state:
-        st.session_state["FILTERED DATA"] = pd.DataFrame()
+        st.session_state["FILTERED DATA"] = RowSelection(pd.DataFrame())
     
     uploaded_file = st.file_uploader(
         "(Required) Upload Data",
         type = list(file_formats.keys()),
-        help = "Most variations of Excel and CSV file formats are supported."
+        help = "Most variations of Excel and CSV file formats, and Parquet, are supported. All the sheets of an Excel workbook are read, with a 'Sheet' column if there is more than one."
     )
     # upload data widget
     if uploaded_file:
-        df = load_data(uploaded_file)
+        compact = st.toggle("Compact memory mode",
+                            help = "Store the data in memory-compact dtypes (categories, Arrow strings, downcast numerics). Columns are widened again when a transformation writes to them.")
         
-        # initialize pipeline object
-        pipeline = Pipeline(input_df = df)
-        df = pipeline.data
-        st.session_state["MASTER DATA"] = df # update session state
+        # initialize pipeline object (only when the upload changes, so the master data is shared across reruns)
+        # every upload gets a new file_id, even of a file with the same name and size; the contents of a file seen before are still loaded from the columnar cache
+        master_key = (uploaded_file.file_id, compact)
+        if st.session_state.get("MASTER KEY") != master_key:
+            df = load_data(uploaded_file)
+            pipeline = Pipeline(input_df = df, compact = compact)
+            st.session_state["MASTER DATA"] = pipeline.data # update session state
+            st.session_state["MASTER MEMORY"] = pipeline.memory
+            st.session_state["MASTER KEY"] = master_key
         
         # show column descriptions
         master_df = st.session_state["MASTER DATA"]
-        describe_df = describe_data(master_df)
+        describe_df = describe_data(master_df, st.session_state["MASTER MEMORY"])
         st.dataframe(describe_df, use_container_width = True)
         
         # optionally, apply recursive filtering
         filter = st.checkbox("Apply Filters")
-        filtered_df = recursive_filter(filter, master_df, [], n = 0)
+        if "FILTER INDEX" not in st.session_state or st.session_state["FILTER INDEX"].master is not master_df:
+            st.session_state["FILTER INDEX"] = FilterIndex(master_df) # indexes are built once per data set, on first use
+        filtered_rows = recursive_filter(filter, master_df, [], n = 0, index = st.session_state["FILTER INDEX"])
         
-        # show and save filtered data
-        if filter and filtered_df is not None:
+        # show and save filtered data (held as a selection of rows of the master data)
+        if filter and filtered_rows is not None:
+            filtered = st.session_state["FILTERED DATA"]
+            if filtered.master is not master_df or not np.array_equal(filtered.rows, filtered_rows):
+                filtered = RowSelection(master_df, filtered_rows)
             with st.expander("Show Filtered Data"):
-                st.dataframe(sample_data(filtered_df))
-                st.write(filtered_df.shape)
-                if sample_data(filtered_df).shape[0] < filtered_df.shape[0]:
-                    st.write("*Only showing a sample of {DISPLAY_MAX_N} rows*")
-            st.session_state["FILTERED DATA"] = filtered_df # update session state
+                st.dataframe(filtered.sample(DISPLAY_MAX_N))
+                st.write(filtered.shape)
+                if len(filtered) > DISPLAY_MAX_N:
+                    st.write(f"*Only showing a sample of {DISPLAY_MAX_N} rows*")
+            st.session_state["FILTERED DATA"] = filtered # update session state
             
             save = st.button("Save Filtered Data")
             if save:
                 ext = datetime.datetime.now().strftime("%Y-%m-%d")
                 filestr = uploaded_file.name.split('.')[0]
                 st.write(f"Filepath of filtered data: *data/{ext}-{filestr}-filtered.csv*")
-                filtered_df.to_csv(f'data/{ext} {filestr}.csv')
+                filtered.materialize().to_csv(f'data/{ext} {filestr}.csv')
             
     
     # upload artifacts widget
@@ -229,10 +251,17 @@ if __name__ == "__main__":
     # check valid artifacts, illustrate, and apply
     if uploaded_artifacts:
         artifacts = json.loads(uploaded_artifacts.read())
-        if check_artifacts:
+        if check_artifacts(artifacts):
             st.write(artifacts)
             # apply or confirm button
             
             if uploaded_file:
-                st.button("Apply")
+                apply = st.button("Apply")
+                if apply:
+                    pipeline = Pipeline(input_df = st.session_state["MASTER DATA"].copy())
+                    timings = pipeline.importArtifacts(artifacts)
+                    st.write(pipeline.metadata)
+                    st.dataframe(timings, use_container_width = True)
+                    with st.expander("Show Transformed Data"):
+                        st.dataframe(sample_data(pipeline.data))
     
@@ -7,6 +7,8 @@ from Start import describe_data
 import sys
 sys.path.append('src/')
 from visualizations import *
+from schema import display_dtypes
+from selection import RowSelection
 
 
 if __name__ == "__main__":
@@ -18,7 +20,7 @@ if __name__ == "__main__":
     if "MASTER DATA" not in st.session_state:
         st.session_state["MASTER DATA"] = pd.DataFrame()
     if "FILTERED DATA" not in st.session_state:
-        st.session_state["FILTERED DATA"] = pd.DataFrame()
+        st.session_state["FILTERED DATA"] = RowSelection(pd.DataFrame())
     
     data_subset = st.radio(label = "Select subset of data to be visualized.",
                            options = ("All Data", "Filtered Data"))
@@ -26,7 +28,7 @@ if __name__ == "__main__":
     if data_subset == "All Data":
         visualize_df = st.session_state["MASTER DATA"]
     else:
-        visualize_df = st.session_state["FILTERED DATA"]
+        visualize_df = st.session_state["FILTERED DATA"].materialize() # created on first use only
     
     st.write(f"Shape of selected data: `{visualize_df.shape}`")
     
@@ -34,7 +36,7 @@ if __name__ == "__main__":
         st.dataframe(describe_data(visualize_df))
     
     OneD, TwoD = st.tabs([" 1D  ","  2D  "])
-    dtypes = dict(visualize_df.dtypes)
+    dtypes = display_dtypes(visualize_df)
     
     with OneD:
         # select x-axis (non-datetime only)
@@ -6,8 +6,12 @@ import json
 
 import sys
 sys.path.append('src/')
+from selection import RowSelection
 from PipelineClass import Pipeline, valid_dtypes
 from transformations import recursive_transform
+from caching import StepCache
+from visualizations import PlotProfile
+from Start import describe_data
 
 
 if __name__ == "__main__":
@@ -19,7 +23,9 @@ if __name__ == "__main__":
     if "MASTER DATA" not in st.session_state:
         st.session_state["MASTER DATA"] = pd.DataFrame()
     if "FILTERED DATA" not in st.session_state:
-        st.session_state["FILTERED DATA"] = pd.DataFrame()
+        st.session_state["FILTERED DATA"] = RowSelection(pd.DataFrame())
+    if "STEP CACHE" not in st.session_state:
+        st.session_state["STEP CACHE"] = StepCache()
     
     data_subset = st.radio(label = "Select subset of data to be transformed.",
                            options = ("All Data", "Filtered Data"))
@@ -27,19 +33,20 @@ if __name__ == "__main__":
     if data_subset == "All Data":
         transform_df = st.session_state["MASTER DATA"]
     else:
-        transform_df = st.session_state["FILTERED DATA"]
+        transform_df = st.session_state["FILTERED DATA"].materialize() # created on first use only
     
     st.write(f"Shape of selected data: `{transform_df.shape}`")
     
-    # initialize pipeline object
-    pipeline = Pipeline(input_df = transform_df)
+    # initialize pipeline object (restored from the step cache on reruns)
+    cache = st.session_state["STEP CACHE"]
+    pipeline = cache.pipeline(transform_df, deltas = True)
     
     with st.expander("View Data"):
         st.dataframe(transform_df)
     
     if transform_df.shape[0] > 0:
         transform = st.checkbox("Apply Transformation")
-        steps = recursive_transform(transform, pipeline, n = 0)
+        pipeline = recursive_transform(transform, pipeline, n = 0, cache = cache)
         
         export = st.button("Export Pipeline", disabled = not transform)
         if export:
@@ -50,9 +57,30 @@ if __name__ == "__main__":
             st.write(pipeline.artifacts)
             
             creation_date = datetime.now().strftime('%Y%m%d')
-            # download artifacts as json file and save in /data
-            with open(f'../data/{creation_date}_artifacts.json', "w") as json_file:
+            # download artifacts as json file and save in /data (relative to the repository, where the app is run from)
+            with open(f'data/{creation_date}_artifacts.json', "w") as json_file:
                 json.dump(pipeline.artifacts, json_file, indent=4)
+            st.download_button("Download Artifacts", json.dumps(pipeline.artifacts, indent=4),
+                               file_name = f"{creation_date}_artifacts.json", mime = "application/json")
+            st.write(f"Apply the artifacts to other (or larger than memory) data sets with: `python src/batch.py data/{creation_date}_artifacts.json <files> --chunksize 100000`")
         
         with st.expander("View Transformed Data"):
             st.dataframe(pipeline.data)
+        
+        # only the columns written since the last description are profiled again (see Pipeline.changedColumns)
+        with st.expander("Describe Transformed Data"):
+            described, written = st.session_state.get("DESCRIBED TRANSFORM", (None, dict()))
+            st.dataframe(describe_data(pipeline.data, base = described, changed = pipeline.changedColumns(written)), use_container_width = True)
+            st.session_state["DESCRIBED TRANSFORM"] = (pipeline.data, dict(pipeline.written))
+        
+        # distribution of the columns touched by a step, before and after the step
+        if transform and pipeline.n_steps > 0 and st.toggle("Show Step Delta", help = "Summary statistics of the columns written (or dropped) by a step, before and after the step. Only the statistics that changed are shown."):
+            step = st.selectbox("Select step", [step for step in sorted(pipeline.deltas) if step <= pipeline.n_steps], index = None)
+            if step:
+                st.dataframe(pipeline.stepDelta(step).astype(str), use_container_width = True)
+        
+        # optional timeline of the time and memory taken by each step
+        if transform and st.toggle("Show Step Profile", help = "Wall and CPU time, rows, and memory of each transformation step. Steps restored from the cache show the profile of their first execution.") and len(pipeline.profile) > 0:
+            profile = pipeline.profile
+            st.altair_chart(PlotProfile(profile), use_container_width = True)
+            st.dataframe(profile.assign(peak_rss_mb = profile['peak_rss_bytes']/1024**2).drop(columns = ['peak_rss_bytes']), use_container_width = True)
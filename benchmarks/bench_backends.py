@@ -0,0 +1,91 @@
+import argparse
+import importlib.util
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from PipelineClass import Pipeline
+from backends import backend_order, backend_packages
+
+RTOL = 1e-9 # relative difference of floats allowed between backends (the statistics are summed in different orders)
+
+# columns of the data files used by the steps of the conformance plan
+files = {'data/FakeData.csv': {'numeric': ['Column F', 'Column O', 'Column J', 'Column I'], 'group': ['Column A', 'Column B']},
+         'data/Tanzania-Tourism.csv': {'numeric': ['night_mainland', 'night_zanzibar', 'total_female', 'total_male'], 'group': ['age_group', 'country']}
+}
+
+
+def make_plan(df, roles):
+    '''
+    FUNCTION to build a plan of the steps that the backends compute (group means, medians and standard deviations, and row-wise sums), grouped and ungrouped, over the columns of a data file.
+    '''
+    a, b, c, d = roles['numeric']
+    g1, g2 = roles['group']
+    median = float(pd.to_numeric(df[c], errors = 'coerce').median())
+    return [('ReplaceByStd', {'column': a, 'group_by': [g1], 'n_std': 2, 'fill': 'mean'}),
+            ('ReplaceByStd', {'column': b, 'n_std': 2, 'fill': 'median'}),
+            ('ReplaceByValue', {'column': c, 'bound': median, 'direction': '>', 'group_by': [g1, g2], 'fill': 'median'}),
+            ('ReplaceByValue', {'column': d, 'bound': 0, 'direction': '<=', 'group_by': [g2], 'fill': 'mean'}),
+            ('ReplaceByStd', {'column': c, 'group_by': [g2], 'n_std': 1, 'direction': '>', 'fill': 'median'}),
+            ('SumColumnValues', {'column_list': [a, b, c], 'target_column': 'Backend Sum'}),
+            ('ImputeWithEquation', {'column': a, 'Xs': [c, d], 'coefficients': [0.5, 2]})]
+
+
+def differences(expected, actual):
+    '''
+    FUNCTION to list the differences between the data, metadata, and artifacts of two Pipelines. Floats may differ by RTOL.
+    '''
+    found = []
+    if list(expected.data.columns) != list(actual.data.columns) or not expected.data.index.equals(actual.data.index):
+        return ["columns or rows"]
+    for col in expected.data.columns:
+        x, y = expected.data[col], actual.data[col]
+        if x.dtype != y.dtype:
+            found.append(f"dtype of {col}: {x.dtype} != {y.dtype}")
+        elif pd.api.types.is_float_dtype(x.dtype):
+            if not x.isna().equals(y.isna()) or not np.allclose(x.to_numpy('float64', na_value = 0), y.to_numpy('float64', na_value = 0), rtol = RTOL, atol = 0):
+                found.append(f"values of {col}")
+        elif not x.equals(y):
+            found.append(f"values of {col}")
+    if expected.metadata != actual.metadata:
+        found.append("metadata")
+    if expected.artifacts != actual.artifacts:
+        found.append("artifacts")
+    return found
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Check that every installed Pipeline backend gives the same output as pandas on the data files, and report their throughput.")
+    parser.add_argument("--scale", type = int, default = 1, help = "Number of copies of the rows of each file, for throughput")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of runs per backend (the best time is reported)")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    backends = [backend for backend in reversed(backend_order) if importlib.util.find_spec(backend_packages[backend]) is not None]
+    print(f"Installed backends: {', '.join(backends)}")
+    print(f"{'file':>26} {'backend':>8} {'rows':>9} {'seconds':>8} {'rows/s':>11}  conformance")
+    failed = False
+    for path, roles in files.items():
+        df = pd.read_csv(path)
+        df = pd.concat([df]*args.scale, ignore_index = True) if args.scale > 1 else df
+        plan = make_plan(df, roles)
+        expected = None
+        for backend in backends:
+            best = None
+            for _ in range(args.repeat):
+                pipeline = Pipeline(df, backend = backend)
+                start = time.perf_counter()
+                timings = pipeline.runPlan(plan)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            assert (timings['status'] == 'done').all() and len(timings) == len(plan), f"The plan failed with the {backend} backend."
+            expected = pipeline if expected is None else expected
+            found = differences(expected, pipeline)
+            failed = failed or bool(found)
+            print(f"{path.split('/')[-1][-26:]:>26} {backend:>8} {len(df):>9} {best:>8.3f} {len(df)/best:>11.0f}  {'; '.join(found) if found else 'identical'}")
+
+    sys.exit(1 if failed else 0)
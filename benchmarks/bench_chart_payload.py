@@ -0,0 +1,61 @@
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import altair as alt
+
+import sys
+sys.path.append('src/')
+from visualizations import PlotBar, PlotDensity
+
+ROWS = [1000, 10000, 100000, 1000000]
+
+
+def make_frame(n_rows, seed = 0):
+    '''
+    FUNCTION to generate a synthetic frame with a categorical, a group, and a numeric column.
+    '''
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'age_group': pd.Series(rng.choice(['<18', '18-24', '25-44', '45-64', '65+'], n_rows), dtype = 'string'),
+                         'travel_with': pd.Series(rng.choice(['Alone', 'Spouse', 'Children', 'Friends'], n_rows), dtype = 'string'),
+                         'nights': pd.Series(rng.gamma(2, 3, n_rows), dtype = 'Float64')})
+
+
+def raw_bar(df, x, group_by):
+    # previous PlotBar: raw rows are shipped and counted in the browser
+    df = df.dropna(subset = [x]).copy()
+    df['Group'] = df[group_by].astype(str).agg(', '.join, axis = 1)
+    return alt.Chart(df).mark_bar().encode(x = f'{x}:N', y = 'count():Q', color = 'Group:N')
+
+
+def raw_density(df, x, group_by):
+    # previous PlotDensity: raw rows are shipped and the density is estimated in the browser
+    df = df.dropna(subset = [x]).copy()
+    df['Group'] = df[group_by].astype(str).agg(', '.join, axis = 1)
+    return alt.Chart(df).transform_density(density = x, groupby = ['Group'], as_ = [x, 'density']).mark_area().encode(x = f'{x}:Q', y = 'density:Q', color = 'Group:N')
+
+
+def measure(build):
+    # time to build the chart and serialize it to the JSON spec sent to the browser
+    start = time.perf_counter()
+    payload = build().to_json()
+    return time.perf_counter() - start, len(payload)
+
+
+if __name__ == "__main__":
+    
+    parser = argparse.ArgumentParser(description = "Compare the serialized payload size and build time of raw-row and pre-aggregated charts.")
+    parser.add_argument("--max-rows", type = int, default = max(ROWS), help = "Largest number of rows to benchmark")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    alt.data_transformers.disable_max_rows() # raw charts exceed the default limit of 5000 rows
+    
+    print(f"{'chart':>8} {'rows':>8} {'raw (s)':>9} {'raw (KB)':>10} {'aggregated (s)':>15} {'aggregated (KB)':>16}")
+    for n_rows in [n for n in ROWS if n <= args.max_rows]:
+        df = make_frame(n_rows)
+        for name, raw, aggregated in [('bar', lambda: raw_bar(df, 'age_group', ['travel_with']), lambda: PlotBar(df, 'age_group', ['travel_with'])),
+                                      ('density', lambda: raw_density(df, 'nights', ['travel_with']), lambda: PlotDensity(df, 'nights', ['travel_with']))]:
+            raw_time, raw_size = measure(raw)
+            agg_time, agg_size = measure(aggregated)
+            print(f"{name:>8} {n_rows:>8} {raw_time:>9.3f} {raw_size/1024:>10.1f} {agg_time:>15.3f} {agg_size/1024:>16.1f}")
@@ -0,0 +1,161 @@
+import argparse
+import os
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from PipelineClass import Pipeline
+from batch import read_file, apply_chunked, chunked_statistics
+from ingestion import iter_chunks
+from schema import infer_schema, merge_schemas
+from streaming import group_keys, TDIGEST_COMPRESSION, TDIGEST_EXACT_SIZE
+
+RTOL = 1e-9 # relative difference of floats allowed with exact medians (means and standard deviations are merged across chunks in a different order)
+RANK_TOLERANCE = 2/TDIGEST_COMPRESSION # rank error allowed for t-digest medians of groups with more than TDIGEST_EXACT_SIZE values (about 1/compression expected)
+
+# columns of the data files used by the steps of the plan
+files = {'data/FakeData.csv': {'numeric': ['Column F', 'Column O', 'Column J', 'Column I'], 'group': ['Column A', 'Column B']},
+         'data/Tanzania-Tourism.csv': {'numeric': ['night_mainland', 'night_zanzibar', 'total_female', 'total_male'], 'group': ['age_group', 'country']}
+}
+
+
+def make_plan(roles):
+    '''
+    FUNCTION to build a plan of steps that need statistics over the whole data (group means, medians, and standard deviations, grouped and ungrouped), around row-local steps and a DropRows, including a step whose statistics depend on those of earlier steps (i.e. a second pass).
+    '''
+    a, b, c, d = roles['numeric']
+    g1, g2 = roles['group']
+    return [('DropRows', {'column_list': [g2]}),
+            ('ReplaceByStd', {'column': a, 'group_by': [g1], 'n_std': 2, 'fill': 'mean'}),
+            ('ReplaceByValue', {'column': c, 'bound': 0, 'direction': '>', 'group_by': [g1, g2], 'fill': 'median'}),
+            ('ReplaceByStd', {'column': b, 'n_std': 1, 'fill': 'median'}),
+            ('ReplaceByValue', {'column': d, 'bound': 0, 'direction': '<=', 'fill': 'mean'}),
+            ('SumColumnValues', {'column_list': [a, b], 'target_column': 'Chunked Sum'}),
+            ('ImputeWithEquation', {'column': c, 'Xs': [a, d], 'coefficients': [0.5, 2]}),
+            ('ReplaceByStd', {'column': 'Chunked Sum', 'group_by': [g1], 'n_std': 2, 'fill': 'median'})]
+
+
+def differences(expected, actual, rtol = RTOL):
+    '''
+    FUNCTION to list the differences between two frames, ignoring their index. Floats may differ by rtol.
+    '''
+    expected, actual = expected.reset_index(drop = True), actual.reset_index(drop = True)
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        return [f"columns or rows: {list(actual.columns)}, {len(actual)} rows"]
+    found = []
+    for col in expected.columns:
+        x, y = expected[col], actual[col]
+        if x.dtype != y.dtype:
+            found.append(f"dtype of {col}: {x.dtype} != {y.dtype}")
+        elif pd.api.types.is_float_dtype(x.dtype):
+            if not x.isna().equals(y.isna()) or not np.allclose(x.to_numpy('float64', na_value = 0), y.to_numpy('float64', na_value = 0), rtol = rtol, atol = 0):
+                found.append(f"values of {col}")
+        elif not x.equals(y):
+            found.append(f"values of {col}")
+    return found
+
+
+def rank_error(values, median):
+    # distance of the ranks of the median among the values from 1/2; a median interpolated between two adjacent values (e.g. of integer counts) covers the ranks of both
+    values = values[~np.isnan(values)]
+    if len(values) == 0 or pd.isna(median):
+        return 0.0
+    below, above = values[values <= median], values[values >= median]
+    lower = below.max() if len(below) else median
+    upper = above.min() if len(above) else median
+    return max(np.mean(values < lower) - 0.5, 0.5 - np.mean(values <= upper), 0.0)
+
+
+def median_rank_errors(df, plan, stats):
+    '''
+    FUNCTION to measure the rank error of the medians computed over chunks, against the values of the column (per group) in the data before each step, as applied in memory.
+    Returns the largest rank error over all the medians and groups of groups with more than TDIGEST_EXACT_SIZE values (smaller groups are exact).
+    '''
+    pipeline, largest = Pipeline(df), 0.0
+    for i, (method, params) in enumerate(plan):
+        if i in stats and 'median' in stats[i]:
+            values = pd.to_numeric(pipeline.data[params['column']], errors = 'coerce').to_numpy(dtype = 'float64', na_value = np.nan)
+            medians = stats[i]['median']
+            if not params.get('group_by'):
+                groups = {None: (values, medians)}
+            else:
+                keys = group_keys(pipeline.data, params['group_by'])
+                groups = {key: (values[rows], medians.get(key, np.nan)) for key, rows in pd.Series(np.arange(len(values))).groupby(keys.to_numpy(), dropna = True).groups.items()}
+            for values, median in groups.values():
+                if np.count_nonzero(~np.isnan(values)) > TDIGEST_EXACT_SIZE:
+                    largest = max(largest, rank_error(values, median))
+        pipeline.runPlan([(method, params)])
+    return largest
+
+
+def apply_chunks(path, plan, chunksize, exact):
+    '''
+    FUNCTION to apply a plan to the chunks of a data set as batch.apply_chunked does, keeping the Pipeline of every chunk.
+    Returns the Pipelines of the chunks and the statistics computed over all chunks.
+    '''
+    schema = merge_schemas([infer_schema(chunk) for chunk in iter_chunks(path, chunksize)])
+    stats, _ = chunked_statistics(path, plan, schema, chunksize, exact = exact)
+    pipelines = []
+    for chunk in iter_chunks(path, chunksize):
+        pipeline = Pipeline(input_df = chunk, schema = schema)
+        pipeline.runPlan(plan, stats = stats)
+        pipelines.append(pipeline)
+    return pipelines, stats
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Check that applying a plan in chunks (batch.py --chunksize) gives the same data, metadata, and artifacts as applying it in memory, with exact and t-digest medians.")
+    parser.add_argument("--scale", type = int, default = 1, help = "Number of copies of the rows of each file (more rows per group exercise the t-digests)")
+    parser.add_argument("--chunks", type = int, default = 7, help = "Number of chunks each file is split into")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"{'file':>26} {'rows':>8} {'medians':>9} {'seconds':>8}  {'data':<24} {'metadata':<10} {'artifacts':<10} apply_chunked")
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for path, roles in files.items():
+            df = read_file(path)
+            if args.scale > 1:
+                path = os.path.join(directory, os.path.basename(path))
+                pd.concat([df]*args.scale, ignore_index = True).to_csv(path, index = False)
+                df = read_file(path)
+            plan = make_plan(roles)
+            chunksize = -(-len(df)//args.chunks)
+
+            expected = Pipeline(df)
+            timings = expected.runPlan(plan)
+            assert (timings['status'] == 'done').all() and len(timings) == len(plan), f"The plan failed in memory on {path}."
+
+            for medians in ['exact', 't-digest']:
+                start = time.perf_counter()
+                pipelines, stats = apply_chunks(path, plan, chunksize, exact = medians == 'exact')
+                seconds = time.perf_counter() - start
+                data = pd.concat([pipeline.data for pipeline in pipelines], ignore_index = True)
+                metadata = all(pipeline.metadata == expected.metadata for pipeline in pipelines)
+                artifacts = all(pipeline.artifacts == expected.artifacts for pipeline in pipelines)
+
+                if medians == 'exact':
+                    found = differences(expected.data, data)
+                    data_check = '; '.join(found) if found else 'identical'
+                    # the output of batch.py --chunksize --exact-medians
+                    apply_chunked(path, plan, directory, chunksize, exact = True)
+                    output = os.path.join(directory, os.path.splitext(os.path.basename(path))[0])
+                    written = pd.concat([pd.read_parquet(os.path.join(output, part)) for part in sorted(os.listdir(output))], ignore_index = True)
+                    output_found = differences(data, written, rtol = 0)
+                    output_check = '; '.join(output_found) if output_found else 'identical'
+                    failed = failed or bool(found) or bool(output_found)
+                else:
+                    error = median_rank_errors(df, plan, stats)
+                    data_check = f"median rank error {error:.4f}"
+                    output_check = ''
+                    failed = failed or error > RANK_TOLERANCE
+                failed = failed or not metadata or not artifacts
+                print(f"{path.split('/')[-1][-26:]:>26} {len(df):>8} {medians:>9} {seconds:>8.3f}  {data_check:<24} {'identical' if metadata else 'differ':<10} {'identical' if artifacts else 'differ':<10} {output_check}")
+
+    print(f"Floats may differ by a relative {RTOL} with exact medians; t-digest medians may differ from exact medians by a rank error of {RANK_TOLERANCE} in groups of more than {TDIGEST_EXACT_SIZE} values.")
+    sys.exit(1 if failed else 0)
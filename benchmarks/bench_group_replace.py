@@ -0,0 +1,47 @@
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from PipelineClass import Pipeline
+
+CARDINALITIES = [10, 100, 1000, 10000, 100000]
+
+
+def make_frame(n_rows, n_groups, seed = 0):
+    '''
+    FUNCTION to generate a synthetic frame with a numeric column and a two-level group key (country x year) with roughly n_groups unique combinations.
+    '''
+    rng = np.random.default_rng(seed)
+    n_years = min(n_groups, 10)
+    n_countries = max(n_groups // n_years, 1)
+    df = pd.DataFrame({'country': rng.integers(0, n_countries, n_rows).astype(str),
+                       'year': rng.integers(2000, 2000 + n_years, n_rows),
+                       'spend': rng.lognormal(3, 1, n_rows)})
+    df.loc[rng.random(n_rows) < 0.05, 'spend'] = np.nan
+    return df
+
+
+def time_step(df, method, **params):
+    pipeline = Pipeline(df)
+    start = time.perf_counter()
+    getattr(pipeline, method)(**params)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    
+    parser = argparse.ArgumentParser(description = "Time group-wise ReplaceByValue and ReplaceByStd over a sweep of group cardinalities.")
+    parser.add_argument("--rows", type = int, default = 1000000, help = "Number of rows of the synthetic frame")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    
+    print(f"{'groups':>8} {'ReplaceByValue (s)':>20} {'ReplaceByStd (s)':>18}")
+    for n_groups in CARDINALITIES:
+        df = make_frame(args.rows, n_groups)
+        by_value = time_step(df, 'ReplaceByValue', column = 'spend', bound = 100, direction = '>', group_by = ['country', 'year'], fill = 'median')
+        by_std = time_step(df, 'ReplaceByStd', column = 'spend', group_by = ['country', 'year'], n_std = 3, fill = 'mean')
+        print(f"{n_groups:>8} {by_value:>20.3f} {by_std:>18.3f}")
@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+import warnings
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from ingestion import ColumnarCache, file_formats, list_data_files, excel_engines, excel_engine
+
+
+def time_parse(path, reader, repeat):
+    # best time of repeat parses of the file, as the upload page parses it (from bytes)
+    best, df = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = reader(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, df
+
+
+def time_cached(path, reader):
+    # time of a load from a warm columnar cache
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ColumnarCache(directory)
+        cache.load(path, reader)
+        start = time.perf_counter()
+        cache.load(path, reader)
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Report the parse throughput of every data file of a directory, per format, with the fastest installed engines.")
+    parser.add_argument("path", nargs = "?", default = "data", help = "Directory of data files")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of parses per file (the best time is reported)")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print("Excel engines: " + ", ".join(f"{ext}={excel_engine(ext)}" for ext in excel_engines))
+    print(f"{'file':>32} {'format':>7} {'MB':>7} {'rows':>8} {'parse (s)':>10} {'MB/s':>8} {'rows/s':>10} {'cached (s)':>11}")
+    totals = dict()
+    for path in list_data_files(args.path):
+        ext = os.path.splitext(path)[1][1:].lower()
+        size = os.path.getsize(path)/1024**2
+        try:
+            seconds, df = time_parse(path, file_formats[ext], args.repeat)
+            cached = time_cached(path, file_formats[ext])
+
+        except Exception as e:
+            print(f"{os.path.basename(path)[-32:]:>32} {ext:>7} {size:>7.2f}   skipped: {e}")
+            continue
+
+        print(f"{os.path.basename(path)[-32:]:>32} {ext:>7} {size:>7.2f} {len(df):>8} {seconds:>10.3f} {size/seconds:>8.2f} {len(df)/seconds:>10.0f} {cached:>11.3f}")
+        mb, rows, total = totals.get(ext, (0, 0, 0))
+        totals[ext] = (mb + size, rows + len(df), total + seconds)
+
+    print(f"\n{'format':>7} {'MB/s':>8} {'rows/s':>10}")
+    for ext, (mb, rows, seconds) in totals.items():
+        print(f"{ext:>7} {mb/seconds:>8.2f} {rows/seconds:>10.0f}")
@@ -0,0 +1,250 @@
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+import warnings
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from PipelineClass import Pipeline
+from profiling import ProfileCache
+from selection import FilterIndex
+from visualizations import PlotBar, PlotDensity, PlotScatter, PlotTimeseries, PlotStrip, PlotBox
+
+ROWS = [10000, 100000, 1000000, 10000000]
+BASELINE = "benchmarks/baseline.json"
+TOLERANCE = 0.5 # relative slowdown (or growth of peak memory) flagged as a regression
+MIN_SECONDS = 0.01 # absolute slowdown below which timings are considered noise
+
+
+def make_fakedata(n_rows, seed = 0):
+    '''
+    FUNCTION to generate a synthetic frame shaped like data/FakeData.csv: nominal and ordinal strings, small integers, dates, booleans, and floats with missing values.
+    Returns the frame and the roles of its columns in the benchmark cases.
+    '''
+    rng = np.random.default_rng(seed)
+    def nominal(prefix, k):
+        values = np.array([f"{prefix}.{i}" for i in range(1, k + 1)] + [None], dtype = object)
+        return values[rng.integers(0, k + 1, n_rows)]
+    def floats(loc, scale, missing):
+        values = rng.normal(loc, scale, n_rows)
+        values[rng.random(n_rows) < missing] = np.nan
+        return values
+    df = pd.DataFrame({'Column A': nominal("Nominal A", 5),
+                       'Column B': nominal("Nominal B", 7),
+                       'Column C': nominal("Nominal C", 3),
+                       'Column D': rng.integers(0, 10, n_rows),
+                       'Column E': pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 365*24*60, n_rows), unit = 'min'),
+                       'Column F': floats(0, 10, 0.25),
+                       'Column G': nominal("Ordinal G", 8),
+                       'Column H': rng.random(n_rows) < 0.5,
+                       'Column I': floats(0.5, 0.2, 0.35),
+                       'Column J': floats(500000, 100000, 0.25),
+                       'Column O': floats(30, 10, 0.2),
+                       'Column P': nominal("Nominal P", 6),
+                       'Column Q': rng.random(n_rows),
+                       'Column S': np.where(rng.random(n_rows) < 0.5, np.nan, rng.integers(0, 10, n_rows))})
+    roles = {'numeric': 'Column F', 'numeric2': 'Column O', 'group': 'Column A', 'string': 'Column C', 'date': 'Column E'}
+    return df, roles
+
+
+def make_tanzania(n_rows, seed = 0):
+    '''
+    FUNCTION to generate a synthetic frame shaped like data/Tanzania-Tourism.csv: a unique ID, a high-cardinality country, low-cardinality categories, yes/no flags, and counts of people and nights.
+    Returns the frame and the roles of its columns in the benchmark cases.
+    '''
+    rng = np.random.default_rng(seed)
+    def choice(values):
+        return np.array(values, dtype = object)[rng.integers(0, len(values), n_rows)]
+    df = pd.DataFrame({'Tour_ID': np.char.add("tour_id", np.arange(n_rows).astype(str)).astype(object),
+                       'country': choice([f"COUNTRY {i}" for i in range(131)]),
+                       'age_group': choice(["<18", "18-24", "25-44", "45-64", "65+"]),
+                       'travel_with': choice(["Alone", "With Spouse", "With Children", "With Other Friends/Relatives", None]),
+                       'total_female': np.where(rng.random(n_rows) < 0.01, np.nan, rng.poisson(1, n_rows)),
+                       'total_male': np.where(rng.random(n_rows) < 0.01, np.nan, rng.poisson(1, n_rows)),
+                       'purpose': choice(["Leisure and Holidays", "Business", "Meetings and Conference", "Visiting Friends and Relatives", "Scientific and Academic", "Volunteering", "Other"]),
+                       'main_activity': choice(["Wildlife Tourism", "Beach Tourism", "Hunting Tourism", "Conference Tourism", "Cultural Tourism", "Mountain Climbing", "Bird Tourism"]),
+                       'tour_arrangement': choice(["Independent", "Package Tour"]),
+                       'package_transport_int': choice(["Yes", "No"]),
+                       'package_food': choice(["Yes", "No"]),
+                       'package_insurance': choice(["Yes", "No"]),
+                       'night_mainland': rng.poisson(7, n_rows),
+                       'night_zanzibar': rng.poisson(3, n_rows),
+                       'first_trip_tz': choice(["Yes", "No"]),
+                       'cost_category': choice(["Lowest Cost", "Low Cost", "Normal Cost", "High Cost", "Higher Cost", "Highest Cost"])})
+    roles = {'numeric': 'night_mainland', 'numeric2': 'total_female', 'group': 'age_group', 'string': 'purpose', 'date': None}
+    return df, roles
+
+
+shapes = {'fakedata': make_fakedata,
+          'tanzania': make_tanzania
+}
+
+
+def step_case(method, **params):
+    # a Pipeline step, timed on a fresh Pipeline of the frame; a step that fails (and only prints) raises
+    def setup(df, roles):
+        return Pipeline(df)
+    def run(pipeline):
+        n_steps = pipeline.n_steps
+        getattr(pipeline, method)(**params)
+        assert pipeline.n_steps > n_steps, f"{method} failed"
+    return setup, run
+
+
+def data_case(run):
+    # a function of the master data of the app, i.e. the frame with the dtypes inferred by Pipeline
+    def setup(df, roles):
+        return Pipeline(df).data
+    return setup, run
+
+
+def chart_case(plot, *columns, **params):
+    # a chart of the columns with the given roles, built and serialized to the JSON spec sent to the browser
+    def setup(df, roles):
+        assert all(roles[col] for col in columns), "no column for this chart"
+        return Pipeline(df).data, [roles[col] for col in columns]
+    def run(state):
+        df, names = state
+        chart = plot(df, *names, **params)
+        assert chart is not None, f"{plot.__name__} failed"
+        chart.to_json()
+    return setup, run
+
+
+def make_cases(df, roles):
+    '''
+    FUNCTION to list the benchmark cases (name, setup, run) for a frame with the given column roles. setup(df, roles) prepares the state passed to run, and is not timed.
+    '''
+    num, num2, group, string = roles['numeric'], roles['numeric2'], roles['group'], roles['string']
+    recode_dict = {value: value.upper() for value in df[string].dropna().unique()[:2]}
+    def filter_rows(index):
+        # as on the Start page: two categories of the group column, then the range of values of a numeric column
+        rows = index.filter_categories(group, index.category_values(group)[:2])
+        index.filter_range(num, *index.value_range(num, rows), rows)
+    def prebuilt_index(df, roles):
+        index = FilterIndex(Pipeline(df).data)
+        filter_rows(index)
+        return index
+
+    return [('Pipeline', lambda df, roles: df, Pipeline),
+            ('DropColumns', *step_case('DropColumns', column_list = [string])),
+            ('DropRows', *step_case('DropRows', column_list = [num])),
+            ('RenameColumns', *step_case('RenameColumns', recode_dict = {num: 'renamed'})),
+            ('RecodeColumnTypes', *step_case('RecodeColumnTypes', recode_dict = {num: 'float', string: 'categorical'})),
+            ('ReplaceByValue', *step_case('ReplaceByValue', column = num, bound = 0, direction = '>', group_by = [group], fill = 'median')),
+            ('ReplaceByStd', *step_case('ReplaceByStd', column = num, group_by = [group], n_std = 2, fill = 'mean')),
+            ('RecodeColumnValues', *step_case('RecodeColumnValues', column = string, recode_dict = recode_dict)),
+            ('SumColumnValues', *step_case('SumColumnValues', column_list = [num, num2], target_column = 'total')),
+            ('ImputeWithKNN', *step_case('ImputeWithKNN', column = num, features = [num2], add_indicator = False)),
+            ('ImputeWithEquation', *step_case('ImputeWithEquation', column = num, Xs = [num2], coefficients = [0.5])),
+            ('ImputeWithValue', *step_case('ImputeWithValue', column = string, value = 'missing')),
+            ('describe_data', *data_case(lambda df: ProfileCache().profile(df))),
+            ('filter (first)', *data_case(lambda df: filter_rows(FilterIndex(df)))),
+            ('filter (rerun)', prebuilt_index, filter_rows),
+            ('PlotBar', *chart_case(PlotBar, 'string', group_by = [group])),
+            ('PlotDensity', *chart_case(PlotDensity, 'numeric', group_by = [group])),
+            ('PlotScatter', *chart_case(PlotScatter, 'numeric', 'numeric2', group_by = [group])),
+            ('PlotTimeseries', *chart_case(PlotTimeseries, 'date', 'numeric', group_by = [group])),
+            ('PlotStrip', *chart_case(PlotStrip, 'date', 'string')),
+            ('PlotBox', *chart_case(PlotBox, 'numeric'))]
+
+
+def measure(setup, run, df, roles, repeat):
+    '''
+    FUNCTION to measure the peak memory of a benchmark case in a run traced with tracemalloc, which also warms up lazy imports and caches, then time it (best of repeat runs, each on a fresh setup) without tracing, since tracing slows down the code it traces.
+    Returns (seconds, peak MB).
+    '''
+    state = setup(df, roles)
+    tracemalloc.start()
+    try:
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = None
+    for _ in range(repeat):
+        state = setup(df, roles)
+        gc.collect()
+        gc.disable() # as in timeit, so that collections of earlier garbage do not add noise
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak/1024**2
+
+
+def compare(results, baseline, tolerance = TOLERANCE):
+    '''
+    FUNCTION to flag the results that regressed against a baseline: slower by more than tolerance (and MIN_SECONDS), or with a peak memory larger by more than tolerance.
+    Parameters:
+    - results: List of dictionaries with keys shape, rows, case, seconds, peak_mb
+    - baseline: List of results of a previous run
+    '''
+    previous = {(r['shape'], r['rows'], r['case']): r for r in baseline}
+    for result in results:
+        base = previous.get((result['shape'], result['rows'], result['case']))
+        flags = []
+        if base is not None:
+            if result['seconds'] > base['seconds']*(1 + tolerance) and result['seconds'] - base['seconds'] > MIN_SECONDS:
+                flags.append(f"time x{result['seconds']/base['seconds']:.2f}")
+            if result['peak_mb'] > base['peak_mb']*(1 + tolerance) and result['peak_mb'] - base['peak_mb'] > 1:
+                flags.append(f"memory x{result['peak_mb']/base['peak_mb']:.2f}")
+        result['regression'] = ', '.join(flags)
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Time every Pipeline step, the column profiles of describe_data, filtering, and every Plot* builder on synthetic frames, and flag regressions against a stored baseline.")
+    parser.add_argument("--rows", type = int, nargs = "+", default = ROWS[:3], help = f"Numbers of rows of the synthetic frames (up to {ROWS[-1]})")
+    parser.add_argument("--shapes", nargs = "+", default = list(shapes.keys()), choices = list(shapes.keys()), help = "Shapes of the synthetic frames")
+    parser.add_argument("--cases", nargs = "+", default = None, help = "Only run the cases with these names")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of timed runs per case (the best time is reported)")
+    parser.add_argument("--baseline", default = BASELINE, help = "JSON file of the baseline results")
+    parser.add_argument("--save", action = "store_true", help = "Store the results as the new baseline instead of comparing against it")
+    parser.add_argument("--tolerance", type = float, default = TOLERANCE, help = "Relative slowdown flagged as a regression")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    alt.data_transformers.disable_max_rows() # charts of raw rows (e.g. PlotBox) exceed the default limit of 5000 rows
+
+    results = []
+    print(f"{'shape':>9} {'rows':>9} {'case':>20} {'seconds':>9} {'peak MB':>9}")
+    for shape in args.shapes:
+        for n_rows in args.rows:
+            df, roles = shapes[shape](n_rows)
+            for case, setup, run in make_cases(df, roles):
+                if args.cases and case not in args.cases:
+                    continue
+                try:
+                    seconds, peak_mb = measure(setup, run, df, roles, args.repeat)
+
+                except Exception as e:
+                    print(f"{shape:>9} {n_rows:>9} {case:>20}   skipped: {e}")
+                    continue
+
+                print(f"{shape:>9} {n_rows:>9} {case:>20} {seconds:>9.4f} {peak_mb:>9.1f}")
+                results.append({'shape': shape, 'rows': n_rows, 'case': case, 'seconds': seconds, 'peak_mb': peak_mb})
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent = 1)
+        print(f"\nSaved {len(results)} results to {args.baseline}")
+
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            results = compare(results, json.load(f), args.tolerance)
+        regressions = [r for r in results if r['regression']]
+        print(f"\n{len(regressions)} regressions against {args.baseline}" + (":" if regressions else ""))
+        for r in regressions:
+            print(f"{r['shape']:>9} {r['rows']:>9} {r['case']:>20}   {r['regression']}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,189 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append('src/')
+from PipelineClass import Pipeline
+from caching import StepCache
+
+
+def done(pipeline, plan):
+    # every step of the plan was applied (nested steps, e.g. the dtype recode of ImputeWithKNN, are not in the profile)
+    profile = pipeline.profile
+    return len(profile) == len(plan) and (profile['status'] == 'done').all()
+
+
+def run_modes(df, plan, compact = False):
+    '''
+    FUNCTION to apply a plan of steps to a frame in every execution mode of Pipeline: eager, lazy (collect), and scheduled (runPlan with several threads), with the data in memory-compact dtypes if compact = True.
+    Returns a dictionary {mode: transformed data}; a mode in which a step failed maps to None.
+    '''
+    results = dict()
+    eager = Pipeline(df, compact = compact)
+    for method, params in plan:
+        getattr(eager, method)(**params)
+    results['eager'] = eager.data if done(eager, plan) else None
+
+    lazy = Pipeline(df, lazy = True, compact = compact)
+    for method, params in plan:
+        getattr(lazy, method)(**params)
+    lazy.collect() # the steps of a lazy Pipeline are profiled when they are executed
+    results['lazy'] = lazy.data if done(lazy, plan) else None
+
+    scheduled = Pipeline(df, compact = compact)
+    timings = scheduled.runPlan(plan, max_workers = 2)
+    results['runPlan'] = scheduled.data if (timings['status'] == 'done').all() and len(timings) == len(plan) else None
+    return results
+
+
+def check_knn_after_droprows():
+    '''
+    FUNCTION to check that ImputeWithKNN writes the imputed values to their own rows when earlier steps dropped rows, i.e. gave the data an index with gaps. The result must equal the imputation of the same rows with a fresh index.
+    '''
+    df = pd.DataFrame({'a': [1, np.nan, 3, 4, np.nan, 6, np.nan, 10],
+                       'b': [1, 2, 3, 4, 5, 6, 7, 8],
+                       'f': [np.nan, 1.1, 3, 4.2, 5.9, 6, 9.7, 10]})
+    kept = df.dropna(subset = ['f']).reset_index(drop = True)
+    failures = []
+    for params in [{'features': ['f'], 'n_neighbors': 1}, {'features': ['f', 'b'], 'n_neighbors': 2, 'weights': 'distance'}, {'n_neighbors': 2}]:
+        params = {'column': 'a', 'add_indicator': False, **params}
+        expected = Pipeline(kept)
+        expected.ImputeWithKNN(**params)
+        for mode, data in run_modes(df, [('DropRows', {'column_list': ['f']}), ('ImputeWithKNN', params)]).items():
+            if data is None:
+                failures.append(f"ImputeWithKNN after DropRows ({mode}, {params}): a step failed")
+            elif not np.array_equal(data['a'].to_numpy('float64', na_value = np.nan), expected.data['a'].to_numpy('float64', na_value = np.nan), equal_nan = True):
+                failures.append(f"ImputeWithKNN after DropRows ({mode}, {params}): {list(data['a'])} != {list(expected.data['a'])}")
+    return failures
+
+
+def check_compact_writes():
+    '''
+    FUNCTION to check that steps writing values outside the categories or range of memory-compact columns (e.g. a new string in a category, or 1000 in an Int8 column) give the same columns as on uncompacted data, whether the Pipeline compacts the data itself or is given compacted data (as the Transform page is with the compact memory mode of the Start page).
+    '''
+    df = pd.DataFrame({'group': ['a', 'b', 'a', None, 'b', 'a'],
+                       'count': [1, 2, None, 4, 5, 6],
+                       'share': [0.5, 0.25, None, 0.75, 1.0, 0.125]})
+    plan = [('ImputeWithValue', {'column': 'group', 'value': 'unknown'}),
+            ('ImputeWithValue', {'column': 'count', 'value': 1000}),
+            ('ReplaceByValue', {'column': 'share', 'bound': 0.6, 'direction': '>', 'fill': 0.1}),
+            ('RecodeColumnValues', {'column': 'group', 'recode_dict': {'a': 'A'}})]
+    expected = run_modes(df, plan)['eager']
+    failures = []
+    for given, data in [('compact = True', df), ('compacted data', Pipeline(df, compact = True).data)]:
+        for mode, result in run_modes(data, plan, compact = given == 'compact = True').items():
+            if result is None:
+                failures.append(f"compact writes ({given}, {mode}): a step failed")
+            elif not result.astype(str).equals(expected.astype(str)):
+                failures.append(f"compact writes ({given}, {mode}): {result.to_dict('list')} != {expected.to_dict('list')}")
+    return failures
+
+
+def check_collect_failure():
+    '''
+    FUNCTION to check that a lazy Pipeline whose step succeeds on the schema but fails on the data (imputing a string into an integer column with values) does not record that step, or any later step, in its metadata and artifacts.
+    '''
+    df = pd.DataFrame({'a': [1.0, np.nan, 3.0], 'b': ['x', 'y', None], 'c': [1, 2, 3]})
+    lazy = Pipeline(df, lazy = True)
+    lazy.DropColumns(['c'])
+    lazy.ImputeWithValue('a', 'zz')
+    lazy.ImputeWithValue('b', 'q')
+    lazy.collect()
+    failures = []
+    if lazy.artifacts != {1: {'DropColumns': ['c']}} or lazy.n_steps != 1 or lazy.metadata.count('\n') != 1:
+        failures.append(f"collect recorded steps that were not executed: {lazy.artifacts}")
+    if lazy.plan:
+        failures.append("collect kept the plan after executing it")
+    return failures
+
+
+def check_input_unchanged():
+    '''
+    FUNCTION to check that the frame given to a Pipeline is the same before and after imputation and replace steps are applied to it in every execution mode, including steps on columns that already have the dtype the step recodes them to (which are not converted, see schema.recode_columns).
+    '''
+    df = pd.DataFrame({'a': pd.array([1.5, None, 3.0, 40.0, 2.0, None], dtype = 'Float64'),
+                       'b': pd.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0], dtype = 'Float64'),
+                       'c': [10.0, 20.0, np.nan, 40.0, 50.0, 60.0],
+                       'g': pd.array(['x', 'y', 'x', 'y', 'x', None], dtype = 'string')})
+    plan = [('RecodeColumnTypes', {'recode_dict': {'a': 'float', 'b': 'float', 'g': 'string'}}),
+            ('ImputeWithEquation', {'column': 'a', 'Xs': ['b'], 'coefficients': [2]}),
+            ('ReplaceByValue', {'column': 'b', 'bound': 4, 'direction': '>=', 'fill': 'mean'}),
+            ('ReplaceByValue', {'column': 'c', 'bound': 45, 'direction': '>', 'group_by': ['g'], 'fill': 'median'}),
+            ('ReplaceByStd', {'column': 'a', 'n_std': 1, 'fill': 'median'}),
+            ('ImputeWithValue', {'column': 'g', 'value': 'z'}),
+            ('ImputeWithKNN', {'column': 'c', 'features': ['b'], 'n_neighbors': 1, 'add_indicator': False})]
+    before = df.copy()
+    failures = []
+    for mode, data in run_modes(df, plan).items():
+        if data is None:
+            failures.append(f"input unchanged ({mode}): a step failed")
+        if not df.equals(before):
+            failures.append(f"input unchanged ({mode}): {df.to_dict('list')} != {before.to_dict('list')}")
+            df = before.copy()
+    history = Pipeline(df, history = True)
+    history.runPlan(plan)
+    if not df.equals(before):
+        failures.append(f"input unchanged (history): {df.to_dict('list')} != {before.to_dict('list')}")
+    return failures
+
+
+def check_replace_not_equal():
+    '''
+    FUNCTION to check that ReplaceByValue with direction '!=' replaces missing values too (missing values are != any bound), in every execution mode, unless their group is missing.
+    '''
+    df = pd.DataFrame({'a': [1.0, np.nan, 3.0, 5.0, np.nan, np.nan],
+                       'g': ['x', 'x', 'y', 'y', 'y', None]})
+    cases = [({'fill': 'mean'}, [3.0, 3.0, 3.0, 3.0, 3.0, 3.0]),
+             ({'fill': 'median', 'group_by': ['g']}, [1.0, 1.0, 3.0, 4.0, 4.0, np.nan]),
+             ({'fill': 0}, [0.0, 0.0, 3.0, 0.0, 0.0, 0.0])]
+    failures = []
+    for params, expected in cases:
+        params = {'column': 'a', 'bound': 3, 'direction': '!=', **params}
+        for mode, data in run_modes(df, [('ReplaceByValue', params)]).items():
+            if data is None:
+                failures.append(f"ReplaceByValue != ({mode}, {params}): a step failed")
+            elif not np.array_equal(data['a'].to_numpy('float64', na_value = np.nan), np.array(expected), equal_nan = True):
+                failures.append(f"ReplaceByValue != ({mode}, {params}): {list(data['a'])} != {expected}")
+    return failures
+
+
+def check_step_cache():
+    '''
+    FUNCTION to check that replaying steps through a StepCache, with a changed last step as on a Streamlit rerun, gives the same data as applying the steps to a new Pipeline, and that neither the input frame nor the cached states are modified by the steps applied after them.
+    '''
+    df = pd.DataFrame({'a': [1.5, np.nan, 3.0, 40.0, 2.0, np.nan],
+                       'b': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+                       'g': ['x', 'y', 'x', 'y', 'x', None]})
+    before = df.copy()
+    first = [('ImputeWithEquation', {'column': 'a', 'Xs': ['b'], 'coefficients': [2]}), ('ReplaceByValue', {'column': 'b', 'bound': 4, 'direction': '>=', 'fill': 'mean'})]
+    failures = []
+    cache = StepCache()
+    for plan in [first, first[:1] + [('ReplaceByStd', {'column': 'a', 'group_by': ['g'], 'n_std': 1, 'fill': 'median'})], first]:
+        pipeline = cache.pipeline(df)
+        for method, params in plan:
+            pipeline = cache.apply(pipeline, method, **params)
+        expected = Pipeline(df)
+        expected.runPlan(plan)
+        if not pipeline.data.equals(expected.data):
+            failures.append(f"StepCache ({[method for method, _ in plan]}): {pipeline.data.to_dict('list')} != {expected.data.to_dict('list')}")
+    if cache.hits != 5:
+        failures.append(f"StepCache restored {cache.hits} states instead of 5")
+    if not df.equals(before):
+        failures.append(f"StepCache modified the input: {df.to_dict('list')} != {before.to_dict('list')}")
+    return failures
+
+
+checks = [check_knn_after_droprows, check_compact_writes, check_collect_failure, check_input_unchanged, check_replace_not_equal, check_step_cache]
+
+
+if __name__ == "__main__":
+
+    warnings.filterwarnings("ignore")
+    failed = False
+    for check in checks:
+        failures = check()
+        failed = failed or bool(failures)
+        print(f"{check.__name__}: {'; '.join(failures) if failures else 'ok'}")
+
+    sys.exit(1 if failed else 0)
@@ -1,5 +1,6 @@
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
 from os import listdir
 from os.path import isfile, join
@@ -10,7 +11,7 @@ from preprocess import minimum_spend_imputation
 
 class DataObject:
     
-    def __init__(self, source, version, model = None):
+    def __init__(self, source, version, model = None, chunked = False):
         assert source in ["OVS", "Synthetic"], "Data source must be one of the following: OVS, Synthetic"
         if source == "Synthetic":
             assert model in ["TVAE", "CTGAN", "TGAN"], "Select one of the following synthetic data generation models: TVAE, CTGAN, TGAN"
@@ -21,10 +22,16 @@ class DataObject:
             self.model = model
             self.imputations = False
             
+            self.chunked = chunked
+            
             self.directory = self.get_directory()
-            self.data = self.read_data()
             self.last_updated = self.get_modification_date()
-            self.size = (len(self.data.index), len(self.data.columns))
+            if chunked: # data is streamed with iter_chunks() instead of being held in memory
+                self.data = None
+                self.size = None
+            else:
+                self.data = self.read_data()
+                self.size = (len(self.data.index), len(self.data.columns))
             
             
         except Exception as e:
@@ -73,16 +80,19 @@ class DataObject:
             print(current_dateTime + ': ' + str(e))
     
     
-    def read_data(self):
+    def read_data(self, max_workers = None):
         '''
-        FUNCTION to create a pandas dataframe containing all the data associated wth the Data class object.
+        FUNCTION to create a pandas dataframe containing all the data associated wth the Data class object. The files are read in parallel by a pool of threads and concatenated once.
+        Parameters:
+        - max_workers: Maximum number of threads used to read the files (default: as chosen by ThreadPoolExecutor)
         '''
         try:
             files = self.get_filenames()
-            master_df = pd.DataFrame()
-            for file in files:
-                master_df = master_df.append(pd.read_csv(file))
-            return master_df
+            if not files:
+                return pd.DataFrame()
+            with ThreadPoolExecutor(max_workers = max_workers) as executor:
+                frames = list(executor.map(pd.read_csv, files))
+            return pd.concat(frames)
         
         except Exception as e:
             print("Failed to read data to populate Data class object")
@@ -90,6 +100,20 @@ class DataObject:
             print(current_dateTime + ': ' + str(e))
     
     
+    def iter_chunks(self, chunksize = 100000):
+        '''
+        FUNCTION to iterate over the data associated with the Data class object in chunks of at most chunksize rows, without loading all the files into memory. Useful for aggregating data sets that do not fit in RAM.
+        Parameters:
+        - chunksize: Maximum number of rows per chunk
+        '''
+        assert isinstance(chunksize, int) and chunksize > 0, "Require chunksize to be a positive integer."
+        
+        for file in self.get_filenames():
+            with pd.read_csv(file, chunksize = chunksize) as reader:
+                for chunk in reader:
+                    yield chunk
+    
+    
     def get_modification_date(self):
         '''
         FUNCTION to get the last imputation date 
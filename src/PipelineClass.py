@@ -1,36 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+import functools
+import inspect
+import itertools
+import operator
+import re
+import time
+import tracemalloc
 import pandas as pd
 import numpy as np
+import sys
 from pandas.api.types import CategoricalDtype
+from scipy.spatial import cKDTree
 from sklearn.impute import KNNImputer
 
+from backends import get_backend, PandasBackend
+from planning import optimize_plan, compile_artifacts, step_columns, step_dependencies, valid_dtypes
+from profiling import summarize_column, distribution_delta
+from schema import infer_schema, apply_schema, compact_schema, recode_columns, widen_column
+from streaming import map_group_stats
+from versions import VersionStore
 
-valid_dtypes = ['char','string','int','float','boolean','categorical','datetime']
+
+comparisons = {'>': operator.gt, '<': operator.lt, '>=': operator.ge,
+               '<=': operator.le, '==': operator.eq, '!=': operator.ne}
+
+KNN_BATCH_SIZE = 100000 # missing rows queried against the KD-tree at a time
+knn_metrics = {'nan_euclidean': 2, 'euclidean': 2, 'manhattan': 1, 'chebyshev': np.inf} # Minkowski p of supported metrics
+
+
+def fill_outliers(df, column, group_by, outliers, fill_value):
+    '''
+    FUNCTION to replace the cells of a column flagged as outliers with a single assignment. Rows whose group_by keys are missing are left unchanged, since they do not belong to any group.
+    Parameters:
+    - df: Dataframe (modified in place)
+    - column: Name of column to be affected by replacement
+    - group_by: List of column(s) the fill values were grouped by, or None
+    - outliers: Boolean Series flagging the rows to be replaced
+    - fill_value: Scalar, or Series aligned with the rows of df
+    '''
+    outliers = outliers.fillna(False).astype(bool)
+    if group_by:
+        outliers &= df[group_by].notna().all(axis = 1)
+    if isinstance(fill_value, pd.Series):
+        fill_value = fill_value[outliers]
+    df.loc[outliers, column] = fill_value
+
+
+def knn_impute(df, column, features, n_neighbors = 5, weights = 'uniform', metric = 'euclidean', batch_size = KNN_BATCH_SIZE, workers = -1):
+    '''
+    FUNCTION to impute the missing values of a column with the values of the nearest neighbours in the space of the feature columns. A KD-tree is built over the rows where the column and all features are known, and only the rows to be imputed are queried, in batches. Each batch is queried in parallel by the KD-tree, and the result does not depend on the number of workers.
+    Rows with missing features are imputed with the mean of the known values, as KNNImputer does when no feature can be compared.
+    Parameters:
+    - df: Dataframe
+    - column: Name of numeric column to be imputed
+    - features: List of numeric columns to find the nearest neighbours with
+    - n_neighbors: Number of neighbours to impute with
+    - weights: 'uniform' or 'distance' (inverse distance, where neighbours at distance 0 get all the weight)
+    - metric: 'euclidean', 'manhattan' or 'chebyshev'
+    - batch_size: Number of rows to be imputed per query
+    - workers: Number of threads per query (-1 for all CPUs)
+    Returns a float array of the column with the missing values imputed.
+    '''
+    values = df[column].to_numpy(dtype = 'float64', na_value = np.nan)
+    X = df[features].to_numpy(dtype = 'float64', na_value = np.nan)
+    known_features = ~np.isnan(X).any(axis = 1)
+    donors = ~np.isnan(values) & known_features
+    missing = np.flatnonzero(np.isnan(values) & known_features)
+    
+    imputed = values.copy()
+    imputed[np.isnan(values) & ~known_features] = np.nanmean(values) if (~np.isnan(values)).any() else np.nan
+    if len(missing) == 0 or not donors.any():
+        return imputed
+    
+    tree = cKDTree(X[donors])
+    donor_values = values[donors]
+    k = min(n_neighbors, int(donors.sum()))
+    for start in range(0, len(missing), batch_size):
+        rows = missing[start:start + batch_size]
+        distances, neighbors = tree.query(X[rows], k = k, p = knn_metrics[metric], workers = workers)
+        distances, neighbors = distances.reshape(len(rows), k), neighbors.reshape(len(rows), k)
+        if weights == 'distance':
+            with np.errstate(divide = 'ignore'):
+                w = 1/distances
+            exact = distances == 0
+            w[exact.any(axis = 1)] = exact[exact.any(axis = 1)]
+        else:
+            w = np.ones_like(distances)
+        imputed[rows] = (donor_values[neighbors]*w).sum(axis = 1)/w.sum(axis = 1)
+    return imputed
+
+
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+PROFILE_COLUMNS = ['step', 'method', 'status', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out',
+                   'bytes_in', 'bytes_out', 'allocated_bytes', 'peak_rss_bytes', 'error']
+
+
+write_stamps = itertools.count() # unique stamp of every write of a column by a step, across all Pipelines (see Pipeline.written)
+
+
+def renumber_steps(metadata, offset):
+    '''
+    FUNCTION to shift the numbers of the steps in the metadata of a Pipeline, e.g. to append the metadata of a Pipeline whose steps were numbered from 1.
+    Parameters:
+    - metadata: Metadata string, one line per step starting with the number of the step
+    - offset: Number to add to the number of every step
+    '''
+    return re.sub(r'(?m)^(\d+)\. ', lambda match: f"{int(match.group(1)) + offset}. ", metadata)
+
+
+def peak_rss():
+    '''
+    FUNCTION to get the peak resident set size of the process in bytes, or None where it is not available.
+    '''
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss*1024 # bytes on macOS, kilobytes on Linux
+
+
+def instrumented(step):
+    '''
+    DECORATOR to record the profile of a transformation step of a Pipeline (see Pipeline.profile): wall and CPU time, rows and bytes of the data before and after the step, bytes allocated during the step (only while tracemalloc is tracing, e.g. with PYTHONTRACEMALLOC=1, as tracing slows down every allocation), the peak resident memory of the process after the step, and the error of a failed step.
+    Steps called by other steps (e.g. the dtype recode of ReplaceByValue) are part of the profile of the step that called them, and the steps of a lazy Pipeline are recorded when they are executed by collect().
+    The columns a step writes are copied before the step, so that the data given to the Pipeline (and any cached or earlier version of it) is never modified in place, and columns in memory-compact dtypes are widened (see Pipeline._decompact).
+    '''
+    @functools.wraps(step)
+    def wrapper(self, *args, **kwargs):
+        record = self._depth == 0 and not self.lazy
+        params = inspect.signature(step).bind(self, *args, **kwargs)
+        params.apply_defaults()
+        params = {name: value for name, value in params.arguments.items() if name != 'self'}
+        try:
+            reads, writes = step_columns(step.__name__, params)
+        except Exception:
+            reads, writes = set(), None # e.g. invalid parameters, which the step itself rejects
+        if not record:
+            if not self.lazy: # e.g. a step of a lazy Pipeline applied to its schema frame
+                self._decompact(step.__name__, writes)
+            self._depth += 1
+            try:
+                return step(self, *args, **kwargs)
+            finally:
+                self._depth -= 1
+
+        n_steps, rows_in, bytes_in, index_in = self.n_steps, self.data.shape[0], int(self.data.memory_usage(index = False).sum()), self.data.index
+        self._copy_on_write(writes)
+        if self.deltas is not None:
+            # the columns a step writes, or reads if it writes none (i.e. the dropped columns, or the mandatory columns of DropRows)
+            touched = [col for col in self.data.columns if col in (writes or reads)]
+            before = {col: summarize_column(self.data[col]) for col in touched}
+        self._decompact(step.__name__, writes)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        self._error = None
+        self._depth += 1
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return step(self, *args, **kwargs)
+        
+        except Exception as e:
+            self._error = f"{type(e).__name__}: {e}"
+            raise
+        
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._depth -= 1
+            self._profile.append({'step': self.n_steps if self.n_steps > n_steps else None,
+                                  'method': step.__name__,
+                                  'status': 'done' if self.n_steps > n_steps else 'failed',
+                                  'wall_seconds': wall,
+                                  'cpu_seconds': cpu,
+                                  'rows_in': rows_in,
+                                  'rows_out': self.data.shape[0],
+                                  'bytes_in': bytes_in,
+                                  'bytes_out': int(self.data.memory_usage(index = False).sum()),
+                                  'allocated_bytes': tracemalloc.get_traced_memory()[1] - allocated if tracing else None,
+                                  'peak_rss_bytes': peak_rss(),
+                                  'error': self._error if self.n_steps == n_steps else None})
+            if self.n_steps > n_steps:
+                self._mark_written(writes, index_in)
+                if self.deltas is not None:
+                    after = {col: summarize_column(self.data[col]) for col in (writes or reads) if col in self.data.columns}
+                    self.deltas[self.n_steps] = distribution_delta(before, after)
+                if self.history is not None:
+                    self._commit((step.__name__, params), writes)
+    return wrapper
 
 
 class Pipeline():
     '''
     The Pipeline object contains member functions that perform transformations on a data set. These functions can be sequentially called to create a pre-processing pipeline. The relevant metadata and artifacts required to reproduce the pipeline are also stored within the Pipeline object.
+    If lazy = True, the transformation functions do not touch the data. They are validated against the schema of the data and recorded in a logical plan, which is optimized and executed in one pass when collect() is called.
+    If compact = True, the data is stored in memory-compact dtypes (see schema.compact_schema) and the memory usage of each column before and after compaction is stored in memory. Compaction only holds for storage: before a step writes values to a column in a compact dtype, the column is widened back to the dtype it would have without compaction (see schema.widen_column), e.g. categories to strings and Int8 to Int64, so steps behave as on uncompacted data. This also applies to data that was compacted before it was given to the Pipeline.
+    If a schema is given (see schema.infer_schema), it is applied instead of inferring the dtypes of the input, e.g. so that all the chunks of a large file get the same dtypes.
+    If history = True, the data after every step is kept in a VersionStore that shares unchanged columns between steps, so that steps can be undone (undo) and any step can be checked out again (checkout) instantly; applying a step after checking out an older step starts a new branch.
+    Every step declares the columns it reads and writes (see planning.step_columns), and the Pipeline keeps a column-level dirty map (written) of the last write of every column, so that the profile of the data, charts, and the like only need to be recomputed for the columns that changed since an earlier state (see changedColumns). If deltas = True, the distribution of the columns touched by every step is also summarized before and after the step (see stepDelta), at a cost proportional to the touched columns.
+    The backend computes the group statistics and row-wise sums of the steps (see backends.get_backend): 'pandas' (default), 'arrow' or 'polars' for a multi-threaded columnar engine, or 'auto' for the fastest installed one. The steps, metadata, and artifacts are the same whatever the backend.
     '''
-    def __init__(self, input_df):
+    def __init__(self, input_df, lazy = False, compact = False, schema = None, history = False, deltas = False, backend = 'pandas'):
         assert isinstance(input_df, pd.DataFrame)
+        assert not (lazy and history), "A lazy Pipeline cannot keep a history of its steps."
         
         try:
-            input_df = input_df.dropna(how = 'all', axis = 1)
-            input_df = input_df.convert_dtypes() # set best dtype for columns
-            
-            # convert Int64 to boolean if values in {0, 1, NA}
-            dtypes = dict(input_df.dtypes)
-            for col, dtype in dtypes.items():
-                if dtype == 'Int64' and input_df[col].isin([0, 1, pd.NA]).all():
-                    input_df[col] = input_df[col].astype('boolean')
-
-            input_df = input_df.reset_index(drop = True) # set one index = one row
+            # drop empty columns and set best dtype for columns (Int64 with values in {0, 1, NA} become boolean)
+            input_df = apply_schema(input_df.copy(deep = False), infer_schema(input_df) if schema is None else schema)
+            input_df.index = pd.RangeIndex(len(input_df)) # set one index = one row
             
-            self.data = input_df
-            self.metadata = ""
-            self.n_steps = 0
-            self.artifacts = dict()
+            memory = None
+            if compact:
+                before = input_df.memory_usage(index = False, deep = True)
+                input_df = apply_schema(input_df, compact_schema(input_df))
+                memory = pd.DataFrame({'before': before, 'after': input_df.memory_usage(index = False, deep = True)})
+            self._initialize(input_df, lazy, compact, memory, history, deltas, backend)
             
         except Exception as e:
             print("Failed to create Pipeline object.")
@@ -38,10 +226,161 @@ class Pipeline():
             print(current_dateTime + ': ' + str(e))
             
             
+    def _initialize(self, data, lazy = False, compact = False, memory = None, history = False, deltas = False, backend = 'pandas'):
+        # set every attribute of a Pipeline over data whose dtypes are already set, before any step (see __init__ and fromState)
+        self.compact = compact
+        self.memory = memory # bytes per column before and after compaction
+        self.data = data
+        self.metadata = ""
+        self.n_steps = 0
+        self.artifacts = dict()
+        
+        self.lazy = lazy
+        self.plan = [] # (method, params) of steps that have not been executed yet
+        self.schema = data.iloc[:0].copy() # empty frame with the columns and dtypes after the planned steps
+        self.stats = None # statistics of the next step computed over all chunks of the data (see runPlan)
+        self._profile = [] # one record per step, see profile
+        self._depth = 0 # depth of nested calls of steps
+        self._error = None # error of the last failed step
+        self.written = {col: next(write_stamps) for col in data.columns} # column -> stamp of the step that last wrote it
+        self.deltas = dict() if deltas else None # step -> distribution delta of the columns touched by the step
+        self.backend = backend if isinstance(backend, PandasBackend) else get_backend(backend)
+        
+        self.history = VersionStore() if history else None # data and state after every step
+        if history:
+            self._commit(None, None)
+    
+    
+    @classmethod
+    def fromState(cls, data, metadata = "", n_steps = 0, artifacts = None, profile = None, written = None, deltas = None, compact = False, memory = None, stats = None, backend = 'pandas'):
+        '''
+        Creates a Pipeline in a given state without inferring the dtypes of its data, e.g. to restore a Pipeline from a cache (see caching.StepCache) or to apply a step to some of the columns of a Pipeline (see _runScheduled). Every attribute is set as by __init__.
+        Parameters:
+        - data: Dataframe, used as it is
+        - metadata, n_steps, artifacts: Metadata, number of steps, and artifacts of the steps applied so far
+        - profile: (Optional) list of the profile records of the steps (see profile)
+        - written: (Optional) dirty map of the columns of the data (see changedColumns); columns get new stamps by default
+        - deltas: (Optional) dictionary of the distribution deltas of the steps (see stepDelta), or None not to summarize them
+        - compact, memory: Whether the data was compacted, and the memory usage of its columns before and after compaction
+        - stats: (Optional) statistics of the next step computed over all chunks of the data (see runPlan)
+        - backend: Name of the backend (see backends.get_backend), or a backend object to share
+        '''
+        pipeline = cls.__new__(cls)
+        pipeline._initialize(data, compact = compact, memory = memory, deltas = deltas is not None, backend = backend)
+        pipeline.metadata, pipeline.n_steps, pipeline.artifacts = metadata, n_steps, dict(artifacts or dict())
+        pipeline._profile = list(profile or [])
+        if written is not None:
+            pipeline.written = {col: written[col] for col in data.columns}
+        if deltas is not None:
+            pipeline.deltas = dict(deltas)
+        pipeline.stats = stats
+        return pipeline
+    
+    
     def __str__(self):
         return self.metadata
     
     
+    @property
+    def profile(self):
+        '''
+        Returns a dataframe with one row per transformation step called on the Pipeline (including steps that failed): the step number, method, status ('done' or 'failed'), wall and CPU time in seconds, rows and bytes of the data before and after the step, bytes allocated during the step (if tracemalloc is tracing), peak resident memory of the process in bytes, and the error of failed steps.
+        '''
+        profile = pd.DataFrame(self._profile, columns = PROFILE_COLUMNS)
+        return profile.astype({'step': 'Int64', 'allocated_bytes': 'Int64', 'peak_rss_bytes': 'Int64'})
+    
+    
+    def _copy_on_write(self, writes):
+        # the columns of the data may be shared with the input frame, the cache (see caching.StepCache) or the history, so the columns that a step writes are copied before they can be modified in place
+        for col in (writes or set()) & set(self.data.columns):
+            self.data[col] = self.data[col].copy()
+    
+    
+    def _decompact(self, method, writes):
+        # columns in memory-compact dtypes (e.g. categories or Int8) are widened before a step writes values to them, as the values may be outside their categories or range; steps that only rename or recode columns keep them compact
+        if method in ['RenameColumns', 'RecodeColumnTypes']:
+            return
+        for col in (writes or set()) & set(self.data.columns):
+            widened = widen_column(self.data[col])
+            if widened is not None:
+                self.data[col] = widened
+    
+    
+    def _mark_written(self, writes, index):
+        # give the columns that a step wrote a new stamp in the dirty map; all columns if the step changed the rows, or if its writes are unknown
+        stamp = next(write_stamps)
+        same_rows = writes is not None and self.data.index.equals(index)
+        self.written = {col: self.written[col] if same_rows and col not in writes and col in self.written else stamp for col in self.data.columns}
+    
+    
+    def changedColumns(self, since):
+        '''
+        Lists the columns of the data that were written (or created) since an earlier state of the Pipeline, e.g. to recompute the profile or the charts of these columns only.
+        Parameters:
+        - since: Dirty map of the earlier state, i.e. a copy of the written attribute of the Pipeline at that state
+        '''
+        return [col for col, stamp in self.written.items() if since.get(col) != stamp]
+    
+    
+    def stepDelta(self, step = None):
+        '''
+        Returns the before vs after distribution delta of the columns touched by a step (see profiling.distribution_delta); the last step by default.
+        Parameters:
+        - step: (Optional) Number of the step
+        '''
+        assert self.deltas is not None, "Require the Pipeline to be created with deltas = True."
+        step = self.n_steps if step is None else step
+        assert step in self.deltas, f"There is no delta of step {step}."
+        return self.deltas[step]
+    
+    
+    def _commit(self, step, writes):
+        # add the data and state after a step to the history; columns the step did not write are shared with the previous version
+        state = {'metadata': self.metadata, 'n_steps': self.n_steps, 'artifacts': dict(self.artifacts), 'written': dict(self.written),
+                 'deltas': dict(self.deltas) if self.deltas is not None else None}
+        self.history.commit(self.data, state, step, writes)
+    
+    
+    def checkout(self, version):
+        '''
+        Restores the data, metadata, and artifacts of a version in the history of the Pipeline (see listVersions). The next step is applied to this version, starting a new branch of the history.
+        Parameters:
+        - version: Id of the version
+        '''
+        assert self.history is not None, "Require the Pipeline to be created with history = True."
+        
+        self.data, state = self.history.checkout(version)
+        self.metadata, self.n_steps, self.artifacts = state['metadata'], state['n_steps'], dict(state['artifacts'])
+        self.written, self.deltas = dict(state['written']), dict(state['deltas']) if state['deltas'] is not None else None
+        return self.data
+    
+    
+    def undo(self):
+        '''
+        Restores the version before the last step of the Pipeline (see checkout).
+        '''
+        assert self.history is not None, "Require the Pipeline to be created with history = True."
+        parent = self.history.versions[self.history.head]['parent']
+        assert parent is not None, "There is no step to undo."
+        return self.checkout(parent)
+    
+    
+    def listVersions(self):
+        '''
+        Lists the versions in the history of the Pipeline: their parent, step, number of columns stored and shared with the parent, and bytes stored.
+        '''
+        assert self.history is not None, "Require the Pipeline to be created with history = True."
+        return self.history.summary()
+    
+    
+    def _log_error(self, message, e):
+        # failed steps print their error and keep it for the profile of the step
+        self._error = f"{type(e).__name__}: {e}"
+        print(message)
+        current_dateTime = str(datetime.now())[0:19]
+        print(current_dateTime + ': ' + str(e))
+    
+    
     def listFunctions(self, print = False):
         '''
         Lists all the transformation functions available in the class object.
@@ -56,14 +395,80 @@ class Pipeline():
             for function in functions:
                 print("-", function)
         return functions
+    
+    
+    def _defer(self, method, **params):
+        '''
+        Adds a step to the logical plan of a lazy Pipeline. The step is first applied to the empty schema frame, which validates its parameters and records its metadata and artifacts exactly as in eager mode.
+        '''
+        data, n_steps, metadata = self.data, self.n_steps, self.metadata
+        self.data, self.lazy = self.schema, False
+        try:
+            getattr(self, method)(**params)
+            self.schema = self.data
+        finally:
+            self.data, self.lazy = data, True
+        
+        if self.n_steps > n_steps: # do not plan steps that failed on the schema
+            if not self.plan:
+                self._plan_start, self._plan_metadata = n_steps, metadata # state before the planned steps
+            self.plan.append((method, params))
+    
+    
+    def collect(self):
+        '''
+        Executes the logical plan of a lazy Pipeline and returns the transformed data. The plan is optimized before execution (see planning.optimize_plan): column drops are pushed ahead of the other steps, work on columns that are dropped later is skipped, and consecutive drops and recodes are fused. If every step succeeds, the metadata and artifacts are left as they were recorded when the steps were added, i.e. identical to eager mode.
+        Execution stops at the first step that fails on the data (although it succeeded on the schema), and the metadata and artifacts then record only the steps that were executed before it, as they were executed. The plan is cleared in both cases, as the data was transformed.
+        '''
+        if not self.plan:
+            return self.data
+        metadata, n_steps, artifacts = self.metadata, self.n_steps, self.artifacts
+        self.lazy = False
+        # executed steps are numbered after the steps collected before
+        self.metadata, self.n_steps = self._plan_metadata, self._plan_start
+        self.artifacts = {step: artifact for step, artifact in artifacts.items() if step <= self._plan_start}
+        
+        failed = None
+        try:
+            for method, params in optimize_plan(self.plan):
+                executed = self.n_steps
+                getattr(self, method)(**params)
+                if self.n_steps == executed:
+                    failed = f"{method} failed on the data."
+                    break
+        
+        except Exception as e:
+            failed = f"{method} failed on the data: {e}"
+        
+        finally:
+            self.plan = []
+            self.schema = self.data.iloc[:0].copy()
+            self.lazy = True
+            if failed is None:
+                self.metadata, self.n_steps, self.artifacts = metadata, n_steps, artifacts
+            else:
+                print("Failed to execute the lazy Pipeline. The metadata and artifacts only record the steps executed before the failed step.")
+                current_dateTime = str(datetime.now())[0:19]
+                print(current_dateTime + ': ' + failed)
+        return self.data
             
     
+    def _group_transform(self, column, group_by, func):
+        # statistics computed over all the chunks of the data take precedence over the statistics of the chunk in memory
+        if self.stats is not None and func in self.stats:
+            return map_group_stats(self.data, group_by, self.stats[func])
+        return self.backend.group_transform(self.data, column, group_by, func)
+    
+    
+    @instrumented
     def DropColumns(self, column_list):
         '''
         FUNCTION to drop columns of a pandas dataframe
         Parameters:
         - column_list: List of column names to be dropped.
         '''
+        if self.lazy:
+            return self._defer('DropColumns', column_list = column_list)
         assert isinstance(column_list, list)
         assert set(column_list) <= set(self.data.columns), "The list of columns to be dropped contains columns that are not present in the original dataframe."
 
@@ -75,17 +480,18 @@ class Pipeline():
             self.artifacts[self.n_steps] = {'DropColumns': column_list}
 
         except Exception as e:
-            print("Failed to drop specified columns.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to drop specified columns.", e)
     
     
+    @instrumented
     def DropRows(self, column_list):
         '''
         FUNCTION to drop the rows of a pandas dataframe based on presence of missing values in the specified columns.
         Parameters:
         - column_list: List of columns that must be filled and valid for a row to be retained.
         '''
+        if self.lazy:
+            return self._defer('DropRows', column_list = column_list)
         assert isinstance(column_list, list)
         assert set(column_list) <= set(self.data.columns), "The list of columns contains columns that are not present in the original dataframe."
         
@@ -97,17 +503,18 @@ class Pipeline():
             self.artifacts[self.n_steps] = {'DropRows': column_list}
         
         except Exception as e:
-            print("Failed to drop rows based on mandatory columns.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to drop rows based on mandatory columns.", e)
 
 
+    @instrumented
     def RenameColumns(self, recode_dict):
         '''
         FUNCTION to rename the columns of a pandas dataframe
         Parameters:
         - recode_dict: Dictionary specifying the columns and their target names.
         '''
+        if self.lazy:
+            return self._defer('RenameColumns', recode_dict = recode_dict)
         assert isinstance(recode_dict, dict)
         assert set(recode_dict.keys()) <= set(self.data.columns), "The recode dictionary contains columns that are not present in the original dataframe."
 
@@ -119,11 +526,10 @@ class Pipeline():
             self.artifacts[self.n_steps] = {'RecodeColumnNames': recode_dict}
 
         except Exception as e:
-            print("Failed to recode column names.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to recode column names.", e)
     
     
+    @instrumented
     def RecodeColumnTypes(self, recode_dict):
         '''
         FUNCTION to recode the data type of columns of a pandas dataframe
@@ -131,57 +537,28 @@ class Pipeline():
         - recode_dict: Dictionary specifying the columns and their target dtypes. 
                        The dtypes can be 'char', 'string', 'int', 'float', 'boolean',
                        'categorical', 'date', or 'datetime'.
+        Columns are converted by a kernel per dtype into nullable dtypes, and columns that already have the target dtype are left as they are (see schema.recode_columns).
         '''
+        if self.lazy:
+            return self._defer('RecodeColumnTypes', recode_dict = recode_dict)
         assert isinstance(recode_dict, dict)
         assert set(recode_dict.keys()) <= set(self.data.columns), "The recode dictionary contains columns that are not present in the original dataframe."
         assert set(recode_dict.values()) <= set(valid_dtypes),\
         f"You may only recode column into the following types: {valid_dtypes}"
         
         try:
-            df = self.data
-            for column, dtype in recode_dict.items():
-                # keeps NaN in place except in conversion to boolean, which replaces missing cells with False if there is no natural distinction between True and False that can be found in original values
-                if dtype == 'char':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          df[column].astype(str).str.slice(0, 1))
-                elif dtype == 'string':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          df[column].astype('string'))
-                elif dtype == 'int':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          pd.to_numeric(df[column], downcast = 'integer', errors = 'coerce'))
-                elif dtype == 'float':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          pd.to_numeric(df[column], downcast = 'float', errors = 'coerce'))
-                elif dtype == 'boolean':
-                    try:
-                        df[column] = np.where(pd.isna(df[column]),False,True)
-                    finally:
-                        continue
-                elif dtype == 'categorical':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          df[column].astype('category'))
-                elif dtype == 'datetime':
-                    df[column] = np.where(pd.isna(df[column]),
-                                          df[column],
-                                          pd.to_datetime(df[column], errors = 'coerce'))
-            self.data = df
+            # typed kernels per target dtype; columns that already have the target dtype are not converted
+            self.data = recode_columns(self.data, recode_dict)
             self.n_steps += 1
             self.metadata += f"{self.n_steps}. The following dictionary was used to recode the dtypes of the columns:\
             {recode_dict}\n"
             self.artifacts[self.n_steps] = {'RecodeColumnTypes': recode_dict}
 
         except Exception as e:
-            print("Failed to recode column dtypes.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to recode column dtypes.", e)
     
     
+    @instrumented
     def ReplaceByValue(self, column, bound, direction, group_by = None, fill = 'NA'):
         '''
         FUNCTION to replace cells in a column based on their original value.
@@ -192,6 +569,8 @@ class Pipeline():
         - group_by: List of column(s) to group by before applying replacement
         - fill: Value or type of value to fill by
         '''
+        if self.lazy:
+            return self._defer('ReplaceByValue', column = column, bound = bound, direction = direction, group_by = group_by, fill = fill)
         if isinstance(fill, str):
             assert fill in ['mean','median','NA'], "For numeric columns, require fill value to be numeric (int or float) or 'mean', 'median', or 'NA'"
         else:
@@ -202,50 +581,34 @@ class Pipeline():
         
         try:
             self.RecodeColumnTypes({column: 'float'})
-            # group by columns (if any)
             if isinstance(group_by, str):
                 group_by = [group_by]
-            if group_by:
-                grouped = self.data.groupby(group_by)
+            
+            # determine fill value of each row (from its group, if any)
+            if fill in ['mean', 'median']:
+                fill_value = self._group_transform(column, group_by, fill)
+            elif fill == 'NA':
+                fill_value = np.nan
             else:
-                grouped = [(None, self.data)]
-
-            # iterate over groups and determine fill value
-            for group_name, group_df in grouped:
-                if fill == 'mean':
-                    fill_value = group_df[column].mean()
-                elif fill == 'median':
-                    fill_value = group_df[column].median()
-                elif fill == 'NA':
-                    fill_value = np.nan
-
-                # apply filter based on direction
-                if direction == '>':
-                    outliers = group_df[group_df[column] > bound].index
-                elif direction == '<':
-                    outliers = group_df[group_df[column] < bound].index
-                elif direction == '>=':
-                    outliers = group_df[group_df[column] >= bound].index
-                elif direction == '<=':
-                    outliers = group_df[group_df[column] <= bound].index
-                elif direction == '==':
-                    outliers = group_df[group_df[column] == bound].index
-                elif direction == '!=':
-                    outliers = group_df[group_df[column] != bound].index
-
-                # fill outliers with specified fill value
-                self.data.loc[outliers, column] = fill_value
+                fill_value = fill
+            
+            # apply filter based on direction; missing values are != any bound, as they were when columns were recoded to NaN floats
+            outliers = comparisons[direction](self.data[column], bound)
+            if direction == '!=':
+                outliers = outliers.fillna(True)
+            
+            # fill outliers with specified fill value
+            fill_outliers(self.data, column, group_by, outliers, fill_value)
 
             self.n_steps += 1
             self.metadata += f"{self.n_steps}. Replaced cells in column '{column}' where original value was {direction} {bound} by {fill}{', grouped by ' + ', '.join(group_by) if group_by else ''}'\n"
             self.artifacts[self.n_steps] = {'ReplaceByValue': {'column': column, 'bound': bound, 'direction': direction, 'group_by': group_by, 'fill': fill}}
         
         except Exception as e:
-            print("Failed to replace column values.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to replace column values.", e)
             
     
+    @instrumented
     def ReplaceByStd(self, column, group_by = None, n_std = 3, direction = '<>', fill = 'NA'):
         '''
         FUNCTION to replace cells in a column if beyond specified standard deviations from mean. By default, does not perform any grouping and replaces all values beyond 3 standard deviations in both directions by 'NA'.
@@ -256,6 +619,8 @@ class Pipeline():
         - direction: The direction where replacement is to be applied (>, < or both)
         - fill: Value or type of value to fill by
         '''
+        if self.lazy:
+            return self._defer('ReplaceByStd', column = column, group_by = group_by, n_std = n_std, direction = direction, fill = fill)
         assert fill in ['mean','median','NA'] or isinstance(fill, int | float), "Require fill value to be numeric (int or float) or 'mean', 'median', or 'NA'"
         if group_by:
             assert isinstance(group_by, list) and all(col in list(self.data.columns) for col in group_by), "Require all column(s) to group by to exist in the dataframe and to be specified in a list."
@@ -263,51 +628,44 @@ class Pipeline():
         
         try:
             self.RecodeColumnTypes({column: 'float'})
-            # group by columns (if any)
             if isinstance(group_by, str):
                 group_by = [group_by]
-            if group_by:
-                grouped = self.data.groupby(group_by)
+            
+            # determine fill value of each row (from its group, if any)
+            if fill in ['mean', 'median']:
+                fill_value = self._group_transform(column, group_by, fill)
+            elif fill == 'NA':
+                fill_value = np.nan
             else:
-                grouped = [(None, self.data)]
-
-            # iterate over groups and determine fill value
-            for group_name, group_df in grouped:
-                if fill == 'mean':
-                    fill_value = group_df[column].mean()
-                elif fill == 'median':
-                    fill_value = group_df[column].median()
-                else:
-                    fill_value = fill
-
-                # calculate mean and standard deviation
-                mean_val = group_df[column].mean()
-                std_val = group_df[column].std()
-                
-                # find values beyond n_std standard deviations
-                if direction == '<>':
-                    outliers = group_df[(group_df[column] > mean_val + n_std * std_val) | (group_df[column] < mean_val - n_std * std_val)].index
-                elif direction == '>':
-                    outliers = group_df[(group_df[column] > mean_val + n_std * std_val)].index
-                elif direction == '<':
-                    outliers = group_df[(group_df[column] < mean_val + n_std * std_val)].index
-                
-                # fill outliers with specified fill value
-                self.data.loc[outliers, column] = fill_value
+                fill_value = fill
+            
+            # calculate mean and standard deviation of each row's group
+            mean_val = self._group_transform(column, group_by, 'mean')
+            std_val = self._group_transform(column, group_by, 'std')
+            
+            # find values beyond n_std standard deviations
+            if direction == '<>':
+                outliers = (self.data[column] > mean_val + n_std * std_val) | (self.data[column] < mean_val - n_std * std_val)
+            elif direction == '>':
+                outliers = self.data[column] > mean_val + n_std * std_val
+            elif direction == '<':
+                outliers = self.data[column] < mean_val - n_std * std_val
+            
+            # fill outliers with specified fill value
+            fill_outliers(self.data, column, group_by, outliers, fill_value)
 
             self.n_steps += 1
             self.metadata += f"{self.n_steps}. Replaced cells in column '{column}' where original value was {direction}{n_std} standard deviations of the {'group ' if group_by else ''}mean by {fill}{', grouped by ' + ', '.join(group_by) if group_by else ''}'\n"
             self.artifacts[self.n_steps] = {'ReplaceByStd': {'column': column, 'group_by': group_by, 'n_std': n_std, 'direction': direction, 'fill': fill}}
             
         except Exception as e:
-            print("Failed to filter column values.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to filter column values.", e)
             
             
     #def ExtractYear(self, column)
             
     
+    @instrumented
     def RecodeColumnValues(self, column, recode_dict):
         '''
         FUNCTION to recode the values of a column in a pandas dataframe
@@ -315,6 +673,8 @@ class Pipeline():
         - column: Name of column that is to be recoded.
         - recode_dict: Dictionary specifying the values and their targets.
         '''
+        if self.lazy:
+            return self._defer('RecodeColumnValues', column = column, recode_dict = recode_dict)
         assert isinstance(column, str)
         assert isinstance(recode_dict, dict)
         
@@ -327,11 +687,10 @@ class Pipeline():
             self.artifacts[self.n_steps] = {'RecodeColumnValues': (column, recode_dict)}
             
         except Exception as e:
-            print("Failed to recode column values.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to recode column values.", e)
             
             
+    @instrumented
     def SumColumnValues(self, column_list, target_column):
         '''
         FUNCTION to populate a target column with the sum of the values of a list of columns
@@ -339,6 +698,8 @@ class Pipeline():
         - column_list: List of columns to be summed
         - target_column: Name of column that is to be populated with the row-wise sums
         '''
+        if self.lazy:
+            return self._defer('SumColumnValues', column_list = column_list, target_column = target_column)
         assert isinstance(column_list, list)
         assert set(column_list) <= set(self.data.columns)
         assert isinstance(target_column, str)
@@ -346,19 +707,18 @@ class Pipeline():
         
         try:
             self.RecodeColumnTypes({item: 'float' for item in column_list})
-            self.data[target_column] = self.data[column_list].sum(axis = 1)
+            self.data[target_column] = self.backend.row_sum(self.data, column_list)
             self.n_steps += 1
             self.metadata += f"{self.n_steps}. The column '{target_column}' was created and populated with the row-wise sums of the following columns:\
             {column_list}\n"
             self.artifacts[self.n_steps] = {'SumColumnValues': (column_list, target_column)}
             
         except Exception as e:
-            print("Failed to sum column values.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to sum column values.", e)
             
     
-    def ImputeWithKNN(self, column, n_neighbors = 5, weights = 'uniform', metric = 'nan_euclidean', add_indicator = True):
+    @instrumented
+    def ImputeWithKNN(self, column, n_neighbors = 5, weights = 'uniform', metric = 'nan_euclidean', add_indicator = True, features = None):
         '''
         FUNCTION to perform KNN-based imputation for filling in missing values of a column.
         Parameters:
@@ -369,35 +729,48 @@ class Pipeline():
             - 'distance' : weight points by the inverse of their distance.
         - metric: Metric used for the distance computation. Any metric from scikit-learn or scipy.spatial.distance can be used.
         - add_indicator: If True, adds a missing indicator variable for features with missing values.
+        - features: (Optional) List of numeric columns to find the neighbors with. The neighbors are found with a KD-tree over these columns (see knn_impute), which scales to millions of rows; the metric must then be one of 'nan_euclidean', 'euclidean', 'manhattan', or 'chebyshev'.
         '''
+        if self.lazy:
+            return self._defer('ImputeWithKNN', column = column, n_neighbors = n_neighbors, weights = weights, metric = metric, add_indicator = add_indicator, features = features)
         assert isinstance(column, str)
         assert column in list(self.data.columns), f"The column {column} could not be found in the dataframe."
+        if features:
+            assert isinstance(features, list) and all(col in list(self.data.columns) for col in features), "Require all feature columns to exist in the dataframe and to be specified in a list."
+            assert column not in features, "Require the column to be imputed not to be a feature column."
+            assert metric in knn_metrics, f"Require metric to be one of {list(knn_metrics.keys())} when feature columns are specified."
         
         try:
             self.RecodeColumnTypes({column: 'float'})
-            imputer = KNNImputer(n_neighbors = n_neighbors,
-                                 weights = weights,
-                                 metric = metric,
-                                 add_indicator = add_indicator)
-            imputed_array = imputer.fit_transform(self.data[[column]])
-            
-            if add_indicator:
-                # expand dataframe to include extra column with indicator suffix for missing value
-                columns = list(self.data.columns) + [f"{col}_ImputeWithKNN_indicator" for col in self.data.columns if self.data[col].isnull().any()]
-            else:
-                columns = list(self.data.columns)
-            
-            self.data[column] = pd.Series(imputed_array[:,0], name = column)
+            if self.data[column].isnull().any(): # nothing to impute otherwise
+                if features:
+                    imputed_array = knn_impute(self.data, column, features, n_neighbors, weights, metric)[:, None]
+                else:
+                    imputer = KNNImputer(n_neighbors = n_neighbors,
+                                         weights = weights,
+                                         metric = metric,
+                                         add_indicator = add_indicator)
+                    imputed_array = imputer.fit_transform(self.data[[column]])
+                
+                if add_indicator:
+                    # expand dataframe to include extra column with indicator suffix for missing value
+                    columns = list(self.data.columns) + [f"{col}_ImputeWithKNN_indicator" for col in self.data.columns if self.data[col].isnull().any()]
+                else:
+                    columns = list(self.data.columns)
+                
+                self.data[column] = pd.Series(imputed_array[:,0], index = self.data.index, name = column) # rows of the array are in the order of the data, whose index has gaps after DropRows
             self.n_steps += 1
-            self.metadata += f"{self.n_steps}. KNN-based imputation performed on column '{column}' with {n_neighbors} neighbors, weights = '{weights}', and metric = '{metric}'.\n"
-            self.artifacts[self.n_steps] = {'ImputeWithKNN': {'column': column, 'n_neighbors': n_neighbors, 'weights': weights, 'metric': metric, 'add_indicator': add_indicator}}
+            if features:
+                self.metadata += f"{self.n_steps}. KNN-based imputation performed on column '{column}' with {n_neighbors} neighbors in the space of columns {features}, weights = '{weights}', and metric = '{metric}'.\n"
+            else:
+                self.metadata += f"{self.n_steps}. KNN-based imputation performed on column '{column}' with {n_neighbors} neighbors, weights = '{weights}', and metric = '{metric}'.\n"
+            self.artifacts[self.n_steps] = {'ImputeWithKNN': {'column': column, 'n_neighbors': n_neighbors, 'weights': weights, 'metric': metric, 'add_indicator': add_indicator, 'features': features}}
             
         except Exception as e:
-            print("Failed to perform KNN-based imputation.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to perform KNN-based imputation.", e)
             
     
+    @instrumented
     def ImputeWithEquation(self, column, Xs, coefficients):
         '''
         FUNCTION to impute missing values in a column based on user-specified custom equation using other columns as dependent variables.
@@ -406,13 +779,15 @@ class Pipeline():
         - Xs: List of columns (dependent variables) used for regression equation
         - coefficients: List of coefficients used for regression equation
         '''
+        if self.lazy:
+            return self._defer('ImputeWithEquation', column = column, Xs = Xs, coefficients = coefficients)
         assert isinstance(Xs, list) and isinstance(coefficients, list) and len(Xs) == len(coefficients), "Require both Xs and coefficients to be lists of equal length."
         assert all(X in list(self.data.columns) for X in Xs), "Require all independent variable columns to exist in the dataframe."
         # TODO: apply to numeric columns using numeric columns only
         
         try:
             missing_values = self.data[self.data[column].isnull()]
-            predicted_values = (missing_values[Xs] * coefficients).sum(axis = 1)
+            predicted_values = self.backend.row_sum(missing_values, Xs, coefficients)
             self.data.loc[missing_values.index, column] = predicted_values
 
             self.n_steps += 1
@@ -420,11 +795,10 @@ class Pipeline():
             self.artifacts[self.n_steps] = {'ImputeWithEquation': {'column': column, 'Xs': Xs, 'coefficients': coefficients}}
         
         except Exception as e:
-            print("Failed to perform regression-based imputation.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to perform regression-based imputation.", e)
         
     
+    @instrumented
     def ImputeWithValue(self, column, value, group_by = None):
         '''
         FUNCTION to impute missing values in a column using user-specified value.
@@ -433,6 +807,8 @@ class Pipeline():
         - value: Value to impute by
         - group_by: List of column(s) to group by before performing imputation
         '''
+        if self.lazy:
+            return self._defer('ImputeWithValue', column = column, value = value, group_by = group_by)
         if group_by:
             assert isinstance(group_by, list) and all(col in list(self.data.columns) for col in group_by), "Require all column(s) to group by to exist in the dataframe and to be specified in a list."
         
@@ -450,9 +826,7 @@ class Pipeline():
 
         
         except Exception as e:
-            print("Failed to perform imputation.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+            self._log_error("Failed to perform imputation.", e)
     
     
     def exportArtifacts(self, filetype = 'json'):
@@ -462,40 +836,152 @@ class Pipeline():
         return self.artifacts
     
     
-    def importArtifacts(self, artifacts):
-        # needs work
+    def runPlan(self, plan, stats = None, max_workers = 1):
         '''
-        Imports the artifacts of a transformation pipeline and applies to data.
+        Applies a plan of transformation steps to the data and times each step. Execution stops at the first step that fails.
+        If max_workers > 1, steps that do not depend on each other (see planning.step_dependencies), e.g. a ReplaceByStd on one column and an ImputeWithKNN on another, are applied at the same time on a pool of threads (see _runScheduled). The data, metadata, artifacts, and statuses of the steps are identical to sequential execution; the profile of each step records the bytes of the columns it was applied to only.
+        Parameters:
+        - plan: List of (method, params) tuples, e.g. compiled from artifacts with planning.compile_artifacts()
+        - stats: (Optional) Dictionary {position of step in plan: {statistic: value}} of statistics computed over the whole data (see streaming.GroupStats), for steps applied to a chunk of the data
+        - max_workers: Number of threads that apply independent steps at the same time
+        Returns a dataframe with the method, status ('done' or 'failed'), duration in seconds, and number of rows before and after each step that was executed.
         '''
-        assert isinstance(artifacts, dict)
+        if max_workers > 1 and len(plan) > 1 and not self.lazy and self.history is None:
+            return self._runScheduled(plan, stats, max_workers)
         
-        try:
-            for n, step in artifacts.items():
-                for method, args in step.items():
-                    if method == "DropColumns":
-                        self.DropColumns(args)
-                    elif method == "RenameColumns":
-                        self.RenameColumns(args)
-                    elif method == "RecodeColumnTypes":
-                        self.RecodeColumnTypes(args)
-                    elif method == "RecodeColumnValues":
-                        self.RecodeColumnValues(args[0], args[1])
-                    elif method == "SumColumnValues":
-                        self.SumColumnValues(args[0], args[1])
-                    elif method == "ImputeWithKNN":
-                        self.ImputeWithKNN(args[0], args[1], args[2], args[3], args[4])
-                    elif method == "ImputeWithEquation":
-                        self.ImputeWithEquation(args[0], args[1], args[2])
-                    elif method == "ImputeWithValue":
-                        self.ImputeWithValue(args[0], args[1], args[2])
-                    elif method == "ReplaceByValue":
-                        self.FilterColumnByValue(args[0], args[1], args[2], args[3], args[4])
-                    elif method == "ReplaceByStd":
-                        self.FilterColumnByStd(args[0], args[1], args[2], args[3])
-                    else:
-                        raise Exception(f"{n}. {method} could not be executed. Terminate")
+        timings = []
+        for i, (method, params) in enumerate(plan):
+            n_steps, rows_in = self.n_steps, self.data.shape[0]
+            start = time.perf_counter()
+            try:
+                self.stats = stats.get(i) if stats else None
+                getattr(self, method)(**params)
+                status = 'done' if self.n_steps > n_steps else 'failed'
+            
+            except AssertionError as e:
+                print(f"Failed to apply {method}.")
+                current_dateTime = str(datetime.now())[0:19]
+                print(current_dateTime + ': ' + str(e))
+                status = 'failed'
+            
+            finally:
+                self.stats = None
+            
+            timings.append({'method': method, 'status': status, 'seconds': time.perf_counter() - start,
+                            'rows_in': rows_in, 'rows_out': self.data.shape[0]})
+            if status == 'failed':
+                break
+        return pd.DataFrame(timings, columns = ['method', 'status', 'seconds', 'rows_in', 'rows_out'])
+    
+    
+    def _fork(self, data, written, stats = None):
+        # a Pipeline over some of the columns of the data, to apply a step independently of the other steps; its steps are numbered from 1
+        return Pipeline.fromState(data, written = written, deltas = dict() if self.deltas is not None else None,
+                                  compact = self.compact, stats = stats, backend = self.backend)
+    
+    
+    def _runScheduled(self, plan, stats, max_workers):
+        '''
+        Applies a plan of transformation steps with a DAG scheduler (see runPlan). Every step is applied to a fork of the Pipeline over a copy of the columns it reads and writes (all columns for steps that change the rows) as soon as the steps it depends on are done. The forks are then merged in the order of the plan: columns are replaced, dropped, renamed, and appended as sequential execution would, and the steps of the metadata, artifacts, profile, and deltas are renumbered. Nothing after the first failed step is merged, as sequential execution stops there.
+        '''
+        dependencies = step_dependencies(plan)
+        store, written, index = dict(self.data.items()), dict(self.written), self.data.index # columns as of the steps that are done
         
-        except Exception as e:
-            print("Failed to import artifacts.")
-            current_dateTime = str(datetime.now())[0:19]
-            print(current_dateTime + ': ' + str(e))
+        def apply(fork, method, params):
+            start = time.perf_counter()
+            try:
+                getattr(fork, method)(**params)
+                return time.perf_counter() - start, None
+            except Exception as e:
+                return time.perf_counter() - start, e
+        
+        forks, results, running, failed = dict(), dict(), dict(), None
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            while True:
+                for i, (method, params) in enumerate(plan):
+                    if i in forks or (failed is not None and i > failed) or not dependencies[i] <= results.keys():
+                        continue
+                    try:
+                        reads, writes = step_columns(method, params)
+                        used = None if method == 'DropRows' else reads | writes
+                    except Exception:
+                        used = None
+                    columns = [col for col in store if used is None or col in used]
+                    data = pd.DataFrame({col: store[col] for col in columns}, index = index, columns = columns) # copied, so steps can write in place
+                    forks[i] = (self._fork(data, written, stats.get(i) if stats else None), columns)
+                    running[executor.submit(apply, forks[i][0], method, params)] = i
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    results[i] = future.result()
+                    fork, columns = forks[i]
+                    if results[i][1] is not None or fork.n_steps == 0:
+                        failed = i if failed is None else min(failed, i)
+                        continue
+                    # later steps see the columns written, dropped, or renamed by the step
+                    for col in columns:
+                        if col not in fork.data.columns:
+                            store.pop(col)
+                            written.pop(col)
+                    for col in fork.data.columns:
+                        store[col], written[col] = fork.data[col], fork.written[col]
+                    index = fork.data.index
+        
+        # merge the forks in the order of the plan
+        timings, error = [], None
+        data, order, written, index = dict(self.data.items()), list(self.data.columns), dict(self.written), self.data.index
+        for i, (method, params) in enumerate(plan):
+            fork, columns = forks[i]
+            seconds, error = results[i]
+            if error is not None and not isinstance(error, AssertionError):
+                break # raised below, after the steps before it are merged
+            if error is not None:
+                print(f"Failed to apply {method}.")
+                current_dateTime = str(datetime.now())[0:19]
+                print(current_dateTime + ': ' + str(error))
+                error = None
+            
+            if method == 'RenameColumns' and fork.n_steps > 0:
+                order = [params['recode_dict'].get(col, col) for col in order]
+            else:
+                order = [col for col in order if col not in columns or col in fork.data.columns] + [col for col in fork.data.columns if col not in columns]
+            for col in columns:
+                if col not in fork.data.columns:
+                    data.pop(col)
+                    written.pop(col)
+            for col in fork.data.columns:
+                data[col], written[col] = fork.data[col], fork.written[col]
+            index = fork.data.index
+            
+            offset = self.n_steps
+            self.metadata += renumber_steps(fork.metadata, offset)
+            self.artifacts.update({step + offset: artifact for step, artifact in fork.artifacts.items()})
+            self._profile += [{**record, 'step': record['step'] + offset if record['step'] is not None else None} for record in fork._profile]
+            if self.deltas is not None:
+                self.deltas.update({step + offset: delta for step, delta in fork.deltas.items()})
+            self.n_steps += fork.n_steps
+            
+            status = 'done' if fork.n_steps > 0 else 'failed'
+            timings.append({'method': method, 'status': status, 'seconds': seconds,
+                            'rows_in': len(self.data) if not timings else timings[-1]['rows_out'], 'rows_out': len(index)})
+            if status == 'failed':
+                break
+        
+        self.data = pd.DataFrame({col: data[col] for col in order}, index = index, columns = order, copy = False)
+        self.written = {col: written[col] for col in order}
+        if error is not None:
+            raise error
+        return pd.DataFrame(timings, columns = ['method', 'status', 'seconds', 'rows_in', 'rows_out'])
+    
+    
+    def importArtifacts(self, artifacts, max_workers = 1):
+        '''
+        Imports the artifacts of a transformation pipeline and applies to data. The artifacts are compiled and validated up front (see planning.compile_artifacts), so invalid artifacts raise an exception before any step is applied.
+        With max_workers > 1, steps that do not depend on each other are applied at the same time (see runPlan).
+        Returns the timings of the steps (see runPlan).
+        '''
+        plan = compile_artifacts(artifacts)
+        return self.runPlan(plan, max_workers = max_workers)
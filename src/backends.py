@@ -0,0 +1,203 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+
+backend_order = ['polars', 'arrow', 'pandas'] # fastest first
+backend_packages = {'polars': 'polars',
+                    'arrow': 'pyarrow',
+                    'pandas': 'pandas'
+}
+
+
+def group_transform(df, column, group_by, func):
+    '''
+    FUNCTION to compute a statistic of a column for the group of every row in a single pass.
+    Parameters:
+    - df: Dataframe
+    - column: Name of column to compute the statistic of
+    - group_by: List of column(s) to group by, or None to compute the statistic over the whole column
+    - func: Name of the statistic (e.g. 'mean', 'median', 'std')
+    Returns a Series aligned with the rows of df, or a scalar if there is no grouping.
+    '''
+    if group_by:
+        return df.groupby(group_by)[column].transform(func)
+    return df[column].agg(func)
+
+
+def group_ids(df, group_by):
+    '''
+    FUNCTION to factorize the unique combinations of the values of one or more columns into integer codes, one per row. Rows with a missing value in any of the columns get the code -1, as they belong to no group of df.groupby(group_by).
+    Parameters:
+    - df: Dataframe
+    - group_by: List of column(s) to group by
+    '''
+    codes = None
+    for col in group_by:
+        col_codes, uniques = pd.factorize(df[col])
+        if codes is None:
+            codes = col_codes
+        else:
+            codes = np.where((codes < 0) | (col_codes < 0), -1, pd.factorize(codes*len(uniques) + col_codes)[0])
+    return np.asarray(codes, dtype = np.int64)
+
+
+def map_groups(codes, groups, stats, index):
+    # map the statistics of groups to the rows of each group; rows of no group (code -1) get NA, as with groupby transform
+    lookup = np.full(codes.max() + 2 if len(codes) > 0 else 1, np.nan)
+    lookup[groups] = stats
+    return float_series(lookup[codes], index)
+
+
+def float_series(values, index):
+    # a nullable Float64 Series with NaN as missing, built from the float array without conversion (steps write into it, so it must not be a read-only Arrow buffer)
+    values = values if values.flags.writeable else values.copy()
+    return pd.Series(pd.arrays.FloatingArray(values, np.isnan(values)), index = index)
+
+
+class PandasBackend:
+    '''
+    The PandasBackend object computes the kernels of the Pipeline steps with pandas: the statistics of a column per group (group_transform) and weighted row-wise sums of columns (row_sum).
+    The other backends override some of the kernels with a multi-threaded columnar engine and inherit the pandas kernels for the rest, and a kernel that an engine cannot compute (e.g. a statistic it only approximates, or a dtype it does not support) falls back to pandas. The steps, metadata, and artifacts of a Pipeline are the same whatever its backend, and its data is identical up to the floating-point rounding of the statistics.
+    '''
+    name = 'pandas'
+
+
+    def __str__(self):
+        return f"{type(self).__name__}: '{self.name}'"
+
+
+    def group_transform(self, df, column, group_by, func):
+        '''
+        Returns a statistic of a column for the group of every row (see group_transform).
+        '''
+        return group_transform(df, column, group_by, func)
+
+
+    def row_sum(self, df, columns, weights = None):
+        '''
+        Returns the row-wise sums of columns (each multiplied by its weight, if any). Missing values count as 0.
+        Parameters:
+        - df: Dataframe
+        - columns: List of columns to be summed
+        - weights: (Optional) list of the weights of the columns
+        '''
+        if weights is None:
+            return df[columns].sum(axis = 1)
+        return (df[columns]*weights).sum(axis = 1)
+
+
+class ArrowBackend(PandasBackend):
+    '''
+    The ArrowBackend object computes group means and standard deviations with the multi-threaded hash aggregations of pyarrow.compute, and row-wise sums with its vectorized arithmetic kernels. Medians fall back to pandas, since Arrow only approximates them.
+    '''
+    name = 'arrow'
+    statistics = {'mean': ('mean', None), 'std': ('stddev', 'ddof')}
+
+
+    def __init__(self):
+        import pyarrow
+        import pyarrow.compute
+        self.pa, self.pc = pyarrow, pyarrow.compute
+
+
+    def group_transform(self, df, column, group_by, func):
+        if func not in self.statistics:
+            return super().group_transform(df, column, group_by, func)
+        try:
+            aggregation, ddof = self.statistics[func]
+            options = self.pc.VarianceOptions(ddof = 1) if ddof else None
+            values = self.pa.array(df[column].to_numpy(dtype = 'float64', na_value = np.nan), from_pandas = True) # NaN becomes null
+            if not group_by:
+                stat = getattr(self.pc, aggregation)(values, options = options).as_py()
+                return np.nan if stat is None else stat
+
+            codes = group_ids(df, group_by)
+            table = self.pa.table({'group': codes, 'value': values})
+            stats = table.group_by('group').aggregate([('value', aggregation, options)])
+            groups = stats['group'].to_numpy()
+            return map_groups(codes, groups[groups >= 0], stats[f'value_{aggregation}'].to_numpy(zero_copy_only = False)[groups >= 0], df.index)
+
+        except Exception:
+            return super().group_transform(df, column, group_by, func)
+
+
+    def row_sum(self, df, columns, weights = None):
+        try:
+            total = self.pa.array(np.zeros(len(df)))
+            for col, weight in zip(columns, weights if weights is not None else [None]*len(columns)):
+                values = self.pa.array(df[col].to_numpy(dtype = 'float64', na_value = np.nan), from_pandas = True)
+                if weight is not None:
+                    values = self.pc.multiply(values, float(weight))
+                total = self.pc.add(total, self.pc.fill_null(values, 0.0))
+            return float_series(total.to_numpy(zero_copy_only = False), df.index)
+
+        except Exception:
+            return super().row_sum(df, columns, weights)
+
+
+class PolarsBackend(PandasBackend):
+    '''
+    The PolarsBackend object computes group means, medians, and standard deviations with multi-threaded Polars window expressions, and row-wise sums with its horizontal sum.
+    '''
+    name = 'polars'
+
+
+    def __init__(self):
+        import polars
+        self.pl = polars
+        self.statistics = {'mean': lambda col: col.mean(),
+                           'median': lambda col: col.median(),
+                           'std': lambda col: col.std(ddof = 1)}
+
+
+    def _values(self, series):
+        # a float column with missing values as nulls (Polars keeps NaN as a value)
+        return self.pl.Series('value', series.to_numpy(dtype = 'float64', na_value = np.nan)).fill_nan(None)
+
+
+    def group_transform(self, df, column, group_by, func):
+        if func not in self.statistics:
+            return super().group_transform(df, column, group_by, func)
+        try:
+            values = self._values(df[column])
+            if not group_by:
+                stat = self.statistics[func](values)
+                return np.nan if stat is None else stat
+
+            codes = group_ids(df, group_by)
+            frame = self.pl.DataFrame([self.pl.Series('group', codes), values])
+            stats = frame.select(self.statistics[func](self.pl.col('value')).over('group')).to_series().to_numpy()
+            return float_series(np.where(codes < 0, np.nan, stats), df.index)
+
+        except Exception:
+            return super().group_transform(df, column, group_by, func)
+
+
+    def row_sum(self, df, columns, weights = None):
+        try:
+            weights = weights if weights is not None else [1.0]*len(columns)
+            frame = self.pl.DataFrame([self._values(df[col]).alias(str(i))*float(weight) for i, (col, weight) in enumerate(zip(columns, weights))])
+            total = frame.select(self.pl.sum_horizontal(self.pl.all().fill_null(0.0))).to_series().to_numpy()
+            return float_series(total.astype('float64'), df.index)
+
+        except Exception:
+            return super().row_sum(df, columns, weights)
+
+
+backend_classes = {'polars': PolarsBackend,
+                   'arrow': ArrowBackend,
+                   'pandas': PandasBackend
+}
+
+
+def get_backend(name = 'pandas'):
+    '''
+    FUNCTION to create the backend that computes the kernels of the Pipeline steps.
+    Parameters:
+    - name: 'pandas', 'arrow', 'polars', or 'auto' for the fastest installed engine (pandas if neither Polars nor pyarrow is installed)
+    '''
+    if name == 'auto':
+        name = next(backend for backend in backend_order if importlib.util.find_spec(backend_packages[backend]) is not None)
+    assert name in backend_classes, f"Require backend to be one of {backend_order + ['auto']}."
+    assert importlib.util.find_spec(backend_packages[name]) is not None, f"The {name} backend requires the package {backend_packages[name]} to be installed."
+    return backend_classes[name]()
@@ -0,0 +1,278 @@
+import argparse
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+
+from PipelineClass import Pipeline
+from backends import backend_order
+from planning import compile_artifacts, step_statistics, statistic_passes
+from ingestion import file_formats, list_data_files, iter_chunks
+from schema import infer_schema, merge_schemas
+from streaming import GroupStats, TDIGEST_COMPRESSION
+
+output_formats = ['parquet', 'csv']
+
+
+def read_file(path):
+    '''
+    FUNCTION to read a data set (a data file, or a directory of data files that are concatenated) with the reader of each file's extension.
+    '''
+    frames = []
+    for file in list_data_files(path):
+        ext = os.path.splitext(file)[1][1:].lower()
+        assert ext in file_formats, f"Unsupported file format: {ext}"
+        frames.append(file_formats[ext](file))
+    assert frames, f"No data files found in {path}"
+    return pd.concat(frames, ignore_index = True) if len(frames) > 1 else frames[0]
+
+
+def output_name(path):
+    # name of the output of a data set: the name of the file without extension, or of the directory
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def apply_file(path, plan, output_dir, output_format = 'parquet', step_workers = 1, backend = 'pandas'):
+    '''
+    FUNCTION to apply a compiled plan to a single data file and write the transformed data to the output directory.
+    Parameters:
+    - path: Path to the data file
+    - plan: List of (method, params) tuples compiled with planning.compile_artifacts()
+    - output_dir: Directory to write the transformed file to (with the same name as the input file)
+    - output_format: 'parquet' or 'csv'
+    - step_workers: Number of threads that apply independent steps at the same time (see Pipeline.runPlan)
+    - backend: Backend that computes the steps (see backends.get_backend)
+    Returns a dataframe with the timings of reading, each step, and writing the file.
+    '''
+    timings = []
+    try:
+        start = time.perf_counter()
+        pipeline = Pipeline(input_df = read_file(path), backend = backend)
+        timings.append({'method': 'read', 'status': 'done', 'seconds': time.perf_counter() - start,
+                        'rows_in': None, 'rows_out': pipeline.data.shape[0]})
+
+        steps = pipeline.runPlan(plan, max_workers = step_workers)
+        timings += steps.to_dict('records')
+
+        if (steps['status'] == 'done').all():
+            start = time.perf_counter()
+            output = os.path.join(output_dir, f"{output_name(path)}.{output_format}")
+            if output_format == 'parquet':
+                pipeline.data.to_parquet(output, index = False)
+            else:
+                pipeline.data.to_csv(output, index = False)
+            timings.append({'method': 'write', 'status': 'done', 'seconds': time.perf_counter() - start,
+                            'rows_in': pipeline.data.shape[0], 'rows_out': None})
+
+    except Exception as e:
+        print(f"Failed to apply the plan to {path}.")
+        current_dateTime = str(datetime.now())[0:19]
+        print(current_dateTime + ': ' + str(e))
+        timings.append({'method': 'error', 'status': 'failed', 'seconds': None, 'rows_in': None, 'rows_out': None})
+
+    report = pd.DataFrame(timings, columns = ['method', 'status', 'seconds', 'rows_in', 'rows_out'])
+    report.insert(0, 'step', range(len(report)))
+    report.insert(0, 'file', path)
+    return report
+
+
+def chunk_statistics(chunk, schema, plan, steps, stats, compression = TDIGEST_COMPRESSION):
+    '''
+    FUNCTION to accumulate the statistics of some steps of a plan over one chunk of data. The steps before them are applied to the chunk first, with the statistics known from previous passes.
+    Parameters:
+    - chunk: Dataframe
+    - schema: Schema of the data set (see schema.merge_schemas)
+    - plan: List of (method, params) tuples
+    - steps: Positions of the steps in the plan whose statistics are accumulated
+    - stats: Dictionary {position of step in plan: {statistic: value}} of the statistics known from previous passes
+    - compression: Compression of the t-digests for medians (see streaming.GroupStats)
+    Returns a dictionary {position of step in plan: GroupStats} that can be merged with those of other chunks.
+    '''
+    accumulators = {i: GroupStats(plan[i][1]['column'], plan[i][1].get('group_by'), step_statistics(*plan[i]), compression) for i in steps}
+    pipeline = Pipeline(input_df = chunk, schema = schema)
+    for i, (method, params) in enumerate(plan[:max(steps) + 1]):
+        if i in accumulators:
+            accumulators[i].update(pipeline.data)
+        elif not step_statistics(method, params) or i in stats:
+            pipeline.stats = stats.get(i)
+            getattr(pipeline, method)(**params)
+            pipeline.stats = None
+    return accumulators
+
+
+def map_chunks(func, chunks, max_workers = 1, **kwargs):
+    '''
+    FUNCTION to apply a function to chunks of data, in parallel over a pool of processes if max_workers > 1, and yield the results in the order of the chunks. At most 2*max_workers chunks are held in memory at a time.
+    Parameters:
+    - func: Function of a chunk (and kwargs)
+    - chunks: Iterator of chunks
+    - max_workers: Number of processes (1 to apply the function in this process)
+    '''
+    if not max_workers or max_workers <= 1:
+        for chunk in chunks:
+            yield func(chunk, **kwargs)
+        return
+    
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = deque()
+        for chunk in chunks:
+            futures.append(executor.submit(func, chunk, **kwargs))
+            if len(futures) >= 2*max_workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def chunked_statistics(path, plan, schema, chunksize = 100000, max_workers = 1, exact = False):
+    '''
+    FUNCTION to compute the statistics of the steps of a plan that need them (e.g. group means for ReplaceByStd) over all the chunks of a data set, with one read of the data set per pass (see planning.statistic_passes).
+    Parameters:
+    - path: Path to a data file or a directory of data files
+    - plan: List of (method, params) tuples compiled with planning.compile_artifacts()
+    - schema: Schema of the data set (see schema.merge_schemas)
+    - chunksize: Maximum number of rows per chunk
+    - max_workers: Number of processes that compute the statistics of the chunks in parallel
+    - exact: If True, medians are exact instead of approximated with t-digests (see streaming.GroupStats)
+    Returns a dictionary {position of step in plan: {statistic: value}} to be passed to Pipeline.runPlan(), and the seconds taken by each pass.
+    '''
+    stats, seconds = dict(), []
+    for steps in statistic_passes(plan):
+        start = time.perf_counter()
+        accumulators = None
+        for partial in map_chunks(chunk_statistics, iter_chunks(path, chunksize), max_workers,
+                                  schema = schema, plan = plan, steps = steps, stats = stats, compression = None if exact else TDIGEST_COMPRESSION):
+            accumulators = partial if accumulators is None else {i: accumulators[i].merge(partial[i]) for i in steps}
+        stats.update({i: {statistic: accumulator.result(statistic) for statistic in accumulator.statistics} for i, accumulator in accumulators.items()})
+        seconds.append(time.perf_counter() - start)
+    return stats, seconds
+
+
+def apply_chunked(path, plan, output_dir, chunksize = 100000, max_workers = 1, exact = False):
+    '''
+    FUNCTION to apply a compiled plan to a data set that does not fit in memory, streaming it in chunks of at most chunksize rows. The data set is read several times:
+    1. to infer one schema for all the chunks (see schema.merge_schemas),
+    2. once per pass of statistics (see planning.statistic_passes), to compute the statistics (e.g. group means for ReplaceByStd) of the steps that need them over the whole data set,
+    3. to apply the plan to every chunk, with the statistics of the whole data set, and write each chunk to a Parquet file in the directory {output_dir}/{name of the data set}/.
+    Parameters:
+    - path: Path to a data file or a directory of data files (CSV, Parquet, or Excel)
+    - plan: List of (method, params) tuples compiled with planning.compile_artifacts()
+    - output_dir: Directory to write the transformed data set to
+    - chunksize: Maximum number of rows per chunk
+    - max_workers: Number of processes that compute the statistics of the chunks in parallel
+    - exact: If True, medians are computed from all the values of their column instead of a t-digest (see streaming.GroupStats), which is exact but holds the column in memory
+    Returns a dataframe with the timings of each pass and each step (summed over the chunks).
+    '''
+    assert all(method != 'ImputeWithKNN' for method, _ in plan), "ImputeWithKNN cannot be applied to chunks of data. Apply the plan in memory instead."
+    
+    timings = []
+    def timed(method, start, rows_in = None, rows_out = None, status = 'done'):
+        timings.append({'method': method, 'status': status, 'seconds': time.perf_counter() - start, 'rows_in': rows_in, 'rows_out': rows_out})
+    
+    try:
+        start = time.perf_counter()
+        schema = merge_schemas([infer_schema(chunk) for chunk in iter_chunks(path, chunksize)])
+        timed('schema', start)
+        
+        # statistics of the steps that need them, computed over all chunks
+        stats, seconds = chunked_statistics(path, plan, schema, chunksize, max_workers, exact)
+        timings += [{'method': 'statistics', 'status': 'done', 'seconds': pass_seconds, 'rows_in': None, 'rows_out': None} for pass_seconds in seconds]
+        
+        # apply the plan to every chunk and write it
+        directory = os.path.join(output_dir, output_name(path))
+        os.makedirs(directory, exist_ok = True)
+        for old in os.listdir(directory):
+            if old.startswith("part-") and old.endswith(".parquet"):
+                os.remove(os.path.join(directory, old))
+        steps, written, write_seconds = [], 0, 0.0
+        for n, chunk in enumerate(iter_chunks(path, chunksize)):
+            pipeline = Pipeline(input_df = chunk, schema = schema)
+            report = pipeline.runPlan(plan, stats = stats)
+            report['position'] = range(len(report))
+            steps.append(report)
+            if (report['status'] == 'failed').any():
+                break
+            start = time.perf_counter()
+            pipeline.data.to_parquet(os.path.join(directory, f"part-{n:05d}.parquet"), index = False)
+            written, write_seconds = written + pipeline.data.shape[0], write_seconds + time.perf_counter() - start
+        if steps:
+            steps = pd.concat(steps).groupby('position', sort = True).agg(method = ('method', 'first'),
+                                                                           status = ('status', lambda status: 'failed' if (status == 'failed').any() else 'done'),
+                                                                           seconds = ('seconds', 'sum'),
+                                                                           rows_in = ('rows_in', 'sum'),
+                                                                           rows_out = ('rows_out', 'sum'))
+            timings += steps.to_dict('records')
+        timings.append({'method': 'write', 'status': 'done', 'seconds': write_seconds, 'rows_in': written, 'rows_out': None})
+    
+    except Exception as e:
+        print(f"Failed to apply the plan to {path} in chunks.")
+        current_dateTime = str(datetime.now())[0:19]
+        print(current_dateTime + ': ' + str(e))
+        timings.append({'method': 'error', 'status': 'failed', 'seconds': None, 'rows_in': None, 'rows_out': None})
+    
+    report = pd.DataFrame(timings, columns = ['method', 'status', 'seconds', 'rows_in', 'rows_out'])
+    report.insert(0, 'step', range(len(report)))
+    report.insert(0, 'file', path)
+    return report
+
+
+def apply_batch(paths, artifacts, output_dir, output_format = 'parquet', max_workers = None, chunksize = None, partition_workers = 1, exact = False, step_workers = 1, backend = 'pandas'):
+    '''
+    FUNCTION to apply the artifacts of a Pipeline to many data files in parallel, one file per process. The artifacts are compiled and validated once, before any file is read.
+    Parameters:
+    - paths: List of paths to data files
+    - artifacts: Dictionary of artifacts, as exported by Pipeline.exportArtifacts()
+    - output_dir: Directory to write the transformed files to
+    - output_format: 'parquet' or 'csv'
+    - max_workers: Maximum number of processes
+    - chunksize: (Optional) Maximum number of rows per chunk, to apply the artifacts out-of-core (see apply_chunked); the output is then written as a directory of Parquet files per data set
+    - partition_workers: Number of processes per data set that compute statistics over its chunks in parallel (chunksize only)
+    - exact: If True, medians of chunked data sets are exact instead of approximated with t-digests (chunksize only)
+    - step_workers: Number of threads per data set that apply independent steps at the same time (without chunksize)
+    - backend: Backend that computes the steps, e.g. 'auto' for the fastest installed engine (without chunksize, see backends.get_backend)
+    Returns a dataframe with the timings of every step of every file.
+    '''
+    assert isinstance(paths, list) and len(paths) > 0, "Require a non-empty list of files."
+    assert output_format in output_formats, f"Require output format to be one of {output_formats}."
+
+    plan = compile_artifacts(artifacts)
+    os.makedirs(output_dir, exist_ok = True)
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        if chunksize:
+            reports = list(executor.map(apply_chunked, paths, [plan]*len(paths), [output_dir]*len(paths), [chunksize]*len(paths),
+                                        [partition_workers]*len(paths), [exact]*len(paths)))
+        else:
+            reports = list(executor.map(apply_file, paths, [plan]*len(paths), [output_dir]*len(paths), [output_format]*len(paths), [step_workers]*len(paths), [backend]*len(paths)))
+    return pd.concat(reports, ignore_index = True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Apply the artifacts of a Pipeline to data files, outside of the app.")
+    parser.add_argument("artifacts", help = "Path to the artifacts JSON file")
+    parser.add_argument("files", nargs = "+", help = "Data files, directories of data files (one data set per directory), or glob patterns (e.g. 'data/ovs/*.csv')")
+    parser.add_argument("--output-dir", default = "data/transformed", help = "Directory to write the transformed files to")
+    parser.add_argument("--format", default = "parquet", choices = output_formats, help = "Format of the transformed files")
+    parser.add_argument("--workers", type = int, default = None, help = "Number of processes (default: number of CPUs)")
+    parser.add_argument("--chunksize", type = int, default = None, help = "(Optional) Stream each data set in chunks of this many rows, for data that does not fit in memory; writes a directory of Parquet files per data set")
+    parser.add_argument("--partition-workers", type = int, default = 1, help = "Number of processes per data set that compute statistics over its chunks in parallel (with --chunksize)")
+    parser.add_argument("--exact-medians", action = "store_true", help = "Compute exact medians over chunks instead of t-digest approximations, holding the column in memory (with --chunksize)")
+    parser.add_argument("--step-workers", type = int, default = 1, help = "Number of threads per data set that apply steps on independent columns at the same time (without --chunksize)")
+    parser.add_argument("--backend", default = "pandas", choices = backend_order + ["auto"], help = "Engine that computes the group statistics and sums of the steps: pandas, a multi-threaded columnar engine (arrow, polars), or the fastest installed one (auto); without --chunksize")
+    parser.add_argument("--report", default = None, help = "(Optional) path to write the timings of every step to, as CSV")
+    args = parser.parse_args()
+
+    with open(args.artifacts) as f:
+        artifacts = json.load(f)
+    paths = sorted(set(path for pattern in args.files for path in (glob.glob(pattern) or [pattern])))
+
+    report = apply_batch(paths, artifacts, args.output_dir, args.format, args.workers, args.chunksize, args.partition_workers, args.exact_medians, args.step_workers, args.backend)
+    summary = report.groupby('file').agg(steps = ('step', 'count'),
+                                         failed = ('status', lambda status: (status == 'failed').sum()),
+                                         seconds = ('seconds', 'sum'))
+    print(summary.to_string())
+    print(report.groupby('method')['seconds'].agg(['count', 'sum', 'mean']).to_string())
+    if args.report:
+        report.to_csv(args.report, index = False)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+from collections import OrderedDict
+import pandas as pd
+
+from PipelineClass import Pipeline
+
+
+def fingerprint(df):
+    '''
+    FUNCTION to compute a content hash of a pandas dataframe, including its columns and dtypes.
+    Parameters:
+    - df: Dataframe to be fingerprinted
+    '''
+    assert isinstance(df, pd.DataFrame)
+
+    h = hashlib.sha1()
+    h.update(str(list(df.columns)).encode())
+    h.update(str(list(df.dtypes.astype(str))).encode())
+    if df.shape[0] > 0 and df.shape[1] > 0:
+        h.update(pd.util.hash_pandas_object(df, index = True).values.tobytes())
+    return h.hexdigest()
+
+
+class StepCache:
+    '''
+    The StepCache object stores the state of a Pipeline after each transformation step, keyed by the fingerprint of the input data and the sequence of steps applied to it (i.e. the prefix of the artifacts). When the steps of a pipeline are replayed, e.g. on a Streamlit rerun, the steps that are unchanged are restored from the cache and only the steps from the first changed step onward are executed.
+    Entries share the columns that a step did not write with the entries before it, so each entry is sized by the columns its step wrote, and entries are evicted in least-recently-used order once the cache exceeds max_entries or max_bytes.
+    '''
+    def __init__(self, max_entries = 32, max_bytes = 1024**3):
+        assert isinstance(max_entries, int) and max_entries > 0
+        assert isinstance(max_bytes, int | float) and max_bytes > 0
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (data, metadata, n_steps, artifacts, profile, written, deltas, nbytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = dict() # id(df) -> (df, fingerprint) of recently seen input frames
+
+
+    def __str__(self):
+        return f"StepCache: {len(self.entries)} entries, {self.nbytes/1024**2:.1f} MB, {self.hits} hits, {self.misses} misses"
+
+
+    def fingerprint(self, df):
+        '''
+        Returns the fingerprint of an input dataframe. The fingerprint is remembered for the frame object (which is kept alive so that its id cannot be reused), so the frame held in session state is hashed only once.
+        '''
+        if id(df) not in self._fingerprints:
+            if len(self._fingerprints) >= 2:
+                self._fingerprints.pop(next(iter(self._fingerprints)))
+            self._fingerprints[id(df)] = (df, fingerprint(df))
+        return self._fingerprints[id(df)][1]
+
+
+    def _get(self, key, pipeline):
+        # restore the state of the pipeline from the cache; the data is shared with the cache entry
+        if key not in self.entries:
+            self.misses += 1
+            return False
+        self.entries.move_to_end(key)
+        data, metadata, n_steps, artifacts, profile, written, deltas, nbytes = self.entries[key]
+        pipeline.data = data.copy(deep = False) # the columns are shared, and copied by the steps that write them (see Pipeline._copy_on_write)
+        pipeline.metadata = metadata
+        pipeline.n_steps = n_steps
+        pipeline.artifacts = dict(artifacts)
+        pipeline._profile = list(profile) # as measured when the steps were executed
+        pipeline.written = dict(written)
+        pipeline.deltas = dict(deltas) if deltas is not None else None
+        pipeline.cache_key = key
+        self.hits += 1
+        return True
+
+
+    def _put(self, key, pipeline, columns = None):
+        # store the state of the pipeline in the cache and evict least recently used entries; the entry is sized by the columns it does not share with earlier entries, i.e. the columns the step wrote (all columns by default)
+        columns = pipeline.data.columns if columns is None else [col for col in columns if col in pipeline.data.columns]
+        nbytes = int(sum(pipeline.data[col].memory_usage(index = False, deep = False) for col in columns))
+        pipeline.cache_key = key
+        if nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[-1]
+        deltas = dict(pipeline.deltas) if pipeline.deltas is not None else None
+        self.entries[key] = (pipeline.data.copy(deep = False), pipeline.metadata, pipeline.n_steps, dict(pipeline.artifacts), list(pipeline._profile), dict(pipeline.written), deltas, nbytes)
+        self.nbytes += nbytes
+        while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+            self.nbytes -= self.entries.popitem(last = False)[1][-1]
+
+
+    def pipeline(self, input_df, deltas = False):
+        '''
+        Returns a Pipeline object for the input dataframe, restored from the cache if the same data was seen before.
+        Parameters:
+        - input_df: Dataframe
+        - deltas: Whether the Pipeline summarizes the distribution delta of every step (see Pipeline.stepDelta)
+        '''
+        key = (self.fingerprint(input_df), deltas)
+        if key in self.entries:
+            pipeline = Pipeline.fromState(self.entries[key][0]) # skip dtype conversion of the input when restored
+            self._get(key, pipeline)
+        else:
+            self.misses += 1
+            pipeline = Pipeline(input_df = input_df, deltas = deltas)
+            self._put(key, pipeline)
+        return pipeline
+
+
+    def apply(self, pipeline, method, **params):
+        '''
+        Applies a transformation step to a Pipeline created by StepCache.pipeline(). If the same step was applied to the same state before, the resulting state is restored from the cache instead of being recomputed.
+        Parameters:
+        - pipeline: Pipeline object
+        - method: Name of the transformation function (e.g. 'DropColumns')
+        - params: Keyword arguments of the transformation function
+        '''
+        assert method in pipeline.listFunctions(), f"{method} is not a transformation function of the Pipeline."
+
+        key = pipeline.cache_key + ((method, json.dumps(params, sort_keys = True, default = str)),)
+        if self._get(key, pipeline):
+            return pipeline
+        
+        # the columns of cached frames are shared, and the step copies the columns it writes before writing them
+        n_steps, written = pipeline.n_steps, dict(pipeline.written)
+        getattr(pipeline, method)(**params)
+        if pipeline.n_steps > n_steps: # only cache steps that succeeded
+            self._put(key, pipeline, pipeline.changedColumns(written))
+        else:
+            pipeline.cache_key = key
+        return pipeline
@@ -0,0 +1,249 @@
+import hashlib
+import importlib.util
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+import pandas as pd
+import pyarrow.feather as feather
+import pyarrow.parquet as parquet
+
+SHEET_COLUMN = "Sheet" # column added to workbooks with more than one sheet
+EXCEL_PARALLEL_BYTES = 4*1024**2 # smallest workbook whose sheets are parsed in parallel processes, as every process opens the workbook again
+
+# Excel engines of pandas by format, fastest first, and the module each engine imports and the pip package that installs it
+excel_engines = {'xls': ['calamine', 'xlrd'],
+                 'xlsx': ['calamine', 'openpyxl'],
+                 'xlsm': ['calamine', 'openpyxl'],
+                 'xlsb': ['calamine', 'pyxlsb']
+}
+engine_modules = {'calamine': 'python_calamine',
+                  'xlrd': 'xlrd',
+                  'openpyxl': 'openpyxl',
+                  'pyxlsb': 'pyxlsb'
+}
+engine_packages = {'calamine': 'python-calamine',
+                   'xlrd': 'xlrd',
+                   'openpyxl': 'openpyxl',
+                   'pyxlsb': 'pyxlsb'
+}
+
+
+def excel_engine(ext):
+    '''
+    FUNCTION to pick the fastest installed engine for an Excel format, or None if no engine for it is installed.
+    Parameters:
+    - ext: File extension, e.g. 'xlsx'
+    '''
+    assert ext in excel_engines, f"Unsupported Excel format: {ext}"
+    for engine in excel_engines[ext]:
+        if importlib.util.find_spec(engine_modules[engine]) is not None:
+            return engine
+    return None
+
+
+def read_sheet(content, sheet, engine):
+    # reads a single sheet from the raw bytes of a workbook (top-level so that it can run in a worker process)
+    return pd.read_excel(io.BytesIO(content), sheet_name = sheet, engine = engine)
+
+
+def read_excel(file, ext = None, sheets = None, max_workers = None):
+    '''
+    FUNCTION to read the sheets of an Excel workbook into a single dataframe with the fastest installed engine (see excel_engine). The sheets are stacked, with a column SHEET_COLUMN holding the name of the sheet of each row if more than one sheet is read. They are parsed from the workbook opened once, or in parallel worker processes if there are several sheets and the workbook has at least EXCEL_PARALLEL_BYTES (each process opens the workbook again to parse its sheet).
+    Parameters:
+    - file: Path to the workbook, or a file-like object
+    - ext: Excel format ('xls', 'xlsx', 'xlsm' or 'xlsb'); taken from the file name if not given
+    - sheets: (Optional) list of the names of the sheets to read; all sheets by default
+    - max_workers: Maximum number of processes used to parse the sheets
+    '''
+    if ext is None:
+        ext = os.path.splitext(file if isinstance(file, str) else getattr(file, 'name', ''))[1][1:].lower()
+    engine = excel_engine(ext)
+    assert engine is not None, f"No Excel engine installed for .{ext} files, pip install one of: {', '.join(engine_packages[e] for e in excel_engines[ext])}"
+
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            content = f.read()
+    else:
+        content = file.getvalue() if hasattr(file, 'getvalue') else file.read()
+
+    with pd.ExcelFile(io.BytesIO(content), engine = engine) as workbook:
+        sheets = workbook.sheet_names if sheets is None else sheets
+        workers, frames = min(len(sheets), max_workers or os.cpu_count() or 1), None
+        if workers > 1 and len(content) >= EXCEL_PARALLEL_BYTES:
+            try:
+                with ProcessPoolExecutor(max_workers = workers) as executor:
+                    frames = list(executor.map(read_sheet, [content]*len(sheets), sheets, [engine]*len(sheets)))
+
+            except Exception as e:
+                print("Failed to read sheets in parallel.")
+                current_dateTime = str(datetime.now())[0:19]
+                print(current_dateTime + ': ' + str(e))
+        if frames is None:
+            frames = [workbook.parse(sheet) for sheet in sheets]
+
+    if len(sheets) == 1:
+        return frames[0]
+    return pd.concat([frame.assign(**{SHEET_COLUMN: str(sheet)}) for sheet, frame in zip(sheets, frames)], ignore_index = True)
+
+
+file_formats = {'csv': pd.read_csv,
+                'parquet': pd.read_parquet,
+                'xls': partial(read_excel, ext = 'xls'),
+                'xlsx': partial(read_excel, ext = 'xlsx'),
+                'xlsm': partial(read_excel, ext = 'xlsm'),
+                'xlsb': partial(read_excel, ext = 'xlsb')
+}
+
+
+def list_data_files(path):
+    '''
+    FUNCTION to list the data files of a data set, which is either a single file or a directory of files (e.g. as resolved by DataObject.get_directory), in sorted order. Hidden files and files of unsupported formats are skipped.
+    Parameters:
+    - path: Path to a data file or a directory
+    '''
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path)
+                      if os.path.isfile(os.path.join(path, f)) and not f.startswith(".") and os.path.splitext(f)[1][1:].lower() in file_formats)
+    return [path]
+
+
+def iter_chunks(path, chunksize = 100000):
+    '''
+    FUNCTION to iterate over the rows of a data set (see list_data_files) in chunks of at most chunksize rows, without loading it into memory. CSV and Parquet files are streamed; Excel files cannot be streamed and are read whole, then split.
+    Parameters:
+    - path: Path to a data file or a directory
+    - chunksize: Maximum number of rows per chunk
+    '''
+    assert isinstance(chunksize, int) and chunksize > 0, "Require chunksize to be a positive integer."
+
+    for file in list_data_files(path):
+        ext = os.path.splitext(file)[1][1:].lower()
+        assert ext in file_formats, f"Unsupported file format: {ext}"
+        if ext == 'csv':
+            with pd.read_csv(file, chunksize = chunksize) as reader:
+                for chunk in reader:
+                    yield chunk
+        elif ext == 'parquet':
+            for batch in parquet.ParquetFile(file).iter_batches(batch_size = chunksize):
+                yield batch.to_pandas()
+        else:
+            df = file_formats[ext](file)
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+
+
+class ColumnarCache:
+    '''
+    The ColumnarCache object stores parsed data files on disk in the Arrow IPC (Feather) format, keyed by a hash of the file contents. A file is parsed once; later loads of the same contents, from any session and across restarts, memory-map the cached copy instead of parsing the file again.
+    The cache is capped at max_bytes on disk and evicts the least recently used files first.
+    '''
+    def __init__(self, directory = "data/.cache", max_bytes = 5*1024**3):
+        assert isinstance(max_bytes, int | float) and max_bytes > 0
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok = True)
+
+
+    def __str__(self):
+        files = self.list_files()
+        return f"ColumnarCache: {len(files)} files, {sum(size for _, _, size in files)/1024**2:.1f} MB in {self.directory}"
+
+
+    def key(self, content):
+        '''
+        Returns the content hash of the raw bytes of a file.
+        '''
+        return hashlib.sha256(content).hexdigest()
+
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.arrow")
+
+
+    def list_files(self):
+        '''
+        Returns (path, last used, size) of all the files in the cache.
+        '''
+        files = []
+        for f in os.listdir(self.directory):
+            if f.endswith(".arrow"):
+                stat = os.stat(os.path.join(self.directory, f))
+                files.append((os.path.join(self.directory, f), stat.st_mtime, stat.st_size))
+        return files
+
+
+    def get(self, key):
+        '''
+        Returns the cached dataframe for a content hash, or None if it is not in the cache.
+        '''
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            os.utime(path) # mark as recently used
+            return feather.read_table(path, memory_map = True).to_pandas()
+
+        except Exception as e:
+            print("Failed to read cached file.")
+            current_dateTime = str(datetime.now())[0:19]
+            print(current_dateTime + ': ' + str(e))
+            return None
+
+
+    def put(self, key, df):
+        '''
+        Writes a dataframe to the cache and evicts the least recently used files if the cache exceeds max_bytes.
+        '''
+        assert isinstance(df, pd.DataFrame)
+
+        path = self.path(key)
+        try:
+            # write to a temporary file first so concurrent sessions never read a partial file
+            feather.write_feather(df.reset_index(drop = True), f"{path}.tmp", compression = 'uncompressed')
+            os.replace(f"{path}.tmp", path)
+            self.evict()
+
+        except Exception as e:
+            # e.g. columns of mixed types that Arrow cannot represent; the file is simply not cached
+            print("Failed to write file to the columnar cache.")
+            current_dateTime = str(datetime.now())[0:19]
+            print(current_dateTime + ': ' + str(e))
+            if os.path.isfile(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+
+
+    def evict(self):
+        '''
+        Removes the least recently used files until the cache fits within max_bytes.
+        '''
+        files = sorted(self.list_files(), key = lambda f: f[1])
+        total = sum(size for _, _, size in files)
+        while files and total > self.max_bytes:
+            path, _, size = files.pop(0)
+            os.remove(path)
+            total -= size
+
+
+    def load(self, file, reader):
+        '''
+        Returns the dataframe of a data file, from the cache if the same contents were loaded before.
+        Parameters:
+        - file: Path to the file, or a file-like object (e.g. a Streamlit UploadedFile)
+        - reader: Function that parses the file into a dataframe (e.g. pd.read_csv)
+        '''
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                content = f.read()
+        else:
+            content = file.getvalue()
+
+        key = self.key(content)
+        df = self.get(key)
+        if df is None:
+            df = reader(io.BytesIO(content))
+            self.put(key, df)
+        return df
@@ -0,0 +1,340 @@
+from datetime import datetime
+
+valid_dtypes = ['char','string','int','float','boolean','categorical','datetime']
+
+number = int | float
+# artifact name -> (Pipeline method, how the parameters are stored in the artifact, {parameter: (allowed types, required, allowed values)})
+# parameters are stored as the parameter itself ('value'), as a tuple in the order of the parameters ('tuple'), or as keyword arguments ('kwargs')
+step_registry = {
+    'DropColumns': ('DropColumns', 'value', {'column_list': (list, True, None)}),
+    'DropRows': ('DropRows', 'value', {'column_list': (list, True, None)}),
+    'RecodeColumnNames': ('RenameColumns', 'value', {'recode_dict': (dict, True, None)}),
+    'RenameColumns': ('RenameColumns', 'value', {'recode_dict': (dict, True, None)}),
+    'RecodeColumnTypes': ('RecodeColumnTypes', 'value', {'recode_dict': (dict, True, None)}),
+    'RecodeColumnValues': ('RecodeColumnValues', 'tuple', {'column': (str, True, None),
+                                                           'recode_dict': (dict, True, None)}),
+    'SumColumnValues': ('SumColumnValues', 'tuple', {'column_list': (list, True, None),
+                                                     'target_column': (str, True, None)}),
+    'ReplaceByValue': ('ReplaceByValue', 'kwargs', {'column': (str, True, None),
+                                                    'bound': (number, True, None),
+                                                    'direction': (str, True, ['>', '<', '>=', '<=', '==', '!=']),
+                                                    'group_by': (list | str | None, False, None),
+                                                    'fill': (number | str, False, None)}),
+    'ReplaceByStd': ('ReplaceByStd', 'kwargs', {'column': (str, True, None),
+                                                'group_by': (list | str | None, False, None),
+                                                'n_std': (number, False, None),
+                                                'direction': (str, False, ['>', '<', '<>']),
+                                                'fill': (number | str, False, None)}),
+    'ImputeWithKNN': ('ImputeWithKNN', 'kwargs', {'column': (str, True, None),
+                                                  'n_neighbors': (int, False, None),
+                                                  'weights': (str, False, ['uniform', 'distance']),
+                                                  'metric': (str, False, None),
+                                                  'add_indicator': (bool, False, None),
+                                                  'features': (list | None, False, None)}),
+    'ImputeWithEquation': ('ImputeWithEquation', 'kwargs', {'column': (str, True, None),
+                                                            'Xs': (list, True, None),
+                                                            'coefficients': (list, True, None)}),
+    'ImputeWithValue': ('ImputeWithValue', 'kwargs', {'column': (str, True, None),
+                                                      'value': (number | str | bool, True, None),
+                                                      'group_by': (list | str | None, False, None)})
+}
+
+
+def step_columns(method, params):
+    '''
+    FUNCTION to get the columns that a Pipeline step reads and the columns that it writes.
+    Parameters:
+    - method: Name of the Pipeline step (e.g. 'DropColumns')
+    - params: Dictionary of keyword arguments passed to the step
+    Returns a tuple (reads, writes) of sets of column names.
+    '''
+    group_by = params.get('group_by') or []
+    if isinstance(group_by, str):
+        group_by = [group_by]
+
+    if method in ['DropColumns', 'DropRows']:
+        return set(params['column_list']), set()
+    elif method == 'RenameColumns':
+        columns = set(params['recode_dict'].keys()) | set(params['recode_dict'].values())
+        return columns, columns
+    elif method == 'RecodeColumnTypes':
+        return set(params['recode_dict'].keys()), set(params['recode_dict'].keys())
+    elif method in ['ReplaceByValue', 'ReplaceByStd', 'ImputeWithValue']:
+        return {params['column']} | set(group_by), {params['column']}
+    elif method == 'RecodeColumnValues':
+        return {params['column']}, {params['column']}
+    elif method == 'ImputeWithKNN':
+        return {params['column']} | set(params.get('features') or []), {params['column']}
+    elif method == 'ImputeWithEquation':
+        return {params['column']} | set(params['Xs']), {params['column']}
+    elif method == 'SumColumnValues':
+        # the summed columns are recoded to float before the sum is taken
+        return set(params['column_list']), set(params['column_list']) | {params['target_column']}
+    else:
+        raise Exception(f"Unknown Pipeline step: {method}")
+
+
+def step_statistics(method, params):
+    '''
+    FUNCTION to get the statistics of its column (over the whole data, or per group) that a Pipeline step computes, i.e. what prevents the step from being applied to chunks of the data independently.
+    Parameters:
+    - method: Name of the Pipeline step
+    - params: Dictionary of keyword arguments passed to the step
+    Returns a list of statistics ('mean', 'median', 'std'), empty if the step is row-local.
+    '''
+    fill = params.get('fill') if isinstance(params.get('fill'), str) else None
+    if method == 'ReplaceByStd':
+        return ['mean', 'std'] + (['median'] if fill == 'median' else [])
+    elif method == 'ReplaceByValue' and fill in ['mean', 'median']:
+        return [fill]
+    return []
+
+
+def statistic_passes(plan):
+    '''
+    FUNCTION to schedule the passes over chunked data that compute the statistics of the steps of a plan (see step_statistics). The statistics of a step can be computed in a pass if the data it reads does not depend on a step whose statistics are not known before the pass; otherwise the step waits for a later pass.
+    Parameters:
+    - plan: List of (method, params) tuples
+    Returns a list of passes, each a list of the positions of the steps whose statistics are computed in that pass.
+    '''
+    pending = [i for i, (method, params) in enumerate(plan) if step_statistics(method, params)]
+    passes = []
+    while pending:
+        current, dirty, dirty_rows = [], set(), False # columns (and rows) that depend on unknown statistics
+        for i, (method, params) in enumerate(plan[:pending[-1] + 1]):
+            reads, writes = step_columns(method, params)
+            depends = dirty_rows or bool(reads & dirty)
+            if i in pending:
+                if not depends:
+                    current.append(i)
+                dirty |= writes
+            elif depends:
+                dirty |= writes
+                if method == 'DropRows':
+                    dirty_rows = True
+        passes.append(current)
+        pending = [i for i in pending if i not in current]
+    return passes
+
+
+def step_dependencies(plan):
+    '''
+    FUNCTION to build the dependency DAG of the steps of a plan from the columns they read and write (see step_columns). A step depends on an earlier step if one of them writes (or drops) a column that the other reads or writes, and on every earlier step if either of them changes the rows (DropRows) or uses columns that cannot be known from its parameters. Steps that do not depend on each other give the same result in any order, or at the same time.
+    Parameters:
+    - plan: List of (method, params) tuples
+    Returns a list with the set of positions of the earlier steps that each step depends on.
+    '''
+    columns = [] # (columns used, columns written) of each step, or None if the step depends on all columns
+    for method, params in plan:
+        try:
+            reads, writes = step_columns(method, params)
+        except Exception:
+            columns.append(None) # e.g. invalid parameters, which the step itself rejects
+            continue
+        if method == 'DropColumns':
+            writes = reads
+        columns.append(None if method == 'DropRows' else (reads | writes, writes))
+
+    dependencies = []
+    for j, current in enumerate(columns):
+        dependencies.append({i for i, previous in enumerate(columns[:j])
+                             if previous is None or current is None or previous[1] & current[0] or previous[0] & current[1]})
+    return dependencies
+
+
+def push_down_drops(plan):
+    '''
+    FUNCTION to move every DropColumns step as early in the plan as possible, i.e. ahead of all the steps that do not read or write the dropped columns. A DropColumns step is split if only some of its columns can be moved.
+    Parameters:
+    - plan: List of (method, params) tuples
+    '''
+    optimized = []
+    for method, params in plan:
+        if method != 'DropColumns':
+            optimized.append((method, params))
+            continue
+
+        remaining = list(params['column_list'])
+        position = len(optimized)
+        while position > 0 and remaining:
+            reads, writes = step_columns(*optimized[position - 1])
+            blocked = [col for col in remaining if col in reads | writes]
+            if blocked:
+                # columns used by the previous step must be dropped after it
+                optimized.insert(position, ('DropColumns', {'column_list': blocked}))
+                remaining = [col for col in remaining if col not in blocked]
+            position -= 1
+        if remaining:
+            optimized.insert(position, ('DropColumns', {'column_list': remaining}))
+    return optimized
+
+
+def eliminate_dead_steps(plan):
+    '''
+    FUNCTION to remove the work of steps whose outputs are dropped before they are ever read. Column recodes are pruned to the columns that are still used, and steps that only write dropped columns are removed.
+    Parameters:
+    - plan: List of (method, params) tuples
+    '''
+    optimized = []
+    dead = set() # columns that are dropped before being read again
+    for method, params in reversed(plan):
+        if method == 'DropColumns':
+            dead |= set(params['column_list'])
+            optimized.append((method, params))
+            continue
+        if method == 'RenameColumns':
+            dead = set() # renamed columns cannot be tracked by name
+            optimized.append((method, params))
+            continue
+
+        reads, writes = step_columns(method, params)
+        if method == 'RecodeColumnTypes':
+            recode_dict = {col: dtype for col, dtype in params['recode_dict'].items() if col not in dead}
+            if not recode_dict:
+                continue
+            params = {'recode_dict': recode_dict}
+            reads, writes = step_columns(method, params)
+        elif writes and writes <= dead and method != 'DropRows':
+            continue
+
+        dead -= reads
+        optimized.append((method, params))
+    return list(reversed(optimized))
+
+
+def fuse_steps(plan):
+    '''
+    FUNCTION to merge consecutive steps of the same kind that can be executed as one step: DropColumns, DropRows, and RecodeColumnTypes steps that do not recode the same column into different dtypes.
+    Parameters:
+    - plan: List of (method, params) tuples
+    '''
+    optimized = []
+    for method, params in plan:
+        if optimized and optimized[-1][0] == method:
+            previous = optimized[-1][1]
+            if method in ['DropColumns', 'DropRows']:
+                column_list = previous['column_list'] + [col for col in params['column_list'] if col not in previous['column_list']]
+                optimized[-1] = (method, {'column_list': column_list})
+                continue
+            elif method == 'RecodeColumnTypes':
+                conflicts = [col for col, dtype in params['recode_dict'].items() if previous['recode_dict'].get(col, dtype) != dtype]
+                if not conflicts:
+                    optimized[-1] = (method, {'recode_dict': {**previous['recode_dict'], **params['recode_dict']}})
+                    continue
+        optimized.append((method, params))
+    return optimized
+
+
+def implied_recode(method, params):
+    '''
+    FUNCTION to get the dtype recode that a Pipeline step performs (and records as a separate step) before it transforms its column(s), or None.
+    Parameters:
+    - method: Name of the Pipeline step
+    - params: Dictionary of keyword arguments passed to the step
+    '''
+    if method in ['ReplaceByValue', 'ReplaceByStd', 'ImputeWithKNN']:
+        return {params['column']: 'float'}
+    elif method == 'RecodeColumnValues':
+        return {params['column']: 'categorical'}
+    elif method == 'SumColumnValues':
+        return {col: 'float' for col in params['column_list']}
+    return None
+
+
+def compile_step(name, stored):
+    '''
+    FUNCTION to convert a step of the artifacts into the keyword arguments of its Pipeline method, and validate them against the step registry.
+    Parameters:
+    - name: Name of the step in the artifacts (e.g. 'RecodeColumnNames')
+    - stored: Parameters of the step as stored in the artifacts
+    Returns a tuple (method, params, errors), where errors is a list of the problems found.
+    '''
+    if name not in step_registry:
+        return None, None, [f"unknown step '{name}'"]
+    method, storage, schema = step_registry[name]
+
+    if storage == 'value':
+        params = {list(schema.keys())[0]: stored}
+    elif storage == 'tuple':
+        if not isinstance(stored, list | tuple) or len(stored) != len(schema):
+            return method, None, [f"{name} requires a list of {len(schema)} values {list(schema.keys())}"]
+        params = dict(zip(schema.keys(), stored))
+    else:
+        if not isinstance(stored, dict):
+            return method, None, [f"{name} requires a dictionary of parameters"]
+        params = dict(stored)
+
+    errors = [f"unknown parameter '{param}' of {name}" for param in params if param not in schema]
+    for param, (types, required, choices) in schema.items():
+        if param not in params:
+            if required:
+                errors.append(f"missing parameter '{param}' of {name}")
+            continue
+        value = params[param]
+        if not isinstance(value, types):
+            errors.append(f"parameter '{param}' of {name} should be of type {types}, not {type(value).__name__}")
+        elif choices is not None and value not in choices:
+            errors.append(f"parameter '{param}' of {name} should be one of {choices}, not {value!r}")
+    if method == 'RecodeColumnTypes' and isinstance(params.get('recode_dict'), dict):
+        errors += [f"dtype '{dtype}' of column '{col}' should be one of {valid_dtypes}" for col, dtype in params['recode_dict'].items() if dtype not in valid_dtypes]
+    return method, params, errors
+
+
+def compile_artifacts(artifacts):
+    '''
+    FUNCTION to compile the artifacts of a Pipeline (e.g. loaded from an exported JSON file) into an executable plan. All the steps are validated against the step registry up front, and the dtype recodes that a step records before its own step are removed, since the step performs them again when it is replayed.
+    Parameters:
+    - artifacts: Dictionary {step number: {step name: parameters}}, with steps numbered 1, 2, ... N
+    Returns a list of (method, params) tuples that can be executed with Pipeline.runPlan().
+    '''
+    assert isinstance(artifacts, dict), "Require artifacts to be a dictionary."
+
+    errors = []
+    try:
+        steps = sorted(artifacts.items(), key = lambda item: int(item[0]))
+    except ValueError:
+        raise Exception("Invalid artifacts: steps should be numbered 1, 2, ... N")
+    if [int(n) for n, _ in steps] != list(range(1, len(steps) + 1)):
+        errors.append("steps should be numbered 1, 2, ... N")
+
+    plan = []
+    for n, step in steps:
+        if not isinstance(step, dict) or len(step) != 1:
+            errors.append(f"step {n} should contain exactly one step")
+            continue
+        name, stored = list(step.items())[0]
+        method, params, step_errors = compile_step(name, stored)
+        errors += [f"step {n}: {error}" for error in step_errors]
+        if not step_errors:
+            plan.append((method, params))
+
+    if errors:
+        raise Exception("Invalid artifacts:\n- " + "\n- ".join(errors))
+
+    compiled = []
+    for i, (method, params) in enumerate(plan):
+        if method == 'RecodeColumnTypes' and i + 1 < len(plan) and implied_recode(*plan[i + 1]) == params['recode_dict']:
+            continue
+        compiled.append((method, params))
+    return compiled
+
+
+def optimize_plan(plan):
+    '''
+    FUNCTION to optimize the logical plan of a lazy Pipeline before it is executed. Column drops are pushed ahead of other steps, work on columns that are dropped later is skipped, and consecutive drops and recodes are fused.
+    Parameters:
+    - plan: List of (method, params) tuples in the order in which the steps were added
+    '''
+    assert isinstance(plan, list)
+
+    try:
+        plan = push_down_drops(plan)
+        plan = eliminate_dead_steps(plan)
+        plan = fuse_steps(plan)
+        return plan
+
+    except Exception as e:
+        print("Failed to optimize plan. The plan will be executed as recorded.")
+        current_dateTime = str(datetime.now())[0:19]
+        print(current_dateTime + ': ' + str(e))
+        return plan
@@ -0,0 +1,210 @@
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import numpy as np
+import pandas as pd
+
+from schema import dtype_group
+
+APPROX_UNIQUE_MIN_N = 1000000 # columns with more non-missing values get approximate unique counts
+HLL_PRECISION = 14 # 2**14 registers, i.e. a standard error of about 0.8%
+EXAMPLE_VALUES = 3
+EXAMPLE_SAMPLE_SIZE = 10000 # rows searched for example values of large columns
+MAX_CACHED_FRAMES = 4
+
+
+def hash_column(series):
+    '''
+    FUNCTION to compute the 64-bit hash of every value of a column.
+    '''
+    return pd.util.hash_pandas_object(series, index = False).to_numpy()
+
+
+def approx_unique(hashes, precision = HLL_PRECISION):
+    '''
+    FUNCTION to estimate the number of unique values of a column with HyperLogLog, from the 64-bit hashes of its values. The registers are updated with vectorized numpy operations.
+    Parameters:
+    - hashes: Array of the hashes of the non-missing values of a column (see hash_column)
+    - precision: Number of bits of the hash that select a register (2**precision registers)
+    '''
+    m = 2**precision
+    if len(hashes) == 0:
+        return 0
+    registers = np.zeros(m, dtype = np.uint8)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+    # rank = position of the first 1-bit of the remaining bits
+    rank = np.where(rest == 0, 64 - precision + 1, 64 - np.floor(np.log2(rest.astype('float64'))).astype(np.int64))
+    np.maximum.at(registers, index, rank.astype(np.uint8))
+
+    alpha = 0.7213/(1 + 1.079/m)
+    estimate = alpha*m*m/np.sum(2.0**-registers.astype('float64'))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5*m and zeros > 0:
+        estimate = m*np.log(m/zeros) # linear counting for small cardinalities
+    return int(round(estimate))
+
+
+def column_fingerprint(series, hashes = None):
+    '''
+    FUNCTION to compute a content hash of a single column, including its name and dtype.
+    Parameters:
+    - series: Column of a dataframe
+    - hashes: (Optional) hashes of the values of the column, if computed already
+    '''
+    h = hashlib.sha1()
+    h.update(str((series.name, str(series.dtype), len(series))).encode())
+    if len(series) > 0:
+        h.update((hash_column(series) if hashes is None else hashes).tobytes())
+    return h.hexdigest()
+
+
+def profile_column(series, approx_min_n = APPROX_UNIQUE_MIN_N, hashes = None):
+    '''
+    FUNCTION to profile a column with vectorized reductions: dtype, % missing, unique count and example values for strings, and the range of values for numbers and dates.
+    Parameters:
+    - series: Column of a dataframe
+    - approx_min_n: Minimum number of non-missing values for the unique count to be estimated with HyperLogLog
+    - hashes: (Optional) hashes of the values of the column, if computed already
+    Returns a dictionary of statistics.
+    '''
+    group = dtype_group(series.dtype)
+    n = int(series.count())
+    profile = {'dtype': series.dtype, 'group': group, 'missing': (1 - n/len(series))*100 if len(series) > 0 else 0.0,
+               'unique': None, 'approximate': False, 'examples': [], 'min': None, 'max': None}
+
+    if group == "string":
+        if n >= approx_min_n:
+            hashes = hash_column(series) if hashes is None else hashes
+            profile['unique'] = approx_unique(hashes[series.notna().to_numpy()])
+            profile['approximate'] = True
+            examples = pd.unique(series.iloc[:EXAMPLE_SAMPLE_SIZE].dropna())
+        else:
+            examples = pd.unique(series.dropna())
+            profile['unique'] = len(examples)
+        profile['examples'] = [str(value) for value in examples[:EXAMPLE_VALUES]]
+    elif group != "boolean" and n > 0:
+        profile['min'], profile['max'] = series.min(), series.max()
+    return profile
+
+
+def summarize_column(series):
+    '''
+    FUNCTION to summarize the distribution of a column: dtype, number of rows, % missing, unique count, and the mean, standard deviation and range of numbers and dates.
+    Parameters:
+    - series: Column of a dataframe
+    Returns a dictionary of statistics.
+    '''
+    group = dtype_group(series.dtype)
+    n = int(series.count())
+    summary = {'dtype': str(series.dtype), 'rows': len(series), 'missing': (1 - n/len(series))*100 if len(series) > 0 else 0.0,
+               'unique': int(series.nunique()), 'mean': None, 'std': None, 'min': None, 'max': None}
+    if group in ["Int64", "Float64", "datetime64[ns]"] and n > 0:
+        summary['mean'], summary['std'] = series.mean(), series.std()
+        summary['min'], summary['max'] = series.min(), series.max()
+    return summary
+
+
+def same_value(a, b):
+    # missing statistics (e.g. the mean of a column without values) are equal to each other
+    if pd.isna(a) or pd.isna(b):
+        return pd.isna(a) and pd.isna(b)
+    return bool(a == b)
+
+
+def distribution_delta(before, after):
+    '''
+    FUNCTION to compare the summaries of columns before and after a transformation (see summarize_column).
+    Parameters:
+    - before: Dictionary {column: summary} before the transformation; columns created by the transformation are absent
+    - after: Dictionary {column: summary} after the transformation; columns dropped by the transformation are absent
+    Returns a dataframe with one row per column and statistic, and the values before and after, for the statistics that changed.
+    '''
+    rows = []
+    for col in list(before) + [col for col in after if col not in before]:
+        for statistic in ['dtype', 'rows', 'missing', 'unique', 'mean', 'std', 'min', 'max']:
+            old = before[col][statistic] if col in before else None
+            new = after[col][statistic] if col in after else None
+            if col not in before or col not in after or not same_value(old, new):
+                rows.append({'column': col, 'statistic': statistic, 'before': old, 'after': new})
+    return pd.DataFrame(rows, columns = ['column', 'statistic', 'before', 'after'])
+
+
+class ProfileCache:
+    '''
+    The ProfileCache object profiles the columns of dataframes (see profile_column) and remembers the profile of each column by its content hash, so columns that did not change, e.g. after a Pipeline step that touched other columns, are not profiled again. The profile of a whole frame is also remembered for the frame object, so reruns on the same frame skip hashing too.
+    Columns are profiled in parallel. At most max_columns column profiles are kept, in least-recently-used order. The cache can be shared by threads (e.g. the sessions of the app): look-ups and updates hold a lock, and columns are profiled outside of it.
+    '''
+    def __init__(self, max_columns = 512, approx_min_n = APPROX_UNIQUE_MIN_N, max_workers = None):
+        assert isinstance(max_columns, int) and max_columns > 0
+
+        self.max_columns = max_columns
+        self.approx_min_n = approx_min_n
+        self.max_workers = max_workers
+        self.columns = OrderedDict() # column fingerprint -> profile
+        self._frames = OrderedDict() # id(df) -> (df, {column: profile}) of recently profiled frames
+        self._lock = threading.Lock() # guards columns and _frames
+
+
+    def __str__(self):
+        return f"ProfileCache: {len(self.columns)} column profiles, {len(self._frames)} frames"
+
+
+    def _profile_column(self, series):
+        hashes = hash_column(series) # shared by the fingerprint and the unique count
+        key = column_fingerprint(series, hashes)
+        with self._lock:
+            if key in self.columns:
+                self.columns.move_to_end(key)
+                return self.columns[key]
+        profile = profile_column(series, self.approx_min_n, hashes)
+        with self._lock:
+            self.columns[key] = profile
+            while len(self.columns) > self.max_columns:
+                self.columns.popitem(last = False)
+        return profile
+
+
+    def profile(self, df, base = None, changed = None):
+        '''
+        Returns a dictionary {column: profile} for all columns of a dataframe.
+        Parameters:
+        - df: Dataframe
+        - base: (Optional) dataframe that df was derived from, e.g. the data before a Pipeline step
+        - changed: (Optional) list of the columns that may differ between base and df; the profiles of the other columns of base are reused without hashing them. base may be df itself, if its columns were changed in place
+        '''
+        assert isinstance(df, pd.DataFrame)
+
+        reused = dict()
+        with self._lock:
+            if id(df) in self._frames and self._frames[id(df)][0] is df and not changed: # unless columns of the frame were changed in place
+                self._frames.move_to_end(id(df))
+                return self._frames[id(df)][1]
+
+            if base is not None and changed is not None and id(base) in self._frames and self._frames[id(base)][0] is base and len(base) == len(df):
+                profiles = self._frames[id(base)][1]
+                reused = {col: profiles[col] for col in df.columns if col in profiles and col not in changed}
+
+        columns = [col for col in df.columns if col not in reused]
+        try:
+            with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+                computed = dict(zip(columns, executor.map(lambda col: self._profile_column(df[col]), columns)))
+
+        except Exception as e:
+            print("Failed to profile columns in parallel.")
+            current_dateTime = str(datetime.now())[0:19]
+            print(current_dateTime + ': ' + str(e))
+            computed = {col: profile_column(df[col], self.approx_min_n) for col in columns}
+
+        profiles = {col: reused[col] if col in reused else computed[col] for col in df.columns}
+        with self._lock:
+            self._frames[id(df)] = (df, profiles)
+            self._frames.move_to_end(id(df))
+            while len(self._frames) > MAX_CACHED_FRAMES:
+                self._frames.popitem(last = False)
+        return profiles
+
+
+profile_cache = ProfileCache() # shared by the pages of the app
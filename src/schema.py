@@ -0,0 +1,381 @@
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_integer_dtype, is_float_dtype, is_object_dtype, is_string_dtype
+
+SAMPLE_SIZE = 1000 # values sampled per column before confirming on the full column
+CATEGORY_MAX_RATIO = 0.5 # string columns with at most this ratio of unique to non-missing values are compacted to categories
+FINGERPRINT_ROWS = 10000 # rows hashed to fingerprint a frame
+MAX_CACHED_SCHEMAS = 16
+
+schema_cache = OrderedDict() # fingerprint -> {column: dtype} of object columns
+schema_cache_lock = threading.Lock() # schema_cache is shared by the threads that read files and by the sessions of the app
+
+
+def sample_fingerprint(df):
+    '''
+    FUNCTION to compute a cheap fingerprint of a dataframe from its shape, columns, dtypes, and an evenly spaced sample of at most FINGERPRINT_ROWS rows. Frames that differ only outside the sample get the same fingerprint, so dtypes cached by fingerprint must be confirmed on the full columns (see confirm_object_dtype).
+    Parameters:
+    - df: Dataframe to be fingerprinted
+    '''
+    h = hashlib.sha1()
+    h.update(str((df.shape, list(df.columns), list(df.dtypes.astype(str)))).encode())
+    if df.shape[0] > 0 and df.shape[1] > 0:
+        step = max(df.shape[0] // FINGERPRINT_ROWS, 1)
+        h.update(pd.util.hash_pandas_object(df.iloc[::step], index = False).values.tobytes())
+    return h.hexdigest()
+
+
+def integer_dtype(values):
+    # integers in {0, 1} are treated as boolean
+    if len(values) > 0 and values.min() >= 0 and values.max() <= 1:
+        return 'boolean'
+    return 'Int64'
+
+
+def infer_numeric_dtype(series):
+    '''
+    FUNCTION to infer the best nullable dtype of a numeric or boolean column with vectorized reductions. Columns that already have a nullable dtype keep their width (e.g. after compaction) unless they are boolean-like or integral.
+    Parameters:
+    - series: Column of a dataframe
+    '''
+    if is_bool_dtype(series.dtype):
+        return 'boolean'
+    values = series.to_numpy(dtype = 'float64', na_value = np.nan)
+    values = values[~np.isnan(values)]
+    nullable = isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+    if is_integer_dtype(series.dtype):
+        dtype = integer_dtype(values)
+        return None if nullable and dtype == 'Int64' else dtype
+    if np.isfinite(values).all() and np.array_equal(values, np.trunc(values)) and (len(values) == 0 or np.abs(values).max() < 2**63):
+        return integer_dtype(values)
+    return None if nullable else 'Float64'
+
+
+def infer_object_dtype(series, sample_size = SAMPLE_SIZE):
+    '''
+    FUNCTION to infer the best dtype of an object column. The dtype is inferred on a sample of the non-missing values first, and only confirmed on the full column if the sample is homogeneous.
+    Parameters:
+    - series: Column of a dataframe
+    - sample_size: Number of values to sample
+    Returns the dtype, 'convert' if the column should be converted with convert_dtypes, or None to keep the column as it is.
+    '''
+    step = max(len(series) // sample_size, 1)
+    inferred = infer_dtype(series.iloc[::step], skipna = True)
+    if inferred == 'empty': # sparse column with no values in the sample
+        inferred = infer_dtype(series, skipna = True)
+    if inferred in ['string', 'boolean']:
+        if infer_dtype(series, skipna = True) == inferred:
+            return inferred
+    elif inferred in ['integer', 'floating', 'mixed-integer-float', 'decimal']:
+        return 'convert'
+    return None
+
+
+def confirm_object_dtype(series, dtype, sample_size = SAMPLE_SIZE):
+    '''
+    FUNCTION to confirm the cached dtype of an object column on all of its values, as the column may differ from the cached one outside the sampled rows of the fingerprint. String and boolean dtypes are kept if every value has them, and other dtypes are inferred again (see infer_column_dtype), so the result is always that of a fresh inference.
+    Parameters:
+    - series: Column of a dataframe
+    - dtype: Cached dtype of a column with the same fingerprint
+    - sample_size: Number of values to sample
+    '''
+    if dtype in ['string', 'boolean'] and infer_dtype(series, skipna = True) == dtype:
+        return dtype
+    return infer_column_dtype(series, sample_size)
+
+
+def infer_column_dtype(series, sample_size = SAMPLE_SIZE):
+    '''
+    FUNCTION to infer the best dtype of a column, equivalent to convert_dtypes() followed by recoding Int64 columns with values in {0, 1} to boolean. Columns with no values at all are marked as 'empty'.
+    Parameters:
+    - series: Column of a dataframe
+    - sample_size: Number of values to sample from object columns
+    '''
+    step = max(len(series) // sample_size, 1)
+    if series.iloc[::step].isna().all() and series.isna().all():
+        return 'empty'
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    elif is_string_dtype(series.dtype) and not is_object_dtype(series.dtype):
+        return None # already a string dtype (python or pyarrow storage)
+    elif is_bool_dtype(series.dtype) or is_integer_dtype(series.dtype) or is_float_dtype(series.dtype):
+        return infer_numeric_dtype(series)
+    elif is_object_dtype(series.dtype):
+        return infer_object_dtype(series, sample_size)
+    return None
+
+
+def infer_schema(df, sample_size = SAMPLE_SIZE, max_workers = None):
+    '''
+    FUNCTION to infer the best dtype of every column of a dataframe. Columns are inferred in parallel, and the dtypes of object columns (the expensive ones to infer) are cached by the fingerprint of the data and confirmed on the full columns when they are reused.
+    Parameters:
+    - df: Dataframe
+    - sample_size: Number of values to sample from object columns
+    - max_workers: Maximum number of threads used to infer the columns
+    Returns a dictionary {column: dtype}, where dtype is None for columns that are kept as they are.
+    '''
+    assert isinstance(df, pd.DataFrame)
+
+    key = sample_fingerprint(df)
+    with schema_cache_lock:
+        cached = schema_cache.get(key, dict())
+    columns = list(df.columns)
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        dtypes = list(executor.map(lambda col: confirm_object_dtype(df[col], cached[col], sample_size) if col in cached else infer_column_dtype(df[col], sample_size), columns))
+    schema = dict(zip(columns, dtypes))
+
+    with schema_cache_lock:
+        schema_cache[key] = {col: dtype for col, dtype in schema.items() if is_object_dtype(df[col].dtype)}
+        schema_cache.move_to_end(key)
+        while len(schema_cache) > MAX_CACHED_SCHEMAS:
+            schema_cache.popitem(last = False)
+    return schema
+
+
+def merge_schemas(schemas):
+    '''
+    FUNCTION to merge the schemas inferred on different chunks of the same data into one schema that fits all the chunks. A column is only 'empty' if it is empty in every chunk, and numeric columns get the widest dtype found (boolean < Int64 < Float64). Columns with conflicting dtypes are kept as they are.
+    Parameters:
+    - schemas: List of dictionaries {column: dtype} returned by infer_schema
+    '''
+    assert isinstance(schemas, list) and len(schemas) > 0
+
+    merged = dict()
+    for col in schemas[0]:
+        dtypes = set(schema.get(col, 'empty') for schema in schemas) - {'empty'}
+        if not dtypes:
+            merged[col] = 'empty'
+        elif len(dtypes) == 1:
+            merged[col] = dtypes.pop()
+        elif dtypes <= {'boolean', 'Int64'}:
+            merged[col] = 'Int64'
+        elif dtypes <= {'boolean', 'Int64', 'Float64', 'convert'}:
+            merged[col] = 'Float64'
+        else:
+            merged[col] = None
+    return merged
+
+
+def to_masked_array(series, dtype):
+    '''
+    FUNCTION to convert a numpy-backed numeric column to a nullable dtype ('Int64', 'Float64' or 'boolean') by building the masked array directly, without the element-wise validation of astype.
+    Parameters:
+    - series: Numeric column with a numpy dtype
+    - dtype: Target nullable dtype
+    '''
+    values = series.to_numpy()
+    mask = np.isnan(values) if is_float_dtype(values.dtype) else np.zeros(len(values), dtype = bool)
+    if dtype == 'Float64':
+        return pd.arrays.FloatingArray(np.where(mask, 0, values).astype('float64'), mask)
+    elif dtype == 'Int64':
+        return pd.arrays.IntegerArray(np.where(mask, 0, values).astype('int64'), mask)
+    return pd.arrays.BooleanArray(np.where(mask, 0, values).astype(bool), mask)
+
+
+def apply_schema(df, schema):
+    '''
+    FUNCTION to recode the columns of a dataframe to the dtypes of an inferred schema. Columns marked as 'empty' are dropped.
+    Parameters:
+    - df: Dataframe (columns are replaced in place)
+    - schema: Dictionary {column: dtype} returned by infer_schema
+    '''
+    empty = [col for col, dtype in schema.items() if dtype == 'empty']
+    if empty:
+        df = df.drop(columns = empty)
+    for col, dtype in schema.items():
+        if dtype == 'empty':
+            continue
+        try:
+            if dtype == 'convert':
+                df[col] = df[col].convert_dtypes()
+            elif dtype is not None and df[col].dtype != dtype:
+                if isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in 'biuf' and dtype in ['Int64', 'Float64', 'boolean']:
+                    df[col] = pd.Series(to_masked_array(df[col], dtype), index = df.index, name = col)
+                else:
+                    df[col] = df[col].astype(dtype)
+
+        except Exception as e:
+            print(f"Failed to apply inferred dtype {dtype} to column '{col}'.")
+            current_dateTime = str(datetime.now())[0:19]
+            print(current_dateTime + ': ' + str(e))
+            df[col] = df[col].convert_dtypes()
+    return df
+
+
+def compact_column_dtype(series, category_max_ratio = CATEGORY_MAX_RATIO):
+    '''
+    FUNCTION to find the most memory-compact dtype that represents a column without loss. Low-cardinality strings become categories, other strings are stored in Arrow, integers are downcast to the smallest width that holds their range, and floats are downcast to Float32 if no value changes.
+    Parameters:
+    - series: Column of a dataframe (with the dtypes set by apply_schema)
+    - category_max_ratio: Maximum ratio of unique to non-missing values for a string column to become a category
+    Returns the dtype, or None to keep the column as it is.
+    '''
+    if is_string_dtype(series.dtype) and not is_object_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+        n = series.count()
+        if n > 0 and series.nunique() <= category_max_ratio * n:
+            return 'category'
+        return 'string[pyarrow]'
+    elif is_integer_dtype(series.dtype):
+        low, high = series.min(), series.max()
+        if pd.isna(low):
+            return None
+        for dtype in ['Int8', 'Int16', 'Int32']:
+            info = np.iinfo(dtype.lower())
+            if info.min <= low and high <= info.max:
+                return dtype
+    elif is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype = 'float64', na_value = np.nan)
+        if np.array_equal(values.astype('float32').astype('float64'), values, equal_nan = True):
+            return 'Float32'
+    return None
+
+
+def widen_column(series):
+    '''
+    FUNCTION to revert a column in a memory-compact dtype (see compact_column_dtype) to the dtype set by apply_schema, so that values outside its categories or range can be written to it. Categories become the dtype of their values (i.e. strings), and narrow integers and floats become Int64 and Float64. Arrow strings accept any string, so they are kept.
+    Parameters:
+    - series: Column of a dataframe
+    Returns the widened column, or None if its dtype is not compact.
+    '''
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.dtype.categories.dtype)
+    elif is_integer_dtype(series.dtype) and not is_bool_dtype(series.dtype) and series.dtype.itemsize < 8:
+        return series.astype('Int64')
+    elif is_float_dtype(series.dtype) and series.dtype.itemsize < 8:
+        return series.astype('Float64')
+    return None
+
+
+def compact_schema(df, category_max_ratio = CATEGORY_MAX_RATIO, max_workers = None):
+    '''
+    FUNCTION to find the most memory-compact dtype of every column of a dataframe, in parallel.
+    Parameters:
+    - df: Dataframe
+    - category_max_ratio: Maximum ratio of unique to non-missing values for a string column to become a category
+    - max_workers: Maximum number of threads used to inspect the columns
+    Returns a dictionary {column: dtype} to be applied with apply_schema.
+    '''
+    assert isinstance(df, pd.DataFrame)
+
+    columns = list(df.columns)
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        dtypes = list(executor.map(lambda col: compact_column_dtype(df[col], category_max_ratio), columns))
+    return dict(zip(columns, dtypes))
+
+
+def dtype_group(dtype):
+    '''
+    FUNCTION to map a dtype to the name of its group as used by the app: 'string', 'boolean', 'Int64', 'Float64', 'datetime64[ns]', or the name of the dtype itself for anything else. Compact dtypes (categories, Arrow strings, narrow integers and floats) map to the group of the dtype they were compacted from.
+    Parameters:
+    - dtype: dtype of a column
+    '''
+    if isinstance(dtype, pd.CategoricalDtype) or (is_string_dtype(dtype) and not is_object_dtype(dtype)):
+        return 'string'
+    elif is_bool_dtype(dtype):
+        return 'boolean'
+    elif is_integer_dtype(dtype):
+        return 'Int64'
+    elif is_float_dtype(dtype):
+        return 'Float64'
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime64[ns]'
+    return str(dtype)
+
+
+def display_dtypes(df):
+    '''
+    FUNCTION to get the dtype group (see dtype_group) of every column of a dataframe.
+    '''
+    return {col: dtype_group(dtype) for col, dtype in df.dtypes.items()}
+
+
+def recode_char(series):
+    # first character of the text of each value
+    if not (is_string_dtype(series.dtype) and not is_object_dtype(series.dtype)):
+        series = series.astype('string')
+    return series.str.slice(0, 1)
+
+
+def recode_string(series):
+    if is_string_dtype(series.dtype) and not is_object_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    return series.astype('string')
+
+
+def recode_int(series):
+    # integers if no value has a fractional part (as pd.to_numeric(downcast = 'integer')), floats otherwise
+    if is_integer_dtype(series.dtype):
+        return None
+    if is_bool_dtype(series.dtype):
+        return series.astype('Int64')
+    numeric = pd.to_numeric(series, errors = 'coerce')
+    values = numeric.to_numpy(dtype = 'float64', na_value = np.nan)
+    known = values[~np.isnan(values)]
+    if np.isfinite(known).all() and np.array_equal(known, np.trunc(known)) and (len(known) == 0 or np.abs(known).max() < 2**63):
+        return numeric.astype('Int64')
+    return numeric.astype('Float64')
+
+
+def recode_float(series):
+    if is_float_dtype(series.dtype):
+        return None
+    return pd.to_numeric(series, errors = 'coerce').astype('Float64')
+
+
+def recode_boolean(series):
+    # boolean columns keep their values, with missing values as False; any other column is True where it has a value
+    if is_bool_dtype(series.dtype):
+        return series.fillna(False).astype('boolean') if series.hasnans else None
+    return series.notna().astype('boolean')
+
+
+def recode_categorical(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    return series.astype('category')
+
+
+def recode_datetime(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return None
+    assert not (is_bool_dtype(series.dtype) or is_integer_dtype(series.dtype) or is_float_dtype(series.dtype)), f"Cannot recode the numeric column '{series.name}' to datetime."
+    return pd.to_datetime(series, errors = 'coerce')
+
+
+recode_kernels = {'char': recode_char,
+                  'string': recode_string,
+                  'int': recode_int,
+                  'float': recode_float,
+                  'boolean': recode_boolean,
+                  'categorical': recode_categorical,
+                  'datetime': recode_datetime
+}
+
+
+def recode_columns(df, recode_dict, max_workers = None):
+    '''
+    FUNCTION to recode the dtypes of columns of a dataframe (see Pipeline.RecodeColumnTypes) with a vectorized kernel per target dtype. The results stay in nullable dtypes, missing values stay missing (except for 'boolean', see recode_boolean), values that cannot be converted become missing, and columns that already have the target dtype are left as they are, i.e. they still share their values with the input (Pipeline copies the columns a step writes before the step, see Pipeline._copy_on_write). Several columns are converted in parallel.
+    Parameters:
+    - df: Dataframe (columns are replaced in place)
+    - recode_dict: Dictionary {column: target dtype}, with dtypes in recode_kernels
+    - max_workers: Maximum number of threads used to convert the columns
+    Returns the dataframe. No column is replaced if any conversion fails.
+    '''
+    assert set(recode_dict.values()) <= set(recode_kernels.keys()), f"Require dtypes to be one of {list(recode_kernels.keys())}."
+
+    columns = list(recode_dict.keys())
+    if len(columns) > 1:
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            converted = list(executor.map(lambda col: recode_kernels[recode_dict[col]](df[col]), columns))
+    else:
+        converted = [recode_kernels[recode_dict[col]](df[col]) for col in columns]
+
+    for col, series in zip(columns, converted):
+        if series is not None:
+            df[col] = series
+    return df
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+
+class RowSelection:
+    '''
+    The RowSelection object represents a subset of the rows of a master dataframe (e.g. the result of filtering) by their positions, instead of holding a copy of the selected rows. The subset is only materialized as a dataframe when a page needs it, and the materialized frame is kept for later reruns.
+    '''
+    def __init__(self, master_df, rows = None):
+        assert isinstance(master_df, pd.DataFrame)
+        if rows is not None:
+            rows = np.asarray(rows, dtype = np.int64)
+            assert rows.ndim == 1, "Require row positions to be a 1D array."
+
+        self.master = master_df
+        self.rows = rows # positions of the selected rows, None for all rows
+        self._data = None
+
+
+    def __len__(self):
+        return len(self.master) if self.rows is None else len(self.rows)
+
+
+    def __str__(self):
+        return f"RowSelection: {len(self)} of {len(self.master)} rows"
+
+
+    @property
+    def shape(self):
+        return (len(self), self.master.shape[1])
+
+
+    @property
+    def empty(self):
+        return len(self) == 0 or self.master.shape[1] == 0
+
+
+    def column(self, column):
+        '''
+        Returns the selected rows of a single column, without materializing the other columns.
+        '''
+        if self.rows is None:
+            return self.master[column]
+        return self.master[column].iloc[self.rows]
+
+
+    def sample(self, n, random_state = 1):
+        '''
+        Returns a dataframe of at most n randomly sampled rows of the selection, without materializing the whole selection.
+        '''
+        if len(self) <= n:
+            return self.materialize()
+        positions = np.random.default_rng(random_state).choice(len(self), size = n, replace = False)
+        positions.sort()
+        rows = positions if self.rows is None else self.rows[positions]
+        return self.master.iloc[rows]
+
+
+    def materialize(self):
+        '''
+        Returns the selected rows as a dataframe with one index = one row. The dataframe is created on the first call only.
+        '''
+        if self._data is None:
+            if self.rows is None:
+                self._data = self.master
+            else:
+                self._data = self.master.iloc[self.rows]
+                self._data.index = pd.RangeIndex(len(self._data))
+        return self._data
+
+
+def sortable_values(series):
+    '''
+    FUNCTION to get the values of a numeric or date column as a numpy array that can be sorted and searched, and a mask of its missing values.
+    Parameters:
+    - series: Column of a dataframe
+    '''
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.to_numpy(dtype = 'datetime64[ns]')
+    elif pd.api.types.is_integer_dtype(series.dtype):
+        values = series.to_numpy(dtype = 'int64', na_value = 0)
+    else:
+        values = series.to_numpy(dtype = 'float64', na_value = np.nan)
+    return values, missing
+
+
+class FilterIndex:
+    '''
+    The FilterIndex object indexes the columns of a master dataframe for interactive filtering, so filters are resolved without scanning whole columns on every rerun. Each column is indexed once, the first time it is filtered:
+    - numeric and date columns are sorted (argsort), and ranges of values are found by binary search,
+    - string and boolean columns are factorized into categories (missing values are a category too), and the rows of each category are kept as a packed bitmap, built when the category is first selected.
+    Filters take and return the positions of the rows kept by the previous filters (None for all rows), as used by RowSelection.
+    '''
+    def __init__(self, master_df):
+        assert isinstance(master_df, pd.DataFrame)
+
+        self.master = master_df
+        self.ranges = dict() # column -> (values, missing, order of the non-missing values, sorted values)
+        self.categories = dict() # column -> (codes, categories, {code: bitmap})
+
+
+    def __str__(self):
+        return f"FilterIndex: {len(self.ranges)} range and {len(self.categories)} category indexes over {len(self.master)} rows"
+
+
+    def _range_index(self, column):
+        if column not in self.ranges:
+            values, missing = sortable_values(self.master[column])
+            order = np.flatnonzero(~missing)
+            order = order[np.argsort(values[order], kind = 'stable')]
+            self.ranges[column] = (values, missing, order, values[order])
+        return self.ranges[column]
+
+
+    def _category_index(self, column):
+        if column not in self.categories:
+            codes, categories = pd.factorize(self.master[column], use_na_sentinel = False)
+            self.categories[column] = (codes, pd.Index(categories), dict())
+        return self.categories[column]
+
+
+    def _bitmap(self, column, code):
+        codes, _, bitmaps = self._category_index(column)
+        if code not in bitmaps:
+            bitmaps[code] = np.packbits(codes == code)
+        return bitmaps[code]
+
+
+    def _select(self, mask, rows):
+        # intersect a boolean mask over all rows with the rows kept by the previous filters
+        return np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+
+
+    def value_range(self, column, rows = None):
+        '''
+        Returns the minimum and maximum values of a numeric or date column over the selected rows, or (None, None) if they have no values.
+        '''
+        values, missing, order, sorted_values = self._range_index(column)
+        if rows is None:
+            return (sorted_values[0], sorted_values[-1]) if len(sorted_values) > 0 else (None, None)
+        selected = values[rows[~missing[rows]]]
+        return (selected.min(), selected.max()) if len(selected) > 0 else (None, None)
+
+
+    def category_values(self, column, rows = None):
+        '''
+        Returns the categories of a string or boolean column found in the selected rows, in order of appearance (including missing values).
+        '''
+        codes, categories, _ = self._category_index(column)
+        if rows is None:
+            return list(categories)
+        present = np.bincount(codes[rows], minlength = len(categories)) > 0
+        return list(categories[present])
+
+
+    def filter_range(self, column, low, high, rows = None, include_na = False):
+        '''
+        Returns the selected rows whose values are between low and high (inclusive), and optionally those with missing values.
+        '''
+        values, missing, order, sorted_values = self._range_index(column)
+        low, high = np.asarray(low, dtype = sorted_values.dtype), np.asarray(high, dtype = sorted_values.dtype)
+        start, stop = np.searchsorted(sorted_values, low, side = 'left'), np.searchsorted(sorted_values, high, side = 'right')
+        mask = missing.copy() if include_na else np.zeros(len(values), dtype = bool)
+        mask[order[start:stop]] = True
+        return self._select(mask, rows)
+
+
+    def filter_categories(self, column, selected, rows = None):
+        '''
+        Returns the selected rows whose values are one of the selected categories, as the union of the bitmaps of the categories.
+        '''
+        codes, categories, _ = self._category_index(column)
+        selected_codes = [code for code in np.unique(categories.get_indexer(pd.Index(list(selected), dtype = object))) if code >= 0]
+        if not selected_codes:
+            return np.array([], dtype = np.int64)
+        bitmap = np.bitwise_or.reduce([self._bitmap(column, code) for code in selected_codes])
+        mask = np.unpackbits(bitmap, count = len(codes)).astype(bool)
+        return self._select(mask, rows)
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+
+def group_keys(df, group_by):
+    '''
+    FUNCTION to get the group keys of every row of a dataframe as an index of python objects, so that the keys of chunks with different dtypes (e.g. categories) can be compared.
+    Parameters:
+    - df: Dataframe
+    - group_by: List of column(s) to group by
+    '''
+    if len(group_by) == 1:
+        return pd.Index(df[group_by[0]].astype(object), name = group_by[0])
+    return pd.MultiIndex.from_frame(df[group_by].astype(object))
+
+
+def map_group_stats(df, group_by, stats):
+    '''
+    FUNCTION to map statistics per group to the rows of a dataframe, like a groupby transform.
+    Parameters:
+    - df: Dataframe
+    - group_by: List of column(s) the statistics were grouped by, or None
+    - stats: Series of statistics indexed by group keys, or a scalar if there is no grouping
+    Returns a Series aligned with the rows of df, or the scalar if there is no grouping.
+    '''
+    if not group_by:
+        return stats
+    return pd.Series(stats.reindex(group_keys(df, group_by)).to_numpy(dtype = 'float64', na_value = np.nan), index = df.index)
+
+
+TDIGEST_COMPRESSION = 100 # centroids per group of a t-digest, i.e. a rank error of about 1%
+TDIGEST_EXACT_SIZE = 1000 # groups with at most this many values are not compressed, so their medians are exact
+
+
+def compress_centroids(centroids, compression = TDIGEST_COMPRESSION, exact_size = TDIGEST_EXACT_SIZE):
+    '''
+    FUNCTION to compress the centroids of the t-digests of many groups at once, with vectorized numpy operations. The centroids of each group are sorted, and neighbouring centroids are merged if they fall into the same bucket of the arcsine scale function, which keeps small centroids in the tails and at most about compression centroids per group. Groups with at most exact_size centroids are left as they are.
+    Parameters:
+    - centroids: Dataframe with columns 'mean' and 'weight', indexed by group keys
+    - compression: Compression of the t-digests
+    - exact_size: Maximum number of centroids of a group that is not compressed
+    '''
+    codes, _ = pd.factorize(centroids.index)
+    sizes = np.bincount(codes)
+    large = sizes[codes] > exact_size
+    if not large.any():
+        return centroids
+
+    kept, digests = centroids[~large], centroids[large]
+    codes = codes[large]
+    means, weights = digests['mean'].to_numpy(), digests['weight'].to_numpy()
+    order = np.lexsort((means, codes))
+    codes, means, weights = codes[order], means[order], weights[order]
+    index = digests.index[order]
+
+    totals = np.bincount(codes, weights = weights)
+    cumulative = np.cumsum(weights)
+    starts = np.cumsum(totals) - totals # cumulative weight before the first centroid of each group
+    q = (cumulative - starts[codes] - weights/2)/totals[codes]
+    buckets = np.floor(compression/(2*np.pi)*np.arcsin(2*q - 1)).astype(np.int64) + compression
+    keys, first, inverse = np.unique(codes*(2*compression + 1) + buckets, return_index = True, return_inverse = True)
+    merged_weights = np.bincount(inverse, weights = weights)
+    merged_means = np.bincount(inverse, weights = means*weights)/merged_weights
+    merged = pd.DataFrame({'mean': merged_means, 'weight': merged_weights}, index = index[first])
+    return pd.concat([kept, merged])
+
+
+def centroid_medians(centroids):
+    '''
+    FUNCTION to get the median of every group from the centroids of their t-digests. Groups whose centroids all have weight 1 (not compressed) get their exact median, as computed by pandas; the medians of the other groups are interpolated between the centres of their centroids.
+    Parameters:
+    - centroids: Dataframe with columns 'mean' and 'weight', indexed by group keys
+    Returns a Series of medians indexed by group keys.
+    '''
+    levels = list(range(centroids.index.nlevels))
+    compressed = centroids['weight'].gt(1).groupby(level = levels).transform('any')
+    medians = centroids.loc[~compressed.to_numpy(), 'mean'].groupby(level = levels).median()
+
+    interpolated = dict()
+    for key, digest in centroids[compressed.to_numpy()].groupby(level = levels):
+        digest = digest.sort_values('mean')
+        weights = digest['weight'].to_numpy()
+        centres = np.cumsum(weights) - weights/2
+        interpolated[key] = np.interp(weights.sum()/2, centres, digest['mean'].to_numpy())
+    if interpolated:
+        index = pd.MultiIndex.from_tuples(list(interpolated.keys())) if len(levels) > 1 else pd.Index([key[0] if isinstance(key, tuple) else key for key in interpolated.keys()])
+        medians = pd.concat([medians, pd.Series(list(interpolated.values()), index = index)])
+    return medians
+
+
+class GroupStats:
+    '''
+    The GroupStats object accumulates statistics of a numeric column, over the whole data or per group, over chunks of data (e.g. read from a file that does not fit in memory), and accumulators of different chunks or partitions can be merged in any grouping:
+    - counts, means, and sums of squared deviations are merged exactly with the parallel form of Welford's algorithm,
+    - medians are computed from a t-digest of each group, which is exact for groups of at most TDIGEST_EXACT_SIZE values and has a rank error of about 1/compression for larger groups. With compression = None, all values are kept and medians are exact.
+    '''
+    def __init__(self, column, group_by = None, statistics = ['mean', 'std'], compression = TDIGEST_COMPRESSION):
+        assert all(statistic in ['mean', 'median', 'std'] for statistic in statistics), "Require statistics to be 'mean', 'median', or 'std'."
+        assert compression is None or (isinstance(compression, int) and compression > 0), "Require compression to be a positive integer, or None."
+
+        self.column = column
+        self.group_by = [group_by] if isinstance(group_by, str) else group_by
+        self.statistics = statistics
+        self.compression = compression
+        self.moments = None # n, mean and m2 (sum of squared deviations from the mean) of each group
+        self.centroids = None # mean and weight of the centroids of the t-digest of each group, for medians
+        self._compressed_size = 0
+
+
+    def __str__(self):
+        return f"GroupStats: {self.statistics} of column '{self.column}'" + (f" grouped by {self.group_by}" if self.group_by else "")
+
+
+    def _add_centroids(self, centroids):
+        self.centroids = centroids if self.centroids is None else pd.concat([self.centroids, centroids])
+        # compress only once the centroids have doubled since the last compression, so that the cost is amortized
+        if self.compression is not None and len(self.centroids) > max(2*self._compressed_size, TDIGEST_EXACT_SIZE):
+            self.centroids = compress_centroids(self.centroids, self.compression)
+            self._compressed_size = len(self.centroids)
+
+
+    def update(self, df):
+        '''
+        Adds the values of a chunk of data to the statistics.
+        '''
+        values = pd.to_numeric(df[self.column], errors = 'coerce').to_numpy(dtype = 'float64', na_value = np.nan)
+        keys = group_keys(df, self.group_by) if self.group_by else pd.Index(np.zeros(len(df), dtype = int))
+        frame = pd.DataFrame({'value': values}, index = keys)
+        grouped = frame.groupby(level = list(range(keys.nlevels)))['value']
+        n = grouped.count()
+        moments = pd.DataFrame({'n': n, 'mean': grouped.mean(), 'm2': grouped.var(ddof = 0)*n})
+        self.moments = moments if self.moments is None else merge_moments(self.moments, moments)
+        if 'median' in self.statistics:
+            known = ~np.isnan(values) & keys.notna() if keys.nlevels == 1 else ~np.isnan(values) & ~keys.to_frame().isna().any(axis = 1).to_numpy()
+            self._add_centroids(pd.DataFrame({'mean': values[known], 'weight': 1.0}, index = keys[known]))
+        return self
+
+
+    def merge(self, other):
+        '''
+        Adds the statistics accumulated by another GroupStats object (e.g. over another partition of the data).
+        '''
+        assert isinstance(other, GroupStats)
+        if other.moments is not None:
+            self.moments = other.moments if self.moments is None else merge_moments(self.moments, other.moments)
+        if other.centroids is not None:
+            self._add_centroids(other.centroids)
+        return self
+
+
+    def result(self, statistic):
+        '''
+        Returns a statistic as a Series indexed by group keys, or a scalar if there is no grouping. Groups without values get NaN, and so do groups with a single value for the (sample) standard deviation, as in pandas.
+        '''
+        assert statistic in self.statistics, f"The statistic '{statistic}' was not accumulated."
+        if self.moments is None:
+            return np.nan if not self.group_by else pd.Series(dtype = 'float64')
+
+        n = self.moments['n']
+        if statistic == 'mean':
+            stats = self.moments['mean'].where(n > 0)
+        elif statistic == 'std':
+            stats = np.sqrt(self.moments['m2']/(n - 1)).where(n > 1)
+        else:
+            stats = centroid_medians(self.centroids).reindex(self.moments.index) if self.centroids is not None and len(self.centroids) > 0 else n*np.nan
+
+        if not self.group_by:
+            return stats.iloc[0] if len(stats) > 0 else np.nan
+        return stats
+
+
+def merge_moments(a, b):
+    '''
+    FUNCTION to merge the counts, means and sums of squared deviations of two sets of groups (Chan et al.'s parallel form of Welford's algorithm).
+    Parameters:
+    - a, b: Dataframes with columns n, mean and m2, indexed by group keys
+    '''
+    a, b = a.align(b, join = 'outer')
+    a, b = a.fillna(0), b.fillna(0)
+    n = a['n'] + b['n']
+    delta = b['mean'] - a['mean']
+    share = (b['n']/n).where(n > 0, 0)
+    return pd.DataFrame({'n': n,
+                         'mean': a['mean'] + delta*share,
+                         'm2': a['m2'] + b['m2'] + delta**2*a['n']*share})
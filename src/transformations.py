@@ -5,8 +5,18 @@ import numpy as np
 import sys
 sys.path.append('../src/')
 from PipelineClass import Pipeline, valid_dtypes
+from schema import display_dtypes
 
-def recursive_transform(add_step, pipeline, n):
+
+def apply_step(pipeline, cache, method, **params):
+    # restore the step from the step cache (if any) instead of recomputing it
+    if cache is None:
+        getattr(pipeline, method)(**params)
+        return pipeline
+    return cache.apply(pipeline, method, **params)
+
+
+def recursive_transform(add_step, pipeline, n, cache = None):
     
     if not add_step:
         return pipeline
@@ -18,7 +28,7 @@ def recursive_transform(add_step, pipeline, n):
     
     # get user inputs for each transformation
     if step_n:
-        dtypes = dict(pipeline.data.dtypes)
+        dtypes = display_dtypes(pipeline.data)
         valid_user_input = False
         
         if step_n == "DropColumns":
@@ -27,7 +37,7 @@ def recursive_transform(add_step, pipeline, n):
                                        pipeline.data.columns,
                                        key = f"{n}-DropColumns")
             if drop_cols:
-                pipeline.DropColumns(drop_cols)
+                pipeline = apply_step(pipeline, cache, 'DropColumns', column_list = drop_cols)
                 valid_user_input = True
         
         elif step_n == "DropRows":
@@ -36,7 +46,7 @@ def recursive_transform(add_step, pipeline, n):
                                             pipeline.data.columns,
                                             key = f"{n}-DropRows")
             if mandatory_cols:
-                pipeline.DropRows(mandatory_cols)
+                pipeline = apply_step(pipeline, cache, 'DropRows', column_list = mandatory_cols)
                 valid_user_input = True
                 
         elif step_n == "RenameColumns":
@@ -49,7 +59,7 @@ def recursive_transform(add_step, pipeline, n):
                                                             "Original Name": st.column_config.TextColumn(disabled = True)},
                                            key = f"{n}-RenameColumns")
             df = recode_editor.set_index("Original Name")
-            pipeline.RenameColumns(df["New Name"].to_dict())
+            pipeline = apply_step(pipeline, cache, 'RenameColumns', recode_dict = df["New Name"].to_dict())
             valid_user_input = True
                 
         elif step_n == "RecodeColumnTypes":
@@ -62,7 +72,7 @@ def recursive_transform(add_step, pipeline, n):
                                        valid_dtypes,
                                        key = f"{n}-RecodeColumnTypes-dtype")
             if col and dtype:
-                pipeline.RecodeColumnTypes({col: dtype})
+                pipeline = apply_step(pipeline, cache, 'RecodeColumnTypes', recode_dict = {col: dtype})
         
         elif step_n == "ReplaceByValue":
             # select column; multiselect group_by; select params
@@ -89,7 +99,7 @@ def recursive_transform(add_step, pipeline, n):
                 if bound > max_b or bound < min_b:
                     st.write("Criteria defies the minimum/maximum values of the column.")
                 else:
-                    pipeline.ReplaceByValue(col, bound, direction, group_by, fill)
+                    pipeline = apply_step(pipeline, cache, 'ReplaceByValue', column = col, bound = bound, direction = direction, group_by = group_by, fill = fill)
         
         elif step_n == "ReplaceByStd":
             # select column; multiselect group_by; select params
@@ -108,7 +118,7 @@ def recursive_transform(add_step, pipeline, n):
                                  key = f"{n}-ReplaceByStd-Fill")
             
             if col and n_std and fill:
-                pipeline.FilterColumnByStd(col, group_by, n_std, fill)
+                pipeline = apply_step(pipeline, cache, 'ReplaceByStd', column = col, group_by = group_by, n_std = n_std, fill = fill)
         
         
         elif step_n == "ImputeWithKNN":
@@ -121,22 +131,30 @@ def recursive_transform(add_step, pipeline, n):
                             2, 20, 5,
                             key = f"{n}-ImputeWithKNN-knn")
             
+            # optionally, find the neighbors by other numeric columns (KD-tree, scales to large data)
+            features = st.multiselect("↳ (Optional) Select columns to find neighbors by",
+                                      [c for c in pipeline.data.columns if dtypes[c] in ["Int64", "Float64"] and c != col],
+                                      key = f"{n}-ImputeWithKNN-Features")
+            
             if col and knn:
-                pipeline.ImputeWithKNN(col, n_neighbors = knn)
+                if features:
+                    pipeline = apply_step(pipeline, cache, 'ImputeWithKNN', column = col, n_neighbors = knn, metric = 'euclidean', features = features)
+                else:
+                    pipeline = apply_step(pipeline, cache, 'ImputeWithKNN', column = col, n_neighbors = knn)
         
         
-        elif step_n == "ImputeWithRegression":
+        elif step_n == "ImputeWithEquation":
             # select column; select dependent variables (columns) and input coefficients
             col = st.selectbox("↳ Select column (Independent Variable)",
                                [col for col in pipeline.data.columns if dtypes[col] == "Float64" or dtypes[col] == "Int64" or dtypes[col] == "boolean" and pipeline.data[col].isnull().values.any()],
-                               key = f"{n}-ImputeWithRegression-Column")
+                               key = f"{n}-ImputeWithEquation-Column")
                                
             df = pd.DataFrame(data = [c for c in pipeline.data.columns if dtypes[c] == "Float64" or dtypes[c] == "Int64" or dtypes[c] == "boolean"],
                               columns = ["Dependent Variable"])
             df["Coefficient"] = ""
             recode_editor = st.data_editor(df,
                                            column_config = {"Coefficient": st.column_config.NumberColumn(required = False)},
-                                           key = f"{n}-ImputeWithRegression")
+                                           key = f"{n}-ImputeWithEquation")
             apply = st.toggle("Calculate", key = f"{n}-Recode")
             if apply:
                 df = recode_editor.set_index("Dependent Variable")["Coefficient"].to_dict()
@@ -151,7 +169,8 @@ def recursive_transform(add_step, pipeline, n):
                         else:
                             eqn_str += f" + {beta} x [{X}]"
                 st.write(f"**{eqn_str}**")
-                pipeline.ImputeWithRegression(col, Xs, coeffs)
+                if Xs: # no equation until a coefficient is entered
+                    pipeline = apply_step(pipeline, cache, 'ImputeWithEquation', column = col, Xs = Xs, coefficients = coeffs)
         
         
         elif step_n == "RecodeColumnValues":
@@ -168,7 +187,7 @@ def recursive_transform(add_step, pipeline, n):
             apply = st.toggle("Apply", key = f"{n}-Recode")
             if apply:
                 df = recode_editor.set_index("Original Value")
-                pipeline.RecodeColumnValues(col, df["New Value"].to_dict())
+                pipeline = apply_step(pipeline, cache, 'RecodeColumnValues', column = col, recode_dict = df["New Value"].to_dict())
         
         else:
             st.write("[Work in Progress] This transformation is available in `src/PipelineClass.py` but still requires a frontend configuration to work on this Streamlit app. Please edit `app/pages/2_Transform.py` accordingly.")
@@ -176,4 +195,4 @@ def recursive_transform(add_step, pipeline, n):
         add_step = st.checkbox("Add Another Transformation",
                                key = f"add_step_{n}")
         
-        return recursive_transform(add_step, pipeline, n)
+        return recursive_transform(add_step, pipeline, n, cache)
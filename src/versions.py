@@ -0,0 +1,80 @@
+import pandas as pd
+
+
+class VersionStore:
+    '''
+    The VersionStore object keeps every version of the data of a Pipeline (one per step) with column-level structural sharing: a version only stores the columns that its step changed, and refers to the columns of its parent version for the others, so the memory grows with the changed columns rather than with the size of the frame times the number of steps. A step that changes the rows (e.g. DropRows) changes every column.
+    Versions form a tree: checking out an older version and applying a step starts a new branch, and the other branches are kept. Checking out a version builds a frame over the stored columns without copying them, so it takes O(number of columns) whatever the number of rows.
+    The stored columns must never be modified in place; Pipeline copies the columns that a step writes before applying it (see planning.step_columns).
+    '''
+    def __init__(self):
+        self.versions = dict() # id -> {'parent', 'step', 'index', 'columns': {column: Series}, 'new': columns stored by the version, 'nbytes', 'state'}
+        self.head = None
+        self.nbytes = 0
+
+
+    def __str__(self):
+        return f"VersionStore: {len(self.versions)} versions, {self.nbytes/1024**2:.1f} MB, head at version {self.head}"
+
+
+    def commit(self, df, state, step = None, changed = None):
+        '''
+        Adds a version of the data as a child of the head version, and makes it the head.
+        Parameters:
+        - df: Dataframe of the new version
+        - state: Dictionary of the rest of the state of the Pipeline at this version (e.g. metadata, n_steps, artifacts)
+        - step: (Optional) (method, params) of the step that created the version
+        - changed: (Optional) set of the columns that the step may have changed; the other columns are shared with the parent version if its rows are the same. All columns are stored if None.
+        Returns the id of the new version.
+        '''
+        assert isinstance(df, pd.DataFrame)
+
+        parent = self.versions[self.head] if self.head is not None else None
+        same_rows = parent is not None and parent['index'].equals(df.index)
+        index = parent['index'] if same_rows else df.index
+        parent = parent['columns'] if parent is not None else dict()
+        columns, new = dict(), []
+        for col in df.columns:
+            if changed is not None and same_rows and col not in changed and col in parent:
+                columns[col] = parent[col]
+            else:
+                columns[col] = df[col]
+                new.append(col)
+
+        nbytes = int(sum(columns[col].memory_usage(index = False, deep = False) for col in new))
+        version = len(self.versions)
+        self.versions[version] = {'parent': self.head, 'step': step, 'index': index, 'columns': columns, 'new': new, 'nbytes': nbytes, 'state': state}
+        self.head = version
+        self.nbytes += nbytes
+        return version
+
+
+    def data(self, version = None):
+        '''
+        Returns the dataframe of a version (the head by default), built over the stored columns without copying them. The frame must not be modified in place.
+        '''
+        version = self.head if version is None else version
+        assert version in self.versions, f"Version {version} does not exist."
+
+        return pd.DataFrame(self.versions[version]['columns'], index = self.versions[version]['index'], copy = False)
+
+
+    def checkout(self, version):
+        '''
+        Makes a version the head, so that the next commit starts a branch from it. Returns the dataframe and the state of the version.
+        '''
+        assert version in self.versions, f"Version {version} does not exist."
+
+        self.head = version
+        return self.data(version), self.versions[version]['state']
+
+
+    def summary(self):
+        '''
+        Returns a dataframe with the parent, step, number of columns stored and shared, and bytes stored by each version.
+        '''
+        rows = [{'version': version, 'parent': v['parent'], 'step': v['step'][0] if v['step'] else None,
+                 'columns_stored': len(v['new']), 'columns_shared': len(v['columns']) - len(v['new']), 'bytes_stored': v['nbytes'],
+                 'head': version == self.head}
+                for version, v in self.versions.items()]
+        return pd.DataFrame(rows, columns = ['version', 'parent', 'step', 'columns_stored', 'columns_shared', 'bytes_stored', 'head']).astype({'parent': 'Int64'})
@@ -1,13 +1,149 @@
 import matplotlib.pyplot as plt
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from datetime import datetime
+import threading
 import altair as alt
 
 
+GRID_POINTS = 200 # points at which densities are evaluated
+KDE_BINS = 1024 # bins of the histogram that densities are estimated from
+SCATTER_MAX_POINTS = 5000 # larger scatter plots are binned
+SCATTER_BINS = 50 # bins along each axis of a binned scatter plot
+MAX_CACHED_GROUPS = 8
+
+group_cache = OrderedDict() # (id(df), columns) -> (df, codes, labels) of recently grouped frames
+group_cache_lock = threading.Lock() # group_cache is shared by the sessions of the app
+
+
+def group_codes(df, group_by):
+    '''
+    FUNCTION to factorize the unique combinations of the values of one or more columns into integer codes, without building a label per row. The codes of each column are combined one column at a time and factorized again, so they never overflow.
+    Parameters:
+    - df: Dataframe
+    - group_by: List of column(s) to group by
+    Returns a tuple (codes, labels), where codes is an integer array with one code per row and labels is an array with the label ("value1, value2, ...") of each code.
+    '''
+    codes, first = None, None
+    for col in group_by:
+        col_codes, uniques = pd.factorize(df[col], use_na_sentinel = False)
+        if codes is None:
+            codes = col_codes
+        else:
+            codes, _ = pd.factorize(codes*len(uniques) + col_codes)
+    codes = np.asarray(codes, dtype = np.int64)
+    
+    # the label of each group is built from its first row only
+    first = np.full(codes.max() + 1 if len(codes) > 0 else 0, len(codes), dtype = np.int64)
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    labels = df[group_by].iloc[first].astype(str).agg(', '.join, axis = 1).to_numpy(dtype = object)
+    
+    # different values can share a label (e.g. 1 and '1'), so the labels are factorized again
+    label_codes, labels = pd.factorize(labels)
+    return label_codes[codes], np.asarray(labels, dtype = object)
+
+
+def group_labels(df, group_by):
+    '''
+    FUNCTION to get the label of the group of every row of a dataframe ("value1, value2, ..." for the columns to group by), for the 'Group' column of grouped plots. Equivalent to df[group_by].astype(str).agg(', '.join, axis = 1), but only one label is built per unique group, and the codes are remembered for the frame (which is kept alive so that its id cannot be reused), so replotting the same data with the same grouping skips the factorization. Frames are assumed not to be modified in place, as in the app.
+    Parameters:
+    - df: Dataframe
+    - group_by: List of column(s) to group by
+    Returns an object array with one label per row of df.
+    '''
+    key = (id(df), tuple(group_by))
+    with group_cache_lock:
+        cached = group_cache.get(key)
+        if cached is not None and len(cached[1]) == len(df):
+            group_cache.move_to_end(key)
+    if cached is not None and len(cached[1]) == len(df):
+        _, codes, labels = cached
+    else:
+        codes, labels = group_codes(df, group_by)
+        with group_cache_lock:
+            group_cache[key] = (df, codes, labels)
+            while len(group_cache) > MAX_CACHED_GROUPS:
+                group_cache.popitem(last = False)
+    return labels[codes]
+
+
+def count_values(df, x, group_by = None):
+    '''
+    FUNCTION to count the rows of each value of a column (and group), for plotting bar charts without shipping raw rows to the browser.
+    Parameters:
+    - df: Dataframe, with a 'Group' column if group_by is specified
+    - x: Name of column to count the values of
+    - group_by: List of column(s) that the 'Group' column was built from
+    Returns a dataframe with columns x, ('Group',) and 'count'.
+    '''
+    keys = [x, 'Group'] if group_by else [x]
+    return df.groupby(keys, observed = True, sort = False).size().reset_index(name = 'count')
+
+
+def scott_bandwidth(values):
+    # same rule of thumb as the Vega-Lite density transform
+    if len(values) < 2:
+        return 1.0
+    q25, q75 = np.percentile(values, [25, 75])
+    spread = min(values.std(ddof = 1), (q75 - q25)/1.34) or values.std(ddof = 1) or 1.0
+    return 1.06 * spread * len(values)**(-1/5)
+
+
+def kde_grid(values, grid, n_bins = KDE_BINS):
+    '''
+    FUNCTION to evaluate a Gaussian kernel density estimate of values on a grid. The values are first binned into a fine histogram, so the cost is linear in the number of values.
+    Parameters:
+    - values: 1D numpy array of finite values
+    - grid: 1D numpy array of points at which to evaluate the density
+    - n_bins: Number of histogram bins
+    '''
+    if len(values) == 0:
+        return np.zeros(len(grid))
+    counts, edges = np.histogram(values, bins = n_bins, range = (grid[0], grid[-1]))
+    centers = (edges[:-1] + edges[1:])/2
+    h = scott_bandwidth(values)
+    kernel = np.exp(-0.5*((grid[:, None] - centers[None, :])/h)**2)/(h*np.sqrt(2*np.pi))
+    return kernel @ counts / len(values)
+
+
+def density_table(df, x, group_by = None, n_points = GRID_POINTS):
+    '''
+    FUNCTION to compute the density of a column (per group) on a fixed grid, for plotting density charts without shipping raw rows to the browser.
+    Parameters:
+    - df: Dataframe without missing values in x, with a 'Group' column if group_by is specified
+    - x: Name of numeric or datetime column
+    - group_by: List of column(s) that the 'Group' column was built from
+    - n_points: Number of grid points
+    Returns a dataframe with columns x, 'density' and ('Group',).
+    '''
+    is_datetime = dict(df.dtypes)[x] == "datetime64[ns]"
+    if is_datetime:
+        values = df[x].to_numpy(dtype = 'datetime64[ns]').astype('int64').astype('float64')
+    else:
+        values = df[x].to_numpy(dtype = 'float64', na_value = np.nan)
+    if len(values) == 0:
+        return pd.DataFrame(columns = [x, 'density'] + (['Group'] if group_by else []))
+    grid = np.linspace(values.min(), values.max(), n_points)
+    if grid[0] == grid[-1]:
+        grid = np.linspace(grid[0] - 0.5, grid[-1] + 0.5, n_points)
+    
+    if group_by:
+        codes, groups = pd.factorize(df['Group'])
+        tables = [pd.DataFrame({x: grid, 'density': kde_grid(values[codes == i], grid), 'Group': group})
+                  for i, group in enumerate(groups)]
+        table = pd.concat(tables, ignore_index = True)
+    else:
+        table = pd.DataFrame({x: grid, 'density': kde_grid(values, grid)})
+    
+    if is_datetime:
+        table[x] = pd.to_datetime(table[x].astype('int64'))
+    return table
+
+
 def PlotBar(df, x, group_by = None, width = 600, height = 400):
     '''
-    FUNCTION to plot 1D bar chart using Altair, for display on Streamlit.
+    FUNCTION to plot 1D bar chart using Altair, for display on Streamlit. The counts are aggregated before they are passed to the chart.
     Parameters:
     - df: Dataframe
     - x: Name of column to be represented by bars
@@ -21,22 +157,25 @@ def PlotBar(df, x, group_by = None, width = 600, height = 400):
         assert isinstance(group_by, list) and all(col in list(df.columns) for col in group_by), "Require all column(s) to group by to exist in the dataframe and to be specified in a list."
     
     try:
-        df_filtered = df.copy()
-        df_filtered = df_filtered.dropna(subset = [x])
+        df_filtered = df[[x] + [col for col in (group_by or []) if col != x]]
         if group_by: # new 'Group' column for unique combinations
-            df_filtered['Group'] = df_filtered[group_by].astype(str).agg(', '.join, axis = 1)
-            chart = alt.Chart(df_filtered).mark_bar().encode(
+            df_filtered = df_filtered.assign(Group = group_labels(df, group_by))
+        df_filtered = df_filtered.dropna(subset = [x])
+        if group_by:
+            counts = count_values(df_filtered, x, group_by)
+            chart = alt.Chart(counts).mark_bar().encode(
                 x = alt.X(f'{x}:N', title = x),
-                y = alt.Y('count():Q', title = 'Count'),
+                y = alt.Y('count:Q', title = 'Count'),
                 color = alt.Color('Group:N',
                 legend = alt.Legend(title = str(group_by)[1:-1].replace("'",""))),
-                tooltip = [alt.Tooltip(f'{x}:N'), alt.Tooltip('count():Q'), 'Group:N']
+                tooltip = [alt.Tooltip(f'{x}:N'), alt.Tooltip('count:Q'), 'Group:N']
             )
         else:
-            chart = alt.Chart(df_filtered).mark_bar().encode(
+            counts = count_values(df_filtered, x)
+            chart = alt.Chart(counts).mark_bar().encode(
                 x = alt.X(f'{x}:N', title = x),
-                y = alt.Y('count():Q', title = 'Count'),
-                tooltip = [alt.Tooltip(f'{x}:N'), alt.Tooltip('count():Q')]
+                y = alt.Y('count:Q', title = 'Count'),
+                tooltip = [alt.Tooltip(f'{x}:N'), alt.Tooltip('count:Q')]
             )
         
         chart = chart.properties(width = width, height = height)
@@ -50,7 +189,7 @@ def PlotBar(df, x, group_by = None, width = 600, height = 400):
 
 def PlotDensity(df, x, group_by = None, width = 600, height = 400):
     '''
-    FUNCTION to plot 1D density chart using Altair, for display on Streamlit.
+    FUNCTION to plot 1D density chart using Altair, for display on Streamlit. The densities are evaluated on a fixed grid before they are passed to the chart.
     Parameters:
     - df: DataFrame
     - x: Name of column to be represented by density
@@ -64,27 +203,23 @@ def PlotDensity(df, x, group_by = None, width = 600, height = 400):
         assert isinstance(group_by, list) and all(col in list(df.columns) for col in group_by), "Require all column(s) to group by to exist in the dataframe and to be specified in a list."
     
     try:
-        df_filtered = df.copy()
+        df_filtered = df[[x] + [col for col in (group_by or []) if col != x]]
+        if group_by: # new 'Group' column for unique combinations
+            df_filtered = df_filtered.assign(Group = group_labels(df, group_by))
         df_filtered = df_filtered.dropna(subset = [x])
         type = ['T' if dict(df.dtypes)[x] == "datetime64[ns]" else 'Q']
         
-        if group_by: # new 'Group' column for unique combinations
-            df_filtered['Group'] = df_filtered[group_by].astype(str).agg(', '.join, axis = 1)
-            chart = alt.Chart(df_filtered).transform_density(
-                density = x,
-                groupby = ['Group'],
-                as_ = [x, 'density'],
-            ).mark_area(opacity = 0.5).encode(
+        if group_by:
+            densities = density_table(df_filtered, x, group_by)
+            chart = alt.Chart(densities).mark_area(opacity = 0.5).encode(
                 x = alt.X(f'{x}:{type[0]}', title = x),
                 y = alt.Y('density:Q', title = 'Density'),
                 color = alt.Color('Group:N', legend = alt.Legend(title = ', '.join(group_by))),
                 tooltip = [alt.Tooltip(f'{x}:{type[0]}'), alt.Tooltip('density:Q'), 'Group:N']
             )
         else:
-            chart = alt.Chart(df_filtered).transform_density(
-                density = x,
-                as_ = [x, 'density']
-            ).mark_area(opacity = 0.5).encode(
+            densities = density_table(df_filtered, x)
+            chart = alt.Chart(densities).mark_area(opacity = 0.5).encode(
                 x = alt.X(f'{x}:{type[0]}', title = x),
                 y = alt.Y('density:Q', title = 'Density'),
                 tooltip = [alt.Tooltip(f'{x}:{type[0]}'), alt.Tooltip('density:Q')]
@@ -99,9 +234,45 @@ def PlotDensity(df, x, group_by = None, width = 600, height = 400):
         print(current_dateTime + ': ' + str(e))
         
 
-def PlotScatter(df, x, y, bin = False, group_by = None, width = 600, height = 400):
+def bin_2d(df, x, y, group_by = None, bins = SCATTER_BINS):
     '''
-    FUNCTION to create 2D scatter plot using Altair, for display on Streamlit.
+    FUNCTION to count the points of a scatter plot (per group) in a grid of 2D bins, so that the size of the chart data is bounded by the number of bins rather than the number of rows.
+    Parameters:
+    - df: Dataframe without missing values in x and y, with a 'Group' column if group_by is specified
+    - x: Name of the numeric column for the x-axis
+    - y: Name of the numeric column for the y-axis
+    - group_by: List of column(s) that the 'Group' column was built from
+    - bins: Number of bins along each axis
+    Returns a dataframe with the bin centers in columns x and y, 'count', and ('Group',), for non-empty bins only.
+    '''
+    centers, indices = [], []
+    for col in [x, y]:
+        values = df[col].to_numpy(dtype = 'float64', na_value = np.nan)
+        low, high = values.min(), values.max()
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1)
+        centers.append((edges[:-1] + edges[1:])/2)
+        indices.append(np.clip(np.searchsorted(edges, values, side = 'right') - 1, 0, bins - 1))
+    cells = indices[0]*bins + indices[1]
+    
+    if group_by:
+        codes, groups = pd.factorize(df['Group'])
+        counts = np.bincount(codes*bins*bins + cells, minlength = len(groups)*bins*bins)
+    else:
+        counts = np.bincount(cells, minlength = bins*bins)
+    keys = np.flatnonzero(counts)
+    table = pd.DataFrame({x: centers[0][(keys % (bins*bins)) // bins],
+                          y: centers[1][keys % bins],
+                          'count': counts[keys]})
+    if group_by:
+        table['Group'] = groups[keys // (bins*bins)]
+    return table
+
+
+def PlotScatter(df, x, y, bin = False, group_by = None, width = 600, height = 400, max_points = SCATTER_MAX_POINTS):
+    '''
+    FUNCTION to create 2D scatter plot using Altair, for display on Streamlit. Up to max_points points are plotted as they are; larger data sets (or bin = True) are counted in 2D bins on the server and plotted as bubbles sized by count, so the chart data stays bounded.
     Parameters:
     - df: DataFrame
     - x: Name of the column for x-axis
@@ -110,6 +281,7 @@ def PlotScatter(df, x, y, bin = False, group_by = None, width = 600, height = 40
     - group_by: List of column(s) to group by for visualization
     - width: width of chart
     - height: height of chart
+    - max_points: Maximum number of points to plot without binning
     '''
     assert isinstance(df, pd.DataFrame)
     assert x in list(df.columns), f"The column '{x}' does not exist in the dataframe."
@@ -118,29 +290,40 @@ def PlotScatter(df, x, y, bin = False, group_by = None, width = 600, height = 40
         assert isinstance(group_by, list) and all(col in list(df.columns) for col in group_by), "Require all columns to group by to exist in the dataframe and to be specified in a list."
     
     try:
-        df_filtered = df.copy()
+        df_filtered = df[[x, y] + [col for col in (group_by or []) if col not in [x, y]]]
+        if group_by: # new 'Group' column for unique combinations
+            df_filtered = df_filtered.assign(Group = group_labels(df, group_by))
         df_filtered = df_filtered.dropna(subset = [x,y])
+        discrete = bin or df_filtered.shape[0] > max_points
         
-        if group_by: # new 'Group' column for unique combinations
-            df_filtered['Group'] = df_filtered[group_by].astype(str).agg(', '.join, axis = 1)
-            
-            chart = alt.Chart(df_filtered).mark_circle(opacity = 0.8).encode(
-                x = alt.X(f'{x}:Q', bin = discrete),
-                y = alt.Y(f'{y}:Q', bin = discrete),
-                size = alt.Size('count():N',
-                    legend = alt.Legend(title = 'Count') if discrete else None
-                ) if discrete else alt.Size(),
-                color = alt.Color('Group:N', legend = alt.Legend(title = ', '.join(group_by)))
-                
-            )
+        if group_by:
+            if discrete:
+                chart = alt.Chart(bin_2d(df_filtered, x, y, group_by)).mark_circle(opacity = 0.8).encode(
+                    x = alt.X(f'{x}:Q', title = x),
+                    y = alt.Y(f'{y}:Q', title = y),
+                    size = alt.Size('count:Q', legend = alt.Legend(title = 'Count')),
+                    color = alt.Color('Group:N', legend = alt.Legend(title = ', '.join(group_by))),
+                    tooltip = [alt.Tooltip(f'{x}:Q'), alt.Tooltip(f'{y}:Q'), alt.Tooltip('count:Q'), 'Group:N']
+                )
+            else:
+                chart = alt.Chart(df_filtered[[x, y, 'Group']]).mark_circle(opacity = 0.8).encode(
+                    x = alt.X(f'{x}:Q', title = x),
+                    y = alt.Y(f'{y}:Q', title = y),
+                    color = alt.Color('Group:N', legend = alt.Legend(title = ', '.join(group_by)))
+                )
         else:
-            chart = alt.Chart(df_filtered).mark_circle(opacity = 0.8).encode(
-                x = alt.X(f'{x}:Q', bin = discrete),
-                y = alt.Y(f'{y}:Q', bin = discrete),
-                size = alt.Size('count():N',
-                    legend = alt.Legend(title = 'Count') if discrete else None
-                ) if discrete else alt.Size()
-            )
+            if discrete:
+                chart = alt.Chart(bin_2d(df_filtered, x, y)).mark_circle(opacity = 0.8).encode(
+                    x = alt.X(f'{x}:Q', title = x),
+                    y = alt.Y(f'{y}:Q', title = y),
+                    size = alt.Size('count:Q', legend = alt.Legend(title = 'Count')),
+                    tooltip = [alt.Tooltip(f'{x}:Q'), alt.Tooltip(f'{y}:Q'), alt.Tooltip('count:Q')]
+                )
+            else:
+                chart = alt.Chart(df_filtered[[x, y]]).mark_circle(opacity = 0.8).encode(
+                    x = alt.X(f'{x}:Q', title = x),
+                    y = alt.Y(f'{y}:Q', title = y)
+                )
         
         chart = chart.properties(width = width, height = height)
         return chart
@@ -170,19 +353,19 @@ def PlotTimeseries(df, x, y, group_by = None, width = 600, height = 400):
         assert isinstance(group_by, list) and all(col in list(df.columns) for col in group_by), "Require all columns to group by to exist in the dataframe and to be specified in a list."
     
     try:
-        df_filtered = df.copy()
+        df_filtered = df[[x, y] + [col for col in (group_by or []) if col not in [x, y]]]
+        if group_by: # new 'Group' column for unique combinations
+            df_filtered = df_filtered.assign(Group = group_labels(df, group_by))
         df_filtered = df_filtered.dropna(subset = [x,y])
         df_filtered[x] = pd.to_datetime(df_filtered[x])
         
-        if group_by: # new 'Group' column for unique combinations
-            df_filtered['Group'] = df_filtered[group_by].astype(str).agg(', '.join, axis = 1)
-            
+        if group_by:
             chart = alt.Chart(df_filtered).mark_line(point = True).encode(
                     x = alt.X(f'{x}:T', scale = alt.Scale(zero = False), title = x),
                     y = alt.Y(f'{y}:Q', scale = alt.Scale(zero = False), title = y),
                     order = f'{x}',
                     color = alt.Color('Group:N', legend = alt.Legend(title = ', '.join(group_by))),
-                    tooltip = [alt.Tooltip(f'{x}:{type}'), alt.Tooltip(f'{y}:Q'), 'Group:N']
+                    tooltip = [alt.Tooltip(f'{x}:T'), alt.Tooltip(f'{y}:Q'), 'Group:N']
             )
         
         else:
@@ -190,7 +373,7 @@ def PlotTimeseries(df, x, y, group_by = None, width = 600, height = 400):
                 x = alt.X(f'{x}:T', scale = alt.Scale(zero = False), title = x),
                 y = alt.Y(f'{y}:Q', scale = alt.Scale(zero = False), title = y),
                 order = f'{x}',
-                tooltip = [alt.Tooltip(f'{x}:{type}'), alt.Tooltip(f'{y}:Q')]
+                tooltip = [alt.Tooltip(f'{x}:T'), alt.Tooltip(f'{y}:Q')]
             )
             
         chart = chart.properties(width = width, height = height)
@@ -221,14 +404,14 @@ def PlotStrip(df, x, y, group_by = None, width = 600, height = 60):
         assert isinstance(group_by, list) and all(col in list(df.columns) for col in group_by), "Require all columns to group by to exist in the dataframe and to be specified in a list."
     
     try:
-        df_filtered = df.copy()
+        df_filtered = df[[x, y] + [col for col in (group_by or []) if col not in [x, y]]]
+        if group_by: # new 'Group' column for unique combinations
+            df_filtered = df_filtered.assign(Group = group_labels(df, group_by))
         df_filtered = df_filtered.dropna(subset = [x,y])
         df_filtered.loc[:,"Y"] = df_filtered[y].astype('category').cat.codes+0.5
         df_filtered[x] = pd.to_datetime(df_filtered[x])
         
-        if group_by: # new 'Group' column for unique combinations
-            df_filtered['Group'] = df_filtered[group_by].astype(str).agg(', '.join, axis = 1)
-            
+        if group_by:
             chart = alt.Chart(df_filtered).mark_tick().encode(
                 x = alt.X(f'{x}:T'),
                 y = alt.Y('Y:Q', title = "", axis = None),
@@ -286,3 +469,37 @@ def PlotBox(df, x, width = 600, height = 60):
         print("Failed to create boxplot.")
         current_dateTime = str(datetime.now())[0:19]
         print(current_dateTime + ': ' + str(e))
+
+
+def PlotProfile(profile, width = 600, height = None):
+    '''
+    FUNCTION to plot the timeline of the steps of a Pipeline (see Pipeline.profile) as a Gantt chart using Altair, for display on Streamlit. Each step is a bar from the end of the previous step, so the steps that take the most time stand out.
+    Parameters:
+    - profile: Dataframe returned by Pipeline.profile
+    - width: width of chart
+    - height: height of chart (20 pixels per step by default)
+    '''
+    assert isinstance(profile, pd.DataFrame)
+    assert {'method', 'status', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out'} <= set(profile.columns), "Require the dataframe to be the profile of a Pipeline."
+    
+    try:
+        timeline = profile[['method', 'status', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out']].reset_index(drop = True)
+        timeline['Step'] = [f"{i + 1}. {method}" for i, method in enumerate(timeline['method'])]
+        timeline['end'] = timeline['wall_seconds'].cumsum()
+        timeline['start'] = timeline['end'] - timeline['wall_seconds']
+        
+        chart = alt.Chart(timeline).mark_bar().encode(
+            x = alt.X('start:Q', title = 'Seconds'),
+            x2 = 'end:Q',
+            y = alt.Y('Step:N', sort = list(timeline['Step']), title = ''),
+            color = alt.Color('status:N', scale = alt.Scale(domain = ['done', 'failed'], range = ['#4c78a8', '#e45756']), legend = None),
+            tooltip = ['Step:N', 'status:N', alt.Tooltip('wall_seconds:Q', format = '.4f'), alt.Tooltip('cpu_seconds:Q', format = '.4f'), 'rows_in:Q', 'rows_out:Q']
+        )
+        
+        chart = chart.properties(width = width, height = height or 20*max(len(timeline), 1))
+        return chart
+        
+    except Exception as e:
+        print("Failed to create profile timeline.")
+        current_dateTime = str(datetime.now())[0:19]
+        print(current_dateTime + ': ' + str(e))